@@ -0,0 +1,346 @@
+"""
+Benchmark suite for the boards and the engines.
+
+Every benchmark runs on a fixed corpus of positions, so two runs measure the
+same work and can be compared between commits:
+
+    python benchmark.py --json before.json
+    ... change the code ...
+    python benchmark.py --json after.json --compare before.json
+
+--workers 1,2,4,8 instead measures the speedup of the parallel alpha-beta
+root search with each number of worker processes, and --tt-games 20 the
+per-move time saved by the persistent transposition table when the same
+series of games is played again.
+
+Each result gives the operations per second and, for the searches, the nodes
+per second. Operation benchmarks are repeated and the best run is kept, like
+timeit does, to reduce the noise of other processes.
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import timeit
+from contextlib import redirect_stdout
+from board import Board, board_from_string
+from bitboard import BitBoard
+from endgame import BENCHMARK_POSITIONS, EndgameSolver
+from engines.alpha import AlphaEngine
+import vectorized
+
+boards = {"list": Board, "bitboard": BitBoard}
+
+# Positions reached by seeded random play, as (position, color to move,
+# move_num), in the board_to_string format
+CORPUS = {
+    "opening": [
+        ("------------------O--------OOX----XOOOO---XXXO-------X----------", -1, 5),
+        ("------------------X--O----XXOO----XOXXX---O------O------O-------", -1, 5),
+        ("-----------X-X-----XOX-----XOX-----OX-----OX-O---O--------------", -1, 5),
+        ("----------X-------XX-------XX-----XOOOOO--O------OX-------------", -1, 5),
+    ],
+    "midgame": [
+        ("-----O-----XXXX--OXO-X--OOOOOO----OOOOOO-OOO-X--OXOXX---XX-XX---", -1, 15),
+        ("------------------O-XO-OOXOOOOOO-OOXOOO-OOOXXOOO-X-XXX--OX-XX---", -1, 15),
+        ("----O-OX----O-OXOO--OXOX-OOOOXO---OOOXXO--XXXX-X--OXXX---O------", -1, 15),
+        ("--OOOX---O--X-X---OXOXOOXXXOOOXXO--XOO-X--XOOO----O-X-O------X--", -1, 15),
+    ],
+    "endgame": [
+        ("---XXX--OO-XX-OX-OOXOOO-XOOOOOOX-OOOOOOOXOOXOOO-XOXOOOO-XOOOOO--", -1, 23),
+        ("-O-O-XOXOXOXXOO--XXOOOOX-XXOOOXX--OXXXO-XOXXXX-OOOOXXOOXX-X-XO--", -1, 23),
+        ("-X--XXXXOOXXXXXXOOOXXOOOOXXOXX-OO-XXXXOOOXXX-O-OOOOOX-O--OX--X--", -1, 23),
+        ("-XXXXOOO-XXXO-OOX-XXXOOOXXXOOOOOXOOXXXX-XOOX-XXX-OOOX----XOOO---", -1, 23),
+    ],
+}
+
+# Exact endgame positions: the ten-empties ones of endgame.py
+SOLVER_POSITIONS = [text for text, _ in BENCHMARK_POSITIONS[:4]]
+
+
+def _positions(board_class):
+    return [(board_from_string(text, board_class), color, move_num)
+            for phase in CORPUS.values() for text, color, move_num in phase]
+
+
+def _best_time(function, repeat):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def bench_legal_moves(board_class, repeat):
+    """ Legal moves of freshly loaded positions, so that no cache helps. """
+    def run():
+        for board, color, _ in fresh.pop():
+            board.get_legal_moves(color)
+    fresh = [_positions(board_class) for _ in range(repeat)]
+    return len(fresh[0]), _best_time(run, repeat)
+
+
+def bench_execute_move(board_class, repeat):
+    """ Play and take back every legal move of every position. """
+    positions = _positions(board_class)
+    work = [(board, color, board.get_legal_moves(color)) for board, color, _ in positions]
+    def run():
+        for board, color, moves in work:
+            for move in moves:
+                board.undo_move(board.execute_move(move, color))
+    return sum(len(moves) for _, _, moves in work), _best_time(run, repeat)
+
+
+def bench_heuristic(board_class, repeat):
+    """ AlphaEngine.heuristic on every position, for both colors. """
+    engine = AlphaEngine.__new__(AlphaEngine)
+    positions = _positions(board_class)
+    def run():
+        for board, color, move_num in positions:
+            engine.heuristic(board, color, move_num)
+            engine.heuristic(board, -color, move_num)
+    return 2 * len(positions), _best_time(run, repeat)
+
+
+def bench_evaluate_boards(board_class, repeat):
+    """ AlphaEngine.evaluate_boards on the children of every position. """
+    engine = AlphaEngine.__new__(AlphaEngine)
+    batches = []
+    for board, color, move_num in _positions(board_class):
+        children = []
+        for move in board.get_legal_moves(color):
+            child = board.copy()
+            child.execute_move(move, color)
+            children.append(child)
+        batches.append((children, color, move_num))
+    def run():
+        for children, color, move_num in batches:
+            engine.evaluate_boards(children, color, move_num)
+    return sum(len(children) for children, _, _ in batches), _best_time(run, repeat)
+
+
+def bench_search(board_class, alpha_beta, depth):
+    """ A fixed-depth search of every position from an empty table. Return
+    (positions, seconds, nodes). """
+    with redirect_stdout(io.StringIO()):
+        engine = AlphaEngine()
+    engine.alpha_beta = alpha_beta
+    engine.ply_alpha = engine.ply_maxmin = depth
+    engine.endgame_empties = 0
+    engine.book = None
+    positions = _positions(board_class)
+    seconds, nodes = 0.0, 0
+    for board, color, move_num in positions:
+        engine.table.clear()
+        engine.get_move(board, color, move_num)
+        seconds += engine.last_stats.elapsed
+        nodes += engine.last_stats.nodes
+    return len(positions), seconds, nodes
+
+
+def bench_parallel(board_class, depth, workers):
+    """ A fixed-depth alpha-beta search of the midgame positions with the
+    root moves split over workers processes. Return (positions, seconds,
+    nodes). """
+    with redirect_stdout(io.StringIO()):
+        engine = AlphaEngine()
+    engine.alpha_beta = True
+    engine.endgame_empties = 0
+    engine.book = None
+    engine.workers = workers
+    positions = [(board_from_string(text, board_class), color, move_num)
+                 for text, color, move_num in CORPUS["midgame"]]
+    # Start the worker processes before timing
+    engine.ply_alpha = 2
+    engine.get_move(positions[0][0], positions[0][1], positions[0][2])
+    engine.ply_alpha = depth
+    seconds, nodes = 0.0, 0
+    try:
+        for board, color, move_num in positions:
+            engine.table.clear()
+            engine.get_move(board, color, move_num)
+            seconds += engine.last_stats.elapsed
+            nodes += engine.last_stats.nodes
+    finally:
+        engine.close()
+    return len(positions), seconds, nodes
+
+
+def _play_series(engine, board_class, games, seed, random_plies=4):
+    # Play games of the engine against itself after a few seeded random
+    # plies. Return (moves searched, seconds spent searching them).
+    moves, seconds = 0, 0.0
+    for index in range(games):
+        rng = random.Random(seed + index)
+        board, color, passes, ply = board_class(), -1, 0, 0
+        while passes < 2:
+            legal = board.get_legal_moves(color)
+            if not legal:
+                passes += 1
+            else:
+                passes = 0
+                if ply < random_plies:
+                    move = rng.choice(legal)
+                else:
+                    move = engine.get_move(board.copy(), color, ply // 2)
+                    moves += 1
+                    seconds += engine.last_stats.elapsed
+                board.execute_move(move, color)
+                ply += 1
+            color = -color
+    return moves, seconds
+
+
+def bench_persistent_table(board_class, depth, games, seed=0):
+    """ A series of games of an alpha-beta engine against itself, from an
+    empty persistent table, then the same series with a new engine that
+    preloads the table the first one saved, like a repeated tournament.
+    Return [(moves, seconds, nodes) cold, (moves, seconds, nodes) warm]. """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "table.tt")
+        for _ in range(2):
+            with redirect_stdout(io.StringIO()):
+                engine = AlphaEngine()
+            engine.alpha_beta = True
+            engine.ply_alpha = depth
+            engine.endgame_empties = 0
+            engine.book = None
+            engine.load_table(path)
+            moves, seconds = _play_series(engine, board_class, games, seed)
+            engine.close()
+            results.append((moves, seconds, None))
+    return results
+
+
+def bench_endgame(board_class):
+    """ Exact solve of the ten-empties positions. Return (positions,
+    seconds, nodes). """
+    seconds, nodes = 0.0, 0
+    for text in SOLVER_POSITIONS:
+        board = board_from_string(text, board_class)
+        solver = EndgameSolver()
+        start = timeit.default_timer()
+        solver.solve(board, -1)
+        seconds += timeit.default_timer() - start
+        nodes += solver.nodes
+    return len(SOLVER_POSITIONS), seconds, nodes
+
+
+def _result(name, board_name, ops, seconds, nodes=None):
+    result = {
+        "name": name,
+        "board": board_name,
+        "ops": ops,
+        "seconds": round(seconds, 6),
+        "ops_per_sec": round(ops / seconds, 1) if seconds else 0.0,
+    }
+    if nodes is not None:
+        result["nodes"] = nodes
+        result["nodes_per_sec"] = round(nodes / seconds, 1) if seconds else 0.0
+    return result
+
+
+def run(board_names=("list", "bitboard"), repeat=5, alpha_depth=4, minimax_depth=3):
+    """ Run every benchmark on the given boards and return the results as a
+    list of dictionaries. """
+    results = []
+    for board_name in board_names:
+        board_class = boards[board_name]
+        results.append(_result("legal_moves", board_name, *bench_legal_moves(board_class, repeat)))
+        results.append(_result("execute_move", board_name, *bench_execute_move(board_class, repeat)))
+        results.append(_result("heuristic", board_name, *bench_heuristic(board_class, repeat)))
+        if vectorized.available():
+            results.append(_result("evaluate_boards", board_name,
+                                   *bench_evaluate_boards(board_class, repeat)))
+        results.append(_result(f"alpha_beta_d{alpha_depth}", board_name,
+                               *bench_search(board_class, True, alpha_depth)))
+        results.append(_result(f"minimax_d{minimax_depth}", board_name,
+                               *bench_search(board_class, False, minimax_depth)))
+        results.append(_result("endgame_solve", board_name, *bench_endgame(board_class)))
+    return results
+
+
+def run_parallel(board_name="bitboard", depth=6, worker_counts=(1, 2, 4)):
+    """ Run the parallel search benchmark with each number of workers and
+    return the results, with the speedup over the first count. """
+    results = []
+    for workers in worker_counts:
+        result = _result(f"alpha_beta_d{depth}_w{workers}", board_name,
+                         *bench_parallel(boards[board_name], depth, workers))
+        result["workers"] = workers
+        result["speedup"] = round(results[0]["seconds"] / result["seconds"], 2) if results else 1.0
+        results.append(result)
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results, baseline=None):
+    """ Print the results as a table, with the speedup over the baseline
+    results when given. """
+    old = {(result["name"], result["board"]): result for result in baseline or []}
+    for result in results:
+        line = f"{result['name']:16s} {result['board']:9s} {result['ops_per_sec']:12.1f} ops/s"
+        if "nodes_per_sec" in result:
+            line += f" {result['nodes_per_sec']:10.1f} nodes/s"
+        else:
+            line += " " * 18
+        previous = old.get((result["name"], result["board"]))
+        if "speedup" in result:
+            line += f"  {result['workers']} workers, speedup x{result['speedup']:.2f}"
+        elif previous and previous["ops_per_sec"]:
+            line += f"  x{result['ops_per_sec'] / previous['ops_per_sec']:.2f}"
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the boards and the engines on a fixed set of positions.")
+    parser.add_argument("--board", type=str, choices=boards, help="only benchmark this board implementation")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each operation benchmark, the best is kept")
+    parser.add_argument("--json", type=str, help="write the results to this file")
+    parser.add_argument("--compare", type=str, help="show the speedup over the results saved in this file")
+    parser.add_argument("--workers", type=str, help="comma-separated worker counts: benchmark the parallel search instead")
+    parser.add_argument("--depth", type=int, default=6, help="search depth of the parallel benchmark")
+    parser.add_argument("--tt-games", type=int, help="benchmark the persistent transposition table on a series of this many games instead")
+    args = parser.parse_args()
+
+    if args.tt_games:
+        board_name = args.board or "bitboard"
+        depth = min(args.depth, 4) if args.depth == parser.get_default("depth") else args.depth
+        (cold_moves, cold, _), (warm_moves, warm, _) = bench_persistent_table(boards[board_name], depth,
+                                                                             args.tt_games)
+        results = [_result(f"tt_cold_d{depth}", board_name, cold_moves, cold),
+                   _result(f"tt_warm_d{depth}", board_name, warm_moves, warm)]
+        print(f"{cold / cold_moves * 1000:.1f}ms per move cold, {warm / warm_moves * 1000:.1f}ms warm, "
+              f"x{cold / warm:.2f}")
+    elif args.workers:
+        print(f"{multiprocessing.cpu_count()} CPUs")
+        results = run_parallel(args.board or "bitboard", args.depth,
+                               [int(count) for count in args.workers.split(",")])
+    else:
+        results = run([args.board] if args.board else list(boards), args.repeat)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    report(results, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "commit": _commit(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpus": multiprocessing.cpu_count(),
+                "numpy": vectorized.available(),
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
@@ -0,0 +1,335 @@
+"""
+Bitboard implementation of the Othello board.
+
+The position is stored as two 64-bit integers, one per color. Square (x, y)
+is bit x*8 + y, the same order AlphaEngine.WEIGHTS uses, so a piece at
+board[i//8][i%8] is bit i. Moves and flips are found with shift-and-mask
+flood fills instead of walking every direction square by square.
+
+BitBoard exposes the same public API as board.Board, including board[x][y]
+indexing, so it can be used by every engine and by the GUI.
+"""
+
+import random
+import symmetry
+from board import Board, MOVE_CACHE_SIZE, ZOBRIST, move_cache_key, print_moves, zobrist_hash
+
+FULL = 0xFFFFFFFFFFFFFFFF
+# Bits of the y == 0 and y == 7 rows
+ROW_0 = 0x0101010101010101
+ROW_7 = ROW_0 << 7
+
+# (shift, mask) for each direction in Board order. A positive shift is a
+# left shift. The mask drops the bits that wrapped around the y axis.
+DIRECTIONS = [(dx * 8 + dy, FULL & ~(ROW_0 if dy == 1 else ROW_7 if dy == -1 else 0))
+              for dx, dy in [(1,1),(1,0),(1,-1),(0,-1),(-1,-1),(-1,0),(-1,1),(0,1)]]
+
+
+def shift(bits, amount, mask):
+    """ Shift every bit one step in a direction, dropping the bits that fall
+    off the board. """
+    if amount > 0:
+        return (bits << amount) & mask
+    return (bits >> -amount) & mask
+
+
+def legal_moves(own, opp):
+    """ Return the bitmask of legal moves for the player owning own. """
+    empty = ~(own | opp) & FULL
+    moves = 0
+    for amount, mask in DIRECTIONS:
+        line = shift(own, amount, mask) & opp
+        # A line of opponent pieces is at most six squares long
+        for _ in range(5):
+            line |= shift(line, amount, mask) & opp
+        moves |= shift(line, amount, mask) & empty
+    return moves
+
+
+def _rays(square):
+    # The bits met walking from square to the edge in each direction, for
+    # the directions that have at least two squares to walk
+    rays = []
+    for amount, mask in DIRECTIONS:
+        ray = []
+        cursor = shift(1 << square, amount, mask)
+        while cursor:
+            ray.append(cursor)
+            cursor = shift(cursor, amount, mask)
+        if len(ray) >= 2:
+            rays.append(ray)
+    return rays
+
+RAYS = [_rays(square) for square in range(64)]
+
+
+def flips(own, opp, square):
+    """ Return the bitmask of opponent pieces flipped by playing on square
+    (a bit index). """
+    flipped = 0
+    for ray in RAYS[square]:
+        line = 0
+        for bit in ray:
+            if bit & opp:
+                line |= bit
+            else:
+                if bit & own:
+                    flipped |= line
+                break
+    return flipped
+
+
+def popcount(bits):
+    """ Return the number of set bits. """
+    return bin(bits).count('1')
+
+
+def neighbours(bits):
+    """ Return the bitmask of the squares next to at least one set bit. """
+    result = 0
+    for amount, mask in DIRECTIONS:
+        result |= shift(bits, amount, mask)
+    return result
+
+
+def weight_masks(weights):
+    """ Group 64 square weights, indexed x*8 + y, into (weight, mask) pairs,
+    one per nonzero weight, so that a weighted sum over the squares of a
+    bitboard is a few popcounts. """
+    masks = {}
+    for square, weight in enumerate(weights):
+        if weight:
+            masks[weight] = masks.get(weight, 0) | 1 << square
+    return sorted(masks.items())
+
+
+def weighted_sum(own, opp, masks):
+    """ Sum of the weights of the own squares minus those of the opponent's,
+    with masks from weight_masks. """
+    return sum(weight * (popcount(own & mask) - popcount(opp & mask)) for weight, mask in masks)
+
+
+# Zobrist change of a square turning from one color to the other
+FLIP_KEYS = [ZOBRIST[1][square] ^ ZOBRIST[-1][square] for square in range(64)]
+
+
+def hash_bits(bits, keys):
+    """ Return the xor of keys[i] for every set bit i. """
+    value = 0
+    while bits:
+        low = bits & -bits
+        value ^= keys[low.bit_length() - 1]
+        bits ^= low
+    return value
+
+
+def squares(bits):
+    """ Return the (x, y) coordinates of the set bits. """
+    result = []
+    while bits:
+        low = bits & -bits
+        index = low.bit_length() - 1
+        result.append((index >> 3, index & 7))
+        bits ^= low
+    return result
+
+
+def to_bitboards(board, color):
+    """ Return the (own, opponent) bitmasks of any board from the given
+    color's point of view. """
+    if isinstance(board, BitBoard):
+        return board.bitboards(color)
+    own = opp = 0
+    for x, y in board.get_squares(color):
+        own |= 1 << (x * 8 + y)
+    for x, y in board.get_squares(-color):
+        opp |= 1 << (x * 8 + y)
+    return own, opp
+
+
+class _Column():
+    """ Column view returned by BitBoard[x] so that board[x][y] works. """
+    __slots__ = ('board', 'x')
+
+    def __init__(self, board, x):
+        self.board = board
+        self.x = x
+
+    def __getitem__(self, y):
+        return self.board.get_square(self.x, y)
+
+    def __setitem__(self, y, color):
+        self.board.set_square(self.x, y, color)
+
+    def __len__(self):
+        return 8
+
+    def __iter__(self):
+        return (self[y] for y in range(8))
+
+
+class BitBoard():
+
+    def __init__(self):
+        """ Set up initial board configuration. """
+        self.__pieces = {1: 0, -1: 0}
+        # Zobrist hash of the position, identical to the one Board keeps
+        self.hash = 0
+        # Legal moves by move_cache_key, shared with the copies of the board
+        self.__legal = {}
+        self.set_square(3, 4, 1)
+        self.set_square(4, 3, 1)
+        self.set_square(3, 3, -1)
+        self.set_square(4, 4, -1)
+
+    def __getitem__(self, index):
+        return _Column(self, index)
+
+    def get_square(self, x, y):
+        """ Return the color of the piece on (x, y), or 0 when it is empty. """
+        bit = 1 << (x * 8 + y)
+        if self.__pieces[1] & bit:
+            return 1
+        if self.__pieces[-1] & bit:
+            return -1
+        return 0
+
+    def set_square(self, x, y, color):
+        """ Put a piece of the given color on (x, y), or clear it when color
+        is 0. """
+        square = x * 8 + y
+        old = self.get_square(x, y)
+        if old:
+            self.hash ^= ZOBRIST[old][square]
+            self.__pieces[old] &= ~(1 << square)
+        if color:
+            self.hash ^= ZOBRIST[color][square]
+            self.__pieces[color] |= 1 << square
+
+    def bitboards(self, color):
+        """ Return the (own, opponent) bitmasks from the given color's
+        point of view. """
+        return self.__pieces[color], self.__pieces[-color]
+
+    def display(self, time):
+        """" Display the board and the statistics of the ongoing game. """
+        Board.display(self, time)
+
+    def count(self, color):
+        """ Count the number of pieces of the given color.
+        (1 for white, -1 for black, 0 for empty spaces) """
+        if color == 0:
+            return 64 - popcount(self.__pieces[1] | self.__pieces[-1])
+        return popcount(self.__pieces[color])
+
+    def get_squares(self, color):
+        """ Get the coordinates (x,y) for all pieces on the board of the given color.
+        (1 for white, -1 for black, 0 for empty spaces) """
+        if color == 0:
+            return squares(~(self.__pieces[1] | self.__pieces[-1]) & FULL)
+        return squares(self.__pieces[color])
+
+    def get_legal_moves(self, color):
+        """ Return all the legal moves for the given color.
+        (1 for white, -1 for black)
+        The result is cached by position, so asking again about a position
+        costs a dictionary lookup. """
+        key = move_cache_key(self.hash, color)
+        moves = self.__legal.get(key)
+        if moves is None:
+            moves = tuple(squares(legal_moves(self.__pieces[color], self.__pieces[-color])))
+            if len(self.__legal) >= MOVE_CACHE_SIZE:
+                self.__legal.clear()
+            self.__legal[key] = moves
+        return list(moves)
+
+    def execute_move(self, move, color):
+        """ Perform the given move on the board, and flips pieces as necessary.
+        color gives the color of the piece to play (1 for white, -1 for black)
+        Return an undo record that undo_move uses to take the move back. """
+        x, y = move
+        square = x * 8 + y
+        flipped = flips(self.__pieces[color], self.__pieces[-color], square)
+        # Like Board, a move that flips nothing leaves the board untouched
+        if flipped:
+            self.__pieces[color] |= flipped | (1 << square)
+            self.__pieces[-color] &= ~flipped
+            self.hash ^= ZOBRIST[color][square] ^ hash_bits(flipped, FLIP_KEYS)
+        return (square, color, flipped)
+
+    def undo_move(self, undo):
+        """ Take back a move, given the undo record returned by execute_move. """
+        square, color, flipped = undo
+        if flipped:
+            self.__pieces[color] &= ~(flipped | (1 << square))
+            self.__pieces[-color] |= flipped
+            self.hash ^= ZOBRIST[color][square] ^ hash_bits(flipped, FLIP_KEYS)
+
+    def copy(self):
+        """ Return an independent copy of the board. """
+        board = BitBoard.__new__(BitBoard)
+        board.__pieces = dict(self.__pieces)
+        board.hash = self.hash
+        board.__legal = self.__legal
+        return board
+
+    def canonical(self):
+        """ Return (position, symmetries), see Board.canonical. """
+        return symmetry.canonical(self.__pieces[-1], self.__pieces[1])
+
+
+def check_equivalence(games=100, seed=0):
+    """ Play random games on a Board and a BitBoard side by side and raise
+    AssertionError as soon as they disagree. Return the number of positions
+    compared. """
+    rng = random.Random(seed)
+    positions = 0
+    for _ in range(games):
+        board, bitboard = Board(), BitBoard()
+        color = -1
+        passes = 0
+        while passes < 2:
+            for c in (-1, 0, 1):
+                assert bitboard.count(c) == board.count(c)
+                assert sorted(bitboard.get_squares(c)) == sorted(board.get_squares(c))
+            for x in range(8):
+                for y in range(8):
+                    assert bitboard[x][y] == board[x][y]
+            assert bitboard.hash == board.hash == zobrist_hash(board)
+            moves = sorted(board.get_legal_moves(color))
+            assert sorted(bitboard.get_legal_moves(color)) == moves
+            positions += 1
+            if moves:
+                # Trying every move and taking it back must leave both
+                # boards exactly as they were
+                before = [list(board[x]) for x in range(8)]
+                for move in moves:
+                    undo = board.execute_move(move, color)
+                    bitundo = bitboard.execute_move(move, color)
+                    assert bitboard.count(color) == board.count(color)
+                    board.undo_move(undo)
+                    bitboard.undo_move(bitundo)
+                assert [list(board[x]) for x in range(8)] == before
+                assert [list(bitboard[x]) for x in range(8)] == before
+                move = rng.choice(moves)
+                board.execute_move(move, color)
+                bitboard.execute_move(move, color)
+                passes = 0
+            else:
+                passes += 1
+            color = -color
+    return positions
+
+
+if __name__ == '__main__':
+    board = BitBoard()
+    dummy_time = {1: 300, -1: 300}
+    board.display(dummy_time)
+
+    print("Black: ", end='')
+    print_moves(sorted(board.get_legal_moves(-1)))
+
+    print("White: ", end='')
+    print_moves(sorted(board.get_legal_moves(1)))
+
+    print(f"\nBoard and BitBoard agree on {check_equivalence()} positions")
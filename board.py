@@ -1,3 +1,36 @@
+import random
+import symmetry
+
+# Zobrist keys for each color and square (x*8 + y). The generator is seeded
+# so that a position hashes to the same value in every run.
+_zobrist_random = random.Random(20110917)
+ZOBRIST = {color: [_zobrist_random.getrandbits(64) for _ in range(64)]
+           for color in (-1, 1)}
+# Xored into a hash to tell apart the same position with white to move
+ZOBRIST_WHITE = _zobrist_random.getrandbits(64)
+
+
+def zobrist_hash(board):
+    """ Compute the Zobrist hash of a board from scratch. """
+    value = 0
+    for x in range(8):
+        for y in range(8):
+            color = board[x][y]
+            if color:
+                value ^= ZOBRIST[color][x * 8 + y]
+    return value
+
+
+# Number of positions whose legal moves a board family keeps before the
+# cache is emptied
+MOVE_CACHE_SIZE = 1 << 16
+
+
+def move_cache_key(board_hash, color):
+    """ Key of the legal moves of color in the position with this hash. """
+    return board_hash ^ ZOBRIST_WHITE if color == 1 else board_hash
+
+
 class Board():
     __directions = [(1,1),(1,0),(1,-1),(0,-1),(-1,-1),(-1,0),(-1,1),(0,1)]
 
@@ -10,6 +43,11 @@ class Board():
         self.__pieces[4][3] = 1
         self.__pieces[3][3] = -1
         self.__pieces[4][4] = -1
+        # Zobrist hash of the position, kept up to date by execute_move and
+        # undo_move. Writing to board[x][y] directly bypasses it.
+        self.hash = zobrist_hash(self)
+        # Legal moves by move_cache_key, shared with the copies of the board
+        self.__legal = {}
 
     def __getitem__(self, index):
         return self.__pieces[index]
@@ -57,14 +95,61 @@ class Board():
 
     def get_legal_moves(self, color):
         """ Return all the legal moves for the given color.
-        (1 for white, -1 for black) """
-        moves = set()
-        for square in self.get_squares(color):
-            newmoves = self.get_moves_for_square(square)
-            if newmoves:
-                moves.update(newmoves)
+        (1 for white, -1 for black)
+        The result is cached by position, so asking again about a position
+        costs a dictionary lookup. """
+        key = move_cache_key(self.hash, color)
+        moves = self.__legal.get(key)
+        if moves is None:
+            moves = set()
+            for square in self.get_squares(color):
+                newmoves = self.get_moves_for_square(square)
+                if newmoves:
+                    moves.update(newmoves)
+            moves = frozenset(moves)
+            self._cache_moves(key, moves)
         return list(moves)
 
+    def _cache_moves(self, key, moves):
+        if len(self.__legal) >= MOVE_CACHE_SIZE:
+            self.__legal.clear()
+        self.__legal[key] = moves
+
+    def _update_legal_moves(self, parent_hash, move, flips):
+        # Derive the legal moves of the new position from those of the
+        # parent, when they are cached. Only the empty squares that see one
+        # of the changed squares along a line of pieces can change status.
+        affected = set()
+        for x, y in [move] + flips:
+            for dx, dy in self.__directions:
+                nx, ny = x + dx, y + dy
+                while 0 <= nx < 8 and 0 <= ny < 8 and self[nx][ny] != 0:
+                    nx, ny = nx + dx, ny + dy
+                if 0 <= nx < 8 and 0 <= ny < 8:
+                    affected.add((nx, ny))
+        for color in (-1, 1):
+            moves = self.__legal.get(move_cache_key(parent_hash, color))
+            if moves is None:
+                continue
+            moves = set(moves)
+            moves.discard(move)
+            moves -= affected
+            moves.update(square for square in affected if self._is_legal(square, color))
+            self._cache_moves(move_cache_key(self.hash, color), frozenset(moves))
+
+    def _is_legal(self, square, color):
+        # Whether color may play on the empty square
+        x, y = square
+        for dx, dy in self.__directions:
+            nx, ny = x + dx, y + dy
+            seen = False
+            while 0 <= nx < 8 and 0 <= ny < 8 and self[nx][ny] == -color:
+                nx, ny = nx + dx, ny + dy
+                seen = True
+            if seen and 0 <= nx < 8 and 0 <= ny < 8 and self[nx][ny] == color:
+                return True
+        return False
+
     def get_moves_for_square(self, square):
         # Return all the legal moves that use the given square as a base 
         # square. That is, if the given square is (3,4) and it contains a black 
@@ -84,15 +169,67 @@ class Board():
 
     def execute_move(self, move, color):
         """ Perform the given move on the board, and flips pieces as necessary.
-        color gives the color of the piece to play (1 for white, -1 for black) """
+        color gives the color of the piece to play (1 for white, -1 for black)
+        Return an undo record that undo_move uses to take the move back. """
         # Start at the new piece's square and follow it on all 8 directions
-        # to look for pieces allowing flipping
-        
+        # to look for pieces allowing flipping. Each direction's list starts
+        # with the move itself, so drop it from the flipped squares.
+        flips = [flip for direction in self.__directions
+                      for flip in self._get_flips(move, direction, color)[1:]]
         # Add the piece to the empty square
-        flips = (flip for direction in self.__directions
-                      for flip in self._get_flips(move, direction, color))
+        if flips:
+            parent_hash = self.hash
+            self[move[0]][move[1]] = color
+            self.hash ^= self._hash_change(move, color, flips)
+            for x, y in flips:
+                self[x][y] = color
+            self._update_legal_moves(parent_hash, move, flips)
+        return (move, color, flips)
+
+    def undo_move(self, undo):
+        """ Take back a move, given the undo record returned by execute_move. """
+        move, color, flips = undo
+        if flips:
+            self[move[0]][move[1]] = 0
+            self.hash ^= self._hash_change(move, color, flips)
+        for x, y in flips:
+            self[x][y] = -color
+
+    def copy(self):
+        """ Return an independent copy of the board. """
+        board = Board.__new__(Board)
+        board.__pieces = [column[:] for column in self.__pieces]
+        board.hash = self.hash
+        board.__legal = self.__legal
+        return board
+
+    def canonical(self):
+        """ Return (position, symmetries): the smallest of the 8 symmetric
+        forms of the position, as a (black, white) pair of bitmasks, and
+        the symmetries that map this board onto it (see symmetry.py). Use
+        symmetry.transform_move to map a move of this board to the
+        canonical form, and symmetry.INVERSE to map it back. """
+        black = white = 0
+        bit = 1
+        for column in self.__pieces:
+            for color in column:
+                if color == -1:
+                    black |= bit
+                elif color == 1:
+                    white |= bit
+                bit <<= 1
+        return symmetry.canonical(black, white)
+
+    @staticmethod
+    def _hash_change(move, color, flips):
+        # Xor of the Zobrist keys that change when color plays move and
+        # turns over flips. Applying it twice cancels out.
+        own, opp = ZOBRIST[color], ZOBRIST[-color]
+        change = own[move[0] * 8 + move[1]]
         for x, y in flips:
-            self[x][y] = color
+            square = x * 8 + y
+            change ^= own[square] ^ opp[square]
+        return change
 
     def _discover_move(self, origin, direction):
         # Return the endpoint of a legal move, starting at the given origin,
@@ -134,6 +271,21 @@ class Board():
             yield tuple(move)
             move = list(map(sum, zip(move, direction)))
 
+def board_to_string(board):
+    """ Return the position as 64 characters, a1 b1 ... h1 a2 ... h8, with X
+    for black, O for white and - for empty squares. """
+    return ''.join({-1: 'X', 1: 'O', 0: '-'}[board[x][y]]
+                   for y in range(8) for x in range(8))
+
+def board_from_string(text, board_class=Board):
+    """ Build a board of the given class from the format of board_to_string. """
+    board = board_class()
+    pieces = {'X': -1, 'O': 1, '-': 0}
+    for index, char in enumerate(text):
+        board[index % 8][index // 8] = pieces[char]
+    board.hash = zobrist_hash(board)
+    return board
+
 def get_col_char(col):
     return chr(ord('a') + col)
 
@@ -0,0 +1,284 @@
+"""
+Opening book.
+
+The book maps positions of the opening to statistics of the moves played
+from them: games, points (2 per win, 1 per draw, for the side that moved)
+and the sum of the final disc differentials. Equivalent positions under the
+8 symmetries of the board share one entry: a position is keyed by the
+Zobrist hash of its canonical form (Board.canonical), and moves are stored
+in the coordinates of that form.
+
+The file is an open-addressing hash table of fixed-size records that is
+memory-mapped when opened, so loading costs nothing and a lookup reads a
+few records:
+
+    header  magic b"OBK1", version, number of slots, number of entries
+    slots   key (u64), square x*8 + y (u8), pad, games (u32), points (u32),
+            discs (i32)
+
+A slot belongs to the position whose key it holds, and the moves of a
+position sit in consecutive slots from key % slots, up to the first empty
+slot (games == 0).
+
+Build a book from self-play, or from game transcripts such as
+"c5c6f4d3c4...", one game per line, in the coordinates othello.py prints:
+
+    python book.py build book.bin --games 500 --plies 16 -j 4
+    python book.py build book.bin --transcripts games.txt
+    python book.py show book.bin
+
+AlphaEngine plays from a book only when asked to: through load_book, or by
+naming the book file in the OTHELLO_BOOK environment variable, which the
+engines of every process read when they are created.
+
+    OTHELLO_BOOK=book.bin python othello.py alpha greedy -aB
+"""
+
+import argparse
+import mmap
+import multiprocessing
+import os
+import random
+import struct
+from board import Board, ZOBRIST, ZOBRIST_WHITE, move_string
+from bitboard import hash_bits
+from symmetry import INVERSE, SQUARE_MAP
+
+MAGIC = b"OBK1"
+VERSION = 2
+HEADER = struct.Struct("<4sIII")
+ENTRY = struct.Struct("<QBxIIi")
+
+# Environment variable that names the book file of AlphaEngine
+ENVIRONMENT = "OTHELLO_BOOK"
+# A move is only played from the book after this many games
+MIN_GAMES = 2
+
+
+def position_key(board, color):
+    """ Return (key, symmetries): the book key of the position with color to
+    move, and the symmetries that turn the position into its canonical
+    form. There are several when the position is itself symmetric. """
+    (black, white), symmetries = board.canonical()
+    key = hash_bits(black, ZOBRIST[-1]) ^ hash_bits(white, ZOBRIST[1])
+    if color == 1:
+        key ^= ZOBRIST_WHITE
+    return key, symmetries
+
+
+class OpeningBook():
+    """ Read-only view of a book file. """
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.slots, self.entries = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} opening book")
+
+    def close(self):
+        """ Unmap and close the book file. """
+        self._map.close()
+        self._file.close()
+
+    def lookup(self, board, color):
+        """ Return the book moves of color as a list of (move, games, points,
+        discs), most played first. """
+        key, symmetries = position_key(board, color)
+        inverse = SQUARE_MAP[INVERSE[symmetries[0]]]
+        moves = []
+        index = key % self.slots
+        while True:
+            entry_key, square, games, points, discs = ENTRY.unpack_from(
+                self._map, HEADER.size + index * ENTRY.size)
+            if games == 0:
+                break
+            if entry_key == key:
+                square = inverse[square]
+                moves.append(((square >> 3, square & 7), games, points, discs))
+            index = (index + 1) % self.slots
+        moves.sort(key=lambda entry: entry[1], reverse=True)
+        return moves
+
+    def choose(self, board, color, min_games=MIN_GAMES):
+        """ Return the book move with the best score, or None when no move
+        was played at least min_games times. """
+        best, best_score = None, None
+        for move, games, points, discs in self.lookup(board, color):
+            if games < min_games:
+                continue
+            score = (points / games, discs / games)
+            if best_score is None or score > best_score:
+                best, best_score = move, score
+        return best
+
+
+def load():
+    """ Return the OpeningBook of the file named by the OTHELLO_BOOK
+    environment variable, or None when it is not set. """
+    path = os.environ.get(ENVIRONMENT)
+    if not path:
+        return None
+    return OpeningBook(path)
+
+
+class BookBuilder():
+    """ Gathers move statistics from complete games and writes a book. """
+
+    def __init__(self, plies=16):
+        """ Only the first plies moves of every game go into the book. """
+        self.plies = plies
+        self.stats = {}
+        self.games = 0
+
+    def add_game(self, moves):
+        """ Add a game given as its list of moves, None for a pass. """
+        board, color = Board(), -1
+        seen = []
+        for move in moves:
+            if move is None:
+                color = -color
+                continue
+            if len(seen) < self.plies:
+                # Moves that are equivalent in a symmetric position share
+                # one entry
+                key, symmetries = position_key(board, color)
+                square = min(SQUARE_MAP[symmetry][move[0] * 8 + move[1]] for symmetry in symmetries)
+                seen.append((key, square, color))
+            if move not in board.get_legal_moves(color):
+                raise ValueError(f"illegal move {move_string(move)} in game {self.games + 1}")
+            board.execute_move(move, color)
+            color = -color
+        difference = board.count(1) - board.count(-1)
+        for key, square, mover in seen:
+            discs = difference * mover
+            points = 2 if discs > 0 else 1 if discs == 0 else 0
+            entry = self.stats.setdefault((key, square), [0, 0, 0])
+            entry[0] += 1
+            entry[1] += points
+            entry[2] += discs
+        self.games += 1
+
+    def write(self, path):
+        """ Write the book file, with at most half of its slots in use. """
+        slots = 1
+        while slots < 2 * len(self.stats) or slots < 16:
+            slots *= 2
+        data = bytearray(HEADER.size + slots * ENTRY.size)
+        HEADER.pack_into(data, 0, MAGIC, VERSION, slots, len(self.stats))
+        used = [False] * slots
+        for (key, square), (games, points, discs) in self.stats.items():
+            index = key % slots
+            while used[index]:
+                index = (index + 1) % slots
+            used[index] = True
+            ENTRY.pack_into(data, HEADER.size + index * ENTRY.size, key, square, games, points, discs)
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+def parse_transcript(text):
+    """ Return the moves of a transcript such as "c5c6f4", where passes
+    are left out. Passes are put back by replaying the game. """
+    text = text.strip().lower()
+    board, color, moves = Board(), -1, []
+    for index in range(0, len(text), 2):
+        move = (ord(text[index]) - ord('a'), int(text[index + 1]) - 1)
+        if not board.get_legal_moves(color):
+            moves.append(None)
+            color = -color
+        board.execute_move(move, color)
+        moves.append(move)
+        color = -color
+    return moves
+
+
+def _self_play(task):
+    # Play one game: random moves for the first random_plies plies, then the
+    # engine for both colors. Return the list of moves.
+    seed, settings, random_plies = task
+    from tournament import make_engine
+    rng = random.Random(seed)
+    engine = make_engine(settings)
+    # The games must not follow the book being rebuilt, whose file may be
+    # written while this process has it mapped
+    if getattr(engine, "book", None) is not None:
+        engine.book.close()
+        engine.book = None
+    board, color, moves, passes = Board(), -1, [], 0
+    while passes < 2:
+        legal = board.get_legal_moves(color)
+        if not legal:
+            moves.append(None)
+            passes += 1
+        else:
+            passes = 0
+            if len(moves) < random_plies:
+                move = rng.choice(legal)
+            elif len(legal) == 1:
+                move = legal[0]
+            else:
+                move = engine.get_move(board.copy(), color, len(moves) // 2)
+            board.execute_move(move, color)
+            moves.append(move)
+        color = -color
+    return moves
+
+
+def build_from_self_play(builder, games, settings, random_plies=4, workers=1, seed=0):
+    """ Play games with the engine given by tournament.PlayerSettings on
+    both sides and add them to the builder. """
+    tasks = [(seed + index, settings, random_plies) for index in range(games)]
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            for moves in pool.imap_unordered(_self_play, tasks):
+                builder.add_game(moves)
+    else:
+        for task in tasks:
+            builder.add_game(_self_play(task))
+
+
+if __name__ == '__main__':
+    import io
+    from contextlib import redirect_stdout
+    from tournament import PlayerSettings
+
+    parser = argparse.ArgumentParser(description="Build or inspect an opening book.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book")
+    build.add_argument("path", type=str, help="book file to write")
+    build.add_argument("--transcripts", type=str, help="read the games from this file, one transcript per line, instead of playing them")
+    build.add_argument("--games", type=int, default=200, help="number of self-play games")
+    build.add_argument("--plies", type=int, default=16, help="number of opening plies kept from each game")
+    build.add_argument("--random", type=int, default=4, help="number of random plies at the start of each self-play game")
+    build.add_argument("--engine", type=str, default="alpha", help="self-play engine")
+    build.add_argument("--level", type=int, default=3, help="search depth of the self-play engine")
+    build.add_argument("--seed", type=int, default=0, help="seed of the random plies")
+    build.add_argument("-j", type=int, default=1, help="play the games on this many worker processes")
+    show = commands.add_parser("show", help="print the book moves of the initial position")
+    show.add_argument("path", type=str, help="book file to read")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        builder = BookBuilder(args.plies)
+        if args.transcripts:
+            with open(args.transcripts) as f:
+                for line in f:
+                    if line.strip():
+                        builder.add_game(parse_transcript(line))
+        else:
+            with redirect_stdout(io.StringIO()):
+                build_from_self_play(builder, args.games,
+                                     PlayerSettings(args.engine, True, args.level, None),
+                                     args.random, args.j, args.seed)
+        builder.write(args.path)
+        print(f"{builder.games} games, {len(builder.stats)} entries written to {args.path}")
+    else:
+        book = OpeningBook(args.path)
+        print(f"{book.entries} entries in {book.slots} slots")
+        board = Board()
+        for move, games, points, discs in book.lookup(board, -1):
+            print(f"{move_string(move)}: {games} games, {points / (2 * games):.0%} score, "
+                  f"{discs / games:+.1f} discs")
+        book.close()
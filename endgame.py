@@ -0,0 +1,234 @@
+"""
+Exact endgame solver.
+
+Once few empty squares are left, the game can be searched to the end. The
+solver works on bitboards and returns the exact final disc differential
+(own pieces minus opponent pieces, empty squares not counted, like
+othello.winner) with perfect play from both sides.
+
+The search is a negamax alpha-beta with:
+- an empty-square list ordered by parity: squares in quadrants with an odd
+  number of empties are tried first,
+- fastest-first ordering (fewest opponent replies first) while many
+  empties are left,
+- dedicated code for the last one, two and three empty squares.
+
+Run python endgame.py to benchmark it on a fixed set of positions with
+known exact scores.
+"""
+
+import sys
+import timeit
+from bitboard import BitBoard, FULL, flips, legal_moves, popcount, to_bitboards
+from board import board_from_string
+
+# Quadrant (0-3) of every square, by bit index x*8 + y
+QUADRANT = [(square >> 5) * 2 + ((square & 7) >> 2) for square in range(64)]
+# Above this many empties, moves are sorted by the opponent's mobility
+FASTEST_FIRST = 7
+# How often (in nodes) the deadline is checked
+CHECK_EVERY = 1024
+
+
+class EndgameSolver():
+    """ Negamax solver for the final disc differential. """
+
+    def __init__(self, deadline=None):
+        """ deadline is a timeit.default_timer() value after which solve
+        raises TimeoutError. """
+        self.deadline = deadline
+        self.nodes = 0
+
+    def solve(self, board, color):
+        """ Return (score, move): the exact final disc differential for color
+        to move and a move reaching it, or None when color has to pass. """
+        own, opp = to_bitboards(board, color)
+        empties = self._parity_order(_empties(own, opp))
+        moves = [(square, flipped) for square, flipped in
+                 ((square, flips(own, opp, square)) for square in empties) if flipped]
+        if not moves:
+            return -self._search(opp, own, empties, -64, 64, True), None
+        moves = self._order(own, opp, moves, len(empties))
+        best_score, best_move = -65, None
+        alpha = -64
+        for square, flipped in moves:
+            rest = [other for other in empties if other != square]
+            score = -self._search(opp & ~flipped, own | flipped | (1 << square), rest,
+                                  -64, -alpha, False)
+            if score > best_score:
+                best_score, best_move = score, (square >> 3, square & 7)
+                alpha = max(alpha, score)
+        return best_score, best_move
+
+    def _search(self, own, opp, empties, alpha, beta, passed):
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % CHECK_EVERY == 0:
+            if timeit.default_timer() > self.deadline:
+                raise TimeoutError("endgame solver ran out of time")
+        count = len(empties)
+        if count == 1:
+            return _solve1(own, opp, empties[0])
+        if count == 2:
+            return self._solve2(own, opp, empties[0], empties[1], alpha, beta)
+        empties = self._parity_order(empties)
+        if count == 3:
+            return self._solve3(own, opp, empties, alpha, beta)
+
+        moves = [(square, flipped) for square, flipped in
+                 ((square, flips(own, opp, square)) for square in empties) if flipped]
+        if not moves:
+            if passed:
+                return popcount(own) - popcount(opp)
+            return -self._search(opp, own, empties, -beta, -alpha, True)
+        moves = self._order(own, opp, moves, count)
+
+        best = -65
+        for square, flipped in moves:
+            rest = [other for other in empties if other != square]
+            score = -self._search(opp & ~flipped, own | flipped | (1 << square), rest,
+                                  -beta, -alpha, False)
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+    def _order(self, own, opp, moves, count):
+        # Parity order is kept by the empties list. With many empties left,
+        # search first the moves that leave the opponent the fewest replies.
+        if count > FASTEST_FIRST and len(moves) > 1:
+            moves.sort(key=lambda item: popcount(legal_moves(
+                opp & ~item[1], own | item[1] | (1 << item[0]))))
+        return moves
+
+    @staticmethod
+    def _parity_order(empties):
+        """ Return the empties with those in odd quadrants first. """
+        parity = [0, 0, 0, 0]
+        for square in empties:
+            parity[QUADRANT[square]] ^= 1
+        return sorted(empties, key=lambda square: not parity[QUADRANT[square]])
+
+    def _solve2(self, own, opp, first, second, alpha, beta):
+        self.nodes += 1
+        best = -65
+        for square, other in ((first, second), (second, first)):
+            flipped = flips(own, opp, square)
+            if flipped:
+                score = -_solve1(opp & ~flipped, own | flipped | (1 << square), other)
+                if score > best:
+                    best = score
+                    if best >= beta:
+                        return best
+        if best > -65:
+            return best
+        # No move: the opponent plays, or the game is over
+        worst = 65
+        for square, other in ((first, second), (second, first)):
+            flipped = flips(opp, own, square)
+            if flipped:
+                score = _solve1(own & ~flipped, opp | flipped | (1 << square), other)
+                if score < worst:
+                    worst = score
+                    if worst <= alpha:
+                        return worst
+        if worst < 65:
+            return worst
+        return popcount(own) - popcount(opp)
+
+    def _solve3(self, own, opp, empties, alpha, beta):
+        self.nodes += 1
+        best = -65
+        for square in empties:
+            flipped = flips(own, opp, square)
+            if flipped:
+                first, second = [other for other in empties if other != square]
+                score = -self._solve2(opp & ~flipped, own | flipped | (1 << square),
+                                      first, second, -beta, -alpha)
+                if score > best:
+                    best = score
+                    if score > alpha:
+                        alpha = score
+                        if alpha >= beta:
+                            return best
+        if best > -65:
+            return best
+        # Pass, unless the opponent cannot move either
+        for square in empties:
+            if flips(opp, own, square):
+                return -self._search(opp, own, empties, -beta, -alpha, True)
+        return popcount(own) - popcount(opp)
+
+
+def _empties(own, opp):
+    empty = ~(own | opp) & FULL
+    result = []
+    while empty:
+        low = empty & -empty
+        result.append(low.bit_length() - 1)
+        empty ^= low
+    return result
+
+
+def _solve1(own, opp, square):
+    # Final score with a single empty square: the side to move plays it if
+    # possible, otherwise the opponent does, otherwise it stays empty.
+    flipped = flips(own, opp, square)
+    if flipped:
+        count = popcount(flipped)
+        return popcount(own) - popcount(opp) + 2 * count + 1
+    flipped = flips(opp, own, square)
+    if flipped:
+        count = popcount(flipped)
+        return popcount(own) - popcount(opp) - 2 * count - 1
+    return popcount(own) - popcount(opp)
+
+
+def solve(board, color, deadline=None):
+    """ Return (score, move) for color to move, see EndgameSolver.solve. """
+    return EndgameSolver(deadline).solve(board, color)
+
+
+# Positions reached by random play, with black (X) to move, and their exact
+# scores for black. The scores were checked with a plain negamax that has
+# none of the solver's orderings or special cases.
+BENCHMARK_POSITIONS = [
+    ("XXXX---O--XOO-OOOXXXOOXOXX-OOOO-XXOOOXOOXXOOOOOOXXOXXOOOXXXX-X-O", +24),
+    ("-OOXXXXX-OOOXXX-OXOXOX-XOXOXOOXXOOOOOXXXOOOOOXXX-OX-OOXX-X---OXX", +42),
+    ("--OOOO--OOOOXO--OXOXXOOOOXXOXO-OOXXXXXXXOOXOXOX-OOOXXXOOOOX-XXX-", +1),
+    ("OXXXXXXOOXXOOXO-OXXOXOX--OXOOXXXOOOOOO--OOOOXOXXOOO-XOOXO-OX---X", +26),
+    ("XXXX----XXOXOO--XOXOXO--OOOOOOOOO-OOXXO-XOXOXOX-XOOOOXX-OOOOOOXO", -8),
+    ("----OOOX-OOOOOOOXOOXXX-OXOOOXX--XOOXOXOOOOOXOOXXOXXXXXXX-X-XXX--", +2),
+    ("OOOOOO--XXXOO---OOOOOXXXOOOXXOX--OXXX-O-XOXXXOOX-OXXXOOX-OXXX-OX", +30),
+    ("X--OOO-XOOOOOXXXOOXOXOXXOOXXOXXXXOOXXXX-XXOOXXX-O-OOOOXO-O---O--", +14),
+    ("-OOX----X-OO-XXX-XXXOXXOXXOOXOX-OOOXXXXXOOOOOOXOOO-O-XO--XXXXX-O", +4),
+    ("XX-X-OX-OXOOOO--OOOOOOOX-OXXOXX-XXOXOXO--XXOOXOX-OOOOXXX---XOX-X", +6),
+]
+
+
+def benchmark(positions=BENCHMARK_POSITIONS):
+    """ Solve every benchmark position, check its score and print the time
+    and nodes per second. Return False if a score is wrong. """
+    correct = True
+    total_nodes, total_time = 0, 0.0
+    for index, (text, expected) in enumerate(positions):
+        board = board_from_string(text, BitBoard)
+        solver = EndgameSolver()
+        start = timeit.default_timer()
+        score, move = solver.solve(board, -1)
+        elapsed = timeit.default_timer() - start
+        total_nodes += solver.nodes
+        total_time += elapsed
+        status = "ok" if score == expected else f"WRONG (expected {expected:+d})"
+        correct = correct and score == expected
+        print(f"#{index + 1:2d} {board.count(0):2d} empties  score {score:+3d}  "
+              f"{solver.nodes:8d} nodes  {elapsed:7.3f}s  {status}")
+    print(f"\nTotal: {total_nodes} nodes in {total_time:.2f}s "
+          f"({int(total_nodes / total_time) if total_time else 0} nodes/s)")
+    return correct
+
+
+if __name__ == '__main__':
+    sys.exit(0 if benchmark() else 1)
@@ -0,0 +1,115 @@
+"""
+Remote engine server.
+
+Runs any engine of engines/ for players on other machines. othello.py and
+othello_gui.py play it through the remote engine (engines/remote.py), which
+sends the position, the color to move, move_num and both clocks, and gets
+back the move and the search statistics.
+
+Every connection has an engine of its own, built once with the settings
+given here and kept for all the moves and games played over it, so that the
+transposition table of the engine stays warm. Where the system can fork,
+every connection is served by its own process, so several clients search in
+parallel.
+
+Messages are JSON frames, as in engines/network.py:
+
+    handshake  {"type": "handshake", "engine": name}, sent by the server
+    search     {"type": "search", "id", "position", "color", "move_num",
+                "time_remaining", "time_opponent"}, position in the
+               board_to_string format
+    result     {"type": "result", "id", "move", "stats"}, move null for a
+               pass and stats null for engines that keep none
+    error      {"type": "error", "id", "message"}
+
+    python engine_server.py alpha -a -l 6 -e 14 --port 12346
+    OTHELLO_REMOTE=<server>:12346 python othello.py remote greedy
+"""
+
+import argparse
+import socketserver
+from board import board_from_string
+from engines.network import BUFFER_SIZE, encode_message, receive_message
+from othello import boards
+from tournament import PlayerSettings, make_engine
+
+DEFAULT_PORT = 12346
+
+# One process per connection where possible, one thread otherwise
+_BaseServer = getattr(socketserver, "ForkingTCPServer", socketserver.ThreadingTCPServer)
+
+
+class EngineHandler(socketserver.BaseRequestHandler):
+    """ Serves the search requests of one connection. """
+
+    def handle(self):
+        server = self.server
+        view = memoryview(bytearray(BUFFER_SIZE))
+        engine = make_engine(server.settings)
+        if server.workers:
+            engine.workers = server.workers
+        try:
+            self.request.sendall(encode_message({"type": "handshake", "engine": server.settings.engine}))
+            while True:
+                try:
+                    message = receive_message(self.request, view)
+                except (OSError, ValueError):
+                    break
+                if message is None:
+                    break
+                self.request.sendall(encode_message(self.search(engine, message)))
+        finally:
+            if hasattr(engine, "close"):
+                engine.close()
+
+    def search(self, engine, message):
+        """ Return the reply to a request. """
+        if message.get("type") != "search":
+            return {"type": "error", "id": message.get("id"),
+                    "message": f"unknown request {message.get('type')!r}"}
+        try:
+            board = board_from_string(message["position"], boards[self.server.board])
+            move = engine.get_move(board, message["color"], message.get("move_num"),
+                                   message.get("time_remaining"), message.get("time_opponent"))
+        except Exception as e:
+            return {"type": "error", "id": message.get("id"), "message": f"{type(e).__name__}: {e}"}
+        stats = getattr(engine, "last_stats", None)
+        return {"type": "result", "id": message.get("id"),
+                "move": list(move) if move is not None else None,
+                "stats": stats.as_dict() if stats is not None else None}
+
+
+class EngineServer(_BaseServer):
+    """ TCP server of an engine built from tournament.PlayerSettings. """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, settings, board="list", workers=None):
+        self.settings = settings
+        self.board = board
+        self.workers = workers
+        super().__init__(address, EngineHandler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve an engine to remote players.")
+    parser.add_argument("engine", type=str, help="engine module of engines/ to serve")
+    parser.add_argument("-a", action="store_true", help="use alpha-beta pruning")
+    parser.add_argument("-l", type=int, default=4, help="search depth")
+    parser.add_argument("-e", type=int, help="number of empty squares at which the endgame is solved exactly")
+    parser.add_argument("-w", type=int, help="number of processes of the alpha-beta search")
+    parser.add_argument("--host", type=str, default="0.0.0.0", help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on")
+    parser.add_argument("--board", type=str, default="list", choices=boards, help="board implementation (list, bitboard)")
+    args = parser.parse_args()
+
+    server = EngineServer((args.host, args.port), PlayerSettings(args.engine, args.a, args.l, args.e),
+                          args.board, args.w)
+    print(f"Serving {args.engine} on port {args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n- Engine server stopped")
+    finally:
+        server.server_close()
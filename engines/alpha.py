@@ -1,7 +1,28 @@
 from __future__ import absolute_import
 from engines import Engine
-from copy import deepcopy
+from board import ZOBRIST_WHITE, board_from_string, board_to_string
+from bitboard import BitBoard, FULL, neighbours, popcount, weight_masks, weighted_sum
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from endgame import EndgameSolver
+from ordering import MoveOrdering
+from searchstats import SearchStats
+import book
+import patterns
+import ttstore
+import vectorized
+import io
+import multiprocessing
 import random
+import time
+import timeit
+import zlib
+from contextlib import redirect_stdout
+
+
+class SearchTimeout(Exception):
+    """ Raised inside the search when the time for the move has run out. """
+
+
 class AlphaEngine(Engine):
     #set the infinity
     INFINITY = float('inf')
@@ -13,10 +34,31 @@ class AlphaEngine(Engine):
                2, -1, 1, 0, 0, 1, -1, 2,
                -3, -4, -1, -1, -1, -1, -4, -3,
                4, -3, 2, 2, 2, 2, -3, 4]
-    num_node = 0
-    num_dup = 0
-    node_list = []
-    branch_list = [0,0,0]
+    # Xored into the transposition table keys, indexed by heuristic phase
+    # and root color, so that scores of different searches never mix
+    SEARCH_KEYS = [random.Random(i).getrandbits(64) for i in range(6)]
+    # Rounds (one black and one white move) in a typical game
+    GAME_ROUNDS = 30
+    # Seconds of the clock that time management never plans to use
+    TIME_RESERVE = 1.0
+    # Fraction of the move's budget after which no new iteration is started
+    NEXT_ITERATION = 0.4
+    # Fraction of the move's budget the endgame solver may use before the
+    # heuristic search takes over
+    ENDGAME_SHARE = 0.5
+    # Multiplier of the disc differential of finished games
+    FINAL_WEIGHT = 1000
+    # Searches between two saves to the persistent table, before their
+    # entries get overwritten in the transposition table
+    SAVE_INTERVAL = 4
+    # WEIGHTS as (weight, mask) pairs for BitBoard positions
+    WEIGHT_MASKS = weight_masks(WEIGHTS)
+    # WEIGHTS as an 8x8 array for the NumPy evaluation
+    WEIGHT_ARRAY = vectorized.weight_array(WEIGHTS) if vectorized.available() else None
+    # Pattern weights heuristic uses instead of its terms, see
+    # load_patterns. Engines made without __init__, to call heuristic, have
+    # none.
+    patterns = None
     
     """ Game engine that implements a simple fitness function maximizing the
     difference in number of pieces in the given color's favor. """
@@ -24,226 +66,542 @@ class AlphaEngine(Engine):
         self.alpha_beta = False
         self.ply_maxmin = 4
         self.ply_alpha = 4
+        # Solve the game exactly once this many squares or fewer are empty
+        self.endgame_empties = 12
+        # Opening book, memory-mapped from the file named by the
+        # OTHELLO_BOOK environment variable; None to always search
+        self.book = book.load()
+        # Pattern weights that replace heuristic, from the file named by the
+        # OTHELLO_PATTERNS environment variable; None for heuristic
+        self.patterns = patterns.load()
+        # Let minimax score the children of the nodes just above the leaves
+        # in one NumPy call, when NumPy is installed. Alpha-beta searches
+        # them one by one, since a cutoff often makes the rest unnecessary.
+        self.vectorized = vectorized.available()
+        # Shared by minimax and alpha-beta; the hits, misses and collisions
+        # counters are available through self.table.stats()
+        self.table = TranspositionTable()
+        # Persistent table the transposition table is preloaded from and
+        # saved to, see load_table
+        self.table_store = None
+        self._saved_generation = 0
+        # Orders the moves of alpha-beta nodes; its cutoff statistics for
+        # the last move are available through self.ordering.stats()
+        self.ordering = MoveOrdering(AlphaEngine.WEIGHTS)
+        self._key_salt = 0
+        # Search state of the current get_move call
+        self._deadline = None
+        self._root_scores = {}
+        self._pv_moves = {}
+        self._depth = 0
+        self.depth_reached = 0
+        # SearchStats of the current get_move call, then of the last one
+        self._stats = SearchStats()
+        self.last_stats = None
+        # Alpha-beta searches the root moves after the first one on this
+        # many worker processes
+        self.workers = 1
+        self._pool = None
+        self._shared_alpha = None
         print("Call alpha beta pruning\n")
 
     def get_move(self, board, color, move_num=None,
                  time_remaining=None, time_opponent=None):
-        """ Return a move for the given color that maximizes the difference in 
-        number of pieces for that color. """
-        # Get a list of all legal moves.
-        # moves = board.get_legal_moves(color)
-
-        # Return the best move according to our simple utility function:
-        # which move yields the largest different in number of pieces for the
-        # given color vs. the opponent?
-        # print(self.ply_maxmin," ", self.ply_alpha," ", self.alpha_beta)
-        if (self.alpha_beta == False):
-           score, finalmove = self._minmax(board, color, move_num, time_remaining, time_opponent, self.ply_maxmin)
-        else:
-           score, finalmove = self._minmax_with_alpha_beta(board, color, move_num, time_remaining, time_opponent, self.ply_alpha)
-       # print "final move" + str(finalmove) + "final score: " + str(score) + "number of nodes:" + str(StudentEngine.num_node) + "number of duplicate" + str(StudentEngine.num_dup) + str(StudentEngine.node_list)# + str(self.cornerweight(color, board)) + "get cost:" + str(self._get_cost(board, color))
-        #print "ply = 3" + str(StudentEngine.branch_list[0]) + "ply =2" + str(StudentEngine.branch_list[1]) + "ply = 1" + str(StudentEngine.branch_list[2])
-        return finalmove
-        #maxmin function created by hyl
-    def _minmax(self, board, color, move_num, time_remaining, time_opponent, ply):
-        #need to get all the legal moves
-        #def value(board):
-        #    return self.minmax(board, -color, move_num, time_remaining, time_opponent, ply-1)[0]
-        #if ply == 0:
-        #   return board.count(color), None
+        """ Return a move for the given color, searched by iterative
+        deepening up to ply_alpha (alpha-beta) or ply_maxmin (minimax) plies
+        within the time allocated to this move. """
+        start = timeit.default_timer()
+        self._stats = SearchStats(color, move_num)
+        if self.book is not None:
+            move = self.book.choose(board, color)
+            if move is not None and move in board.get_legal_moves(color):
+                self.depth_reached = 0
+                self._stats.book = True
+                return self._finish(start, move)
+        budget = self._time_budget(move_num, time_remaining, time_opponent)
+        empties = board.count(0)
+        first_deadline = None
+        if empties <= self.endgame_empties:
+            solver = EndgameSolver(None if budget is None else start + budget * AlphaEngine.ENDGAME_SHARE)
+            try:
+                score, move = solver.solve(board, color)
+                self.depth_reached = empties
+                self._stats.endgame = True
+                return self._finish(start, move)
+            except TimeoutError:
+                # Fall back to the heuristic search with what is left. Even
+                # its first iteration must end by the budget.
+                first_deadline = start + budget
+            finally:
+                self._stats.nodes += solver.nodes
+        if self.table.generation - self._saved_generation >= AlphaEngine.SAVE_INTERVAL:
+            self.save_table()
+        self.table.new_search()
+        self.ordering.new_search()
+        self.ordering.clear_stats()
+        self._key_salt = AlphaEngine.SEARCH_KEYS[2 * self._phase(move_num) + (color == 1)]
+        self._deadline = first_deadline
+        self._root_scores = {}
+        self._pv_moves = {}
+        tt_hits = self.table.hits
+        if self.patterns is not None:
+            # Keeps the pattern codes up to date along the search
+            board = patterns.PatternBoard(board)
+        ply = self.ply_alpha if self.alpha_beta else self.ply_maxmin
+        ply = max(1, min(ply, empties))
+
+        finalmove = None
+        for depth in range(1, ply + 1):
+            # An aborted iteration leaves moves on the board it searched, so
+            # every iteration works on its own copy
+            self._depth = depth
+            try:
+                if (self.alpha_beta == False):
+                    score, move = self._minmax(board.copy(), color, move_num, depth)
+                else:
+                    score, move = self._minmax_with_alpha_beta(board.copy(), color, move_num, depth)
+            except SearchTimeout:
+                break
+            finalmove = move
+            self.depth_reached = depth
+            self._pv_moves = self._principal_variation(board.copy(), color, depth)
+            if budget is not None:
+                # The first iteration completes so that there is a move to
+                # play, unless the endgame solver took part of the budget.
+                # After that, stop when the next iteration is
+                # unlikely to finish, and abort it if it overruns the budget.
+                if timeit.default_timer() - start > budget * AlphaEngine.NEXT_ITERATION:
+                    break
+                self._deadline = start + budget
+        self._deadline = None
+        if finalmove is None:
+            # The first iteration ran out of time: play the best move by
+            # greedy
+            finalmove = self._root_moves(board, color, True)[0]
+            self.depth_reached = 0
+        ordering = self.ordering.stats()
+        self._stats.cutoffs = ordering["cutoffs"]
+        self._stats.first_cutoffs = ordering["first_cutoffs"]
+        self._stats.tt_hits = self.table.hits - tt_hits
+        return self._finish(start, finalmove)
+
+    def _finish(self, start, move):
+        """ Complete the statistics of the search and return its move. """
+        self._stats.move = move
+        self._stats.depth = self.depth_reached
+        self._stats.elapsed = timeit.default_timer() - start
+        self.last_stats = self._stats
+        return move
+
+    def _time_budget(self, move_num, time_remaining, time_opponent):
+        """ Return the number of seconds to spend on this move, or None when
+        the game has no clock. """
+        if time_remaining is None:
+            return None
+        # move_num counts rounds, and a game lasts about 30 of them. Keep a
+        # couple of moves in reserve for passes.
+        moves_left = max(AlphaEngine.GAME_ROUNDS - (move_num or 0), 1) + 2
+        budget = time_remaining / moves_left
+        # Spend more when ahead on the clock and less when behind
+        if time_opponent:
+            budget *= min(max(time_remaining / time_opponent, 0.5), 2.0)
+        # Never risk more than a fraction of the clock on a single move
+        return max(min(budget, (time_remaining - AlphaEngine.TIME_RESERVE) * 0.5), 0)
+
+    def _check_time(self):
+        """ Raise SearchTimeout once the current iteration has overrun the
+        time allocated to the move. """
+        if self._deadline is not None and timeit.default_timer() > self._deadline:
+            raise SearchTimeout
+
+    def _root_moves(self, board, color, ordered):
+        """ Return the root moves, best first according to the previous
+        iteration. Before the first iteration, sort them by greedy when
+        ordered is set. """
         moves = board.get_legal_moves(color)
-        if move_num > 7 and move_num < 15:
-           self.ply_maxmin = 2
-        if time_remaining < 20:
-           return (0, max(moves, key=lambda move: self.greedy(board, color, move)) )
-
-        #print "leagal move" + str(moves)
-        if not isinstance(moves, list):
-           score = self.heuristic(board, color, move_num)
-           return score,None
-        #if time_remaining < 10:
-        #   return (0, max(moves, key=lambda move: self.greedy(board, color, move)) )
-        #print ply
+        if self._root_scores:
+            moves.sort(key=lambda move: self._root_scores.get(move, -AlphaEngine.INFINITY), reverse=True)
+        elif ordered:
+            moves.sort(key=lambda move: self.greedy(board, color, move), reverse=True)
+        return moves
+
+    def _principal_variation(self, board, color, depth):
+        """ Follow the best moves stored in the transposition table from the
+        root. Return them as a dictionary from table key to move, which the
+        next iteration searches first. """
+        pv = {}
+        for _ in range(depth):
+            key = self._key(board, color)
+            entry = self.table.get(key)
+            if entry is None or entry[4] is None:
+                break
+            pv[key] = entry[4]
+            board.execute_move(entry[4], color)
+            color = -color
+        return pv
+
+    def _minmax(self, board, color, move_num, ply):
+        self._stats.nodes += 1
+        moves = self._root_moves(board, color, False)
         return_move = moves[0]
         bestscore = - AlphaEngine.INFINITY
-        #       print "using minmax best score:"+ str(bestscore)
-        #ply = 4
-        #will define ply later;
+        scores = {}
         for move in moves:
-            #if move in StudentEngine.node_list:
-            #   StudentEngine.num_dup += 1
-            #if move not in StudentEngine.node_list:
-            #   StudentEngine.node_list.append(move)
-            #StudentEngine.num_node += 1 
-            #StudentEngine.branch_list[0] += 1
-            newboard = deepcopy(board)
-            newboard.execute_move(move,color)
-
-            score = self.min_score(newboard, -color, move_num, ply-1)
+            undo = board.execute_move(move, color)
+            score = self.min_score(board, -color, move_num, ply-1)
+            board.undo_move(undo)
+            scores[move] = score
             if score > bestscore:
                 bestscore = score
                 return_move = move
-                #print "return move" + str(return_move) + "bestscore" + str(bestscore)
-        #newboard = deepcopy(board)
-        #return max((value(newboard.execute_move(m, color)),m) for m in moves)
+        self.table.store(self._key(board, color), ply, EXACT, bestscore, return_move)
+        self._root_scores = scores
         return (bestscore,return_move)
 
-    #MAX_VALUE = StudentEngine.INFINITY
-    #MIN_VALUE = -MAX_VALUE
-
-
     def max_score(self, board, color, move_num, ply):
-        #print "move_num" + str(move_num)
-        moves = board.get_legal_moves(color)
-        #if not isinstance(moves, list):
-        #   return board.count(color)
+        self._check_time()
+        self._stats.nodes += 1
+        key = self._key(board, color)
+        score, _ = self._probe(key, ply, -AlphaEngine.INFINITY, AlphaEngine.INFINITY)
+        if score is not None:
+            return score
         if ply == 0:
-           #StudentEngine.num_node += 1
-           return self.heuristic(board, color, move_num)
+            score = self.heuristic(board, color, move_num)
+            self._stats.leaves += 1
+            self.table.store(key, 0, EXACT, score, None)
+            return score
+        moves = board.get_legal_moves(color)
+        if not moves:
+            if not board.get_legal_moves(-color):
+                return self._final_score(board, color)
+            return self.min_score(board, -color, move_num, ply-1)
         bestscore = -AlphaEngine.INFINITY
-        for move in moves:
-            #if move in StudentEngine.node_list:
-            #    StudentEngine.num_dup += 1
-            #if move not in StudentEngine.node_list:
-            #    StudentEngine.node_list.append(move)
-            #if (ply == 2):
-            #     StudentEngine.branch_list[1] += 1
-            #if (ply == 1):
-            #     StudentEngine.branch_list[2] += 1            
-            #StudentEngine.num_node += 1        
-            newboard = deepcopy(board)
-            newboard.execute_move(move,color)
-            score = self.min_score(newboard, -color, move_num, ply-1)
+        bestmove = None
+        leaves = self._leaf_scores(board, color, moves, move_num, color, ply)
+        for index, move in enumerate(moves):
+            if leaves is not None:
+                score = leaves[index]
+            else:
+                undo = board.execute_move(move, color)
+                score = self.min_score(board, -color, move_num, ply-1)
+                board.undo_move(undo)
             if score > bestscore:
                 bestscore = score
+                bestmove = move
+        self.table.store(key, ply, EXACT, bestscore, bestmove)
         return bestscore
 
     def min_score(self, board, color, move_num, ply):
-        #print "move_num" + str(move_num)
-        moves = board.get_legal_moves(color)
-        #if not isinstance(moves, list):
-        #   return board.count(color)
+        self._check_time()
+        self._stats.nodes += 1
+        key = self._key(board, color)
+        score, _ = self._probe(key, ply, -AlphaEngine.INFINITY, AlphaEngine.INFINITY)
+        if score is not None:
+            return score
         if ply == 0:
-           #StudentEngine.num_node += 1
-           return self.heuristic(board, color, move_num)
+            # Leaves are always scored for the player at the root
+            score = self.heuristic(board, -color, move_num)
+            self._stats.leaves += 1
+            self.table.store(key, 0, EXACT, score, None)
+            return score
+        moves = board.get_legal_moves(color)
+        if not moves:
+            if not board.get_legal_moves(-color):
+                return self._final_score(board, -color)
+            return self.max_score(board, -color, move_num, ply-1)
         bestscore = AlphaEngine.INFINITY
-        for move in moves:
-            if move in AlphaEngine.node_list:
-                AlphaEngine.num_dup += 1
-            if move not in AlphaEngine.node_list:
-                AlphaEngine.node_list.append(move)
-            #if (ply == 2):
-            #     StudentEngine.branch_list[1] += 1
-            #if (ply == 1):
-            #     StudentEngine.branch_list[2] += 1            
-            #StudentEngine.num_node += 1
-            newboard = deepcopy(board)
-            newboard.execute_move(move,color)
-            score = self.max_score(newboard, -color, move_num, ply-1)
+        bestmove = None
+        leaves = self._leaf_scores(board, color, moves, move_num, -color, ply)
+        for index, move in enumerate(moves):
+            if leaves is not None:
+                score = leaves[index]
+            else:
+                undo = board.execute_move(move, color)
+                score = self.max_score(board, -color, move_num, ply-1)
+                board.undo_move(undo)
             if score < bestscore:
                 bestscore = score
+                bestmove = move
+        self.table.store(key, ply, EXACT, bestscore, bestmove)
         return bestscore
 
-    def _minmax_with_alpha_beta(self, board, color, move_num, time_remaining, time_opponent, ply):
-        moves = board.get_legal_moves(color)
-        #print "leagal move" + str(moves)
-        if not isinstance(moves, list):
-           score = board.count(color)
-           return score, None
-        moves.sort(key=lambda move: self.greedy(board, color, move), reverse=False)
-        #moves = moves[:6] # Chỉ kiểm tra 6 node đầu 
-        #print ply
+    def _minmax_with_alpha_beta(self, board, color, move_num, ply):
+        self._stats.nodes += 1
+        moves = self._root_moves(board, color, True)
         return_move = moves[0]
         bestscore = - AlphaEngine.INFINITY
-        #print "using alpha_beta best score:"+ str(bestscore)
-        #ply = 4
-        #will define ply later;
-        #if move_num > 7 and move_num < 15:
-        #   StudentEngine.ply_maxmin = 2;
-        if time_remaining < 5:
-           return (0, max(moves, key=lambda move: self.greedy(board, color, move)) )
-        for move in moves:
-            #if move in StudentEngine.node_list:
-            #    StudentEngine.num_dup += 1
-            #if move not in StudentEngine.node_list:
-            #    StudentEngine.node_list.append(move)
-            #StudentEngine.num_node += 1
-            newboard = deepcopy(board)
-            newboard.execute_move(move,color)
-            AlphaEngine.branch_list[0] +=1
-            score = self.min_score_alpha_beta(newboard, -color, move_num, ply-1, -AlphaEngine.INFINITY, AlphaEngine.INFINITY)
+        scores = {}
+        for index, move in enumerate(moves):
+            if index == 1 and self._parallel(len(moves), ply):
+                # Young Brothers Wait: the first move set a bound, search
+                # the others at once. Their scores come in the order they
+                # finish, so the first one to reach a score is exact.
+                for move, score in self._search_in_parallel(board, color, move_num, ply, moves[1:], bestscore):
+                    scores[move] = score
+                    if score > bestscore:
+                        bestscore = score
+                        return_move = move
+                break
+            undo = board.execute_move(move, color)
+            # Only moves better than the best so far matter; the others
+            # return an upper bound of their score
+            score = self.min_score_alpha_beta(board, -color, move_num, ply-1, bestscore, AlphaEngine.INFINITY)
+            board.undo_move(undo)
+            scores[move] = score
             if score > bestscore:
                bestscore = score
                return_move = move
-               #print "return move" + str(return_move) + "best score" + str(bestscore)
-
+        self.table.store(self._key(board, color), ply, EXACT, bestscore, return_move)
+        self._root_scores = scores
         return (bestscore,return_move)
 
+    def _parallel(self, num_moves, ply):
+        """ Whether the root moves after the first are searched by the
+        worker pool. Worker processes of a tournament, which are daemons,
+        cannot start processes of their own and search serially. """
+        return (self.workers > 1 and num_moves > 1 and ply > 1
+                and not multiprocessing.current_process().daemon)
+
+    def _search_in_parallel(self, board, color, move_num, ply, moves, alpha):
+        """ Search the root moves on the worker pool with alpha as the first
+        bound, and yield (move, score) as the searches finish. Every score
+        better than the best so far is shared with the searches that have
+        not started yet. """
+        if self._pool is None:
+            self._shared_alpha = multiprocessing.Value('d', -AlphaEngine.INFINITY)
+            self._pool = multiprocessing.Pool(self.workers, _init_search_worker, (self._shared_alpha,))
+        self._shared_alpha.value = alpha
+        # Workers get the deadline on the wall clock, which all processes share
+        deadline = None
+        if self._deadline is not None:
+            deadline = time.time() + self._deadline - timeit.default_timer()
+        text = board_to_string(board)
+        board_class = type(board.board if isinstance(board, patterns.PatternBoard) else board)
+        patterns_path = self.patterns.path if self.patterns is not None else None
+        tasks = [(text, board_class, color, move, move_num, ply, self._key_salt, deadline, self.vectorized,
+                  patterns_path) for move in moves]
+        for move, score, nodes, leaves in self._pool.imap_unordered(_search_root_move, tasks):
+            self._stats.nodes += nodes
+            self._stats.leaves += leaves
+            if score is None:
+                raise SearchTimeout
+            with self._shared_alpha.get_lock():
+                if score > self._shared_alpha.value:
+                    self._shared_alpha.value = score
+            yield move, score
+
+    def close(self):
+        """ Stop the worker processes of the parallel search, if any, unmap
+        the opening book, and save and close the persistent table. """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+        if self.book is not None:
+            self.book.close()
+            self.book = None
+        if self.table_store is not None:
+            self.save_table()
+            self.table_store.close()
+            self.table_store = None
+
+    def table_signature(self):
+        """ Identify the evaluation the scores of the transposition table
+        come from, so that a persistent table of another one is not used. """
+        signature = zlib.crc32(repr((AlphaEngine.WEIGHTS, AlphaEngine.FINAL_WEIGHT,
+                                     AlphaEngine.SEARCH_KEYS)).encode())
+        if self.patterns is not None:
+            signature = zlib.crc32(self.patterns.signature.to_bytes(4, 'little'), signature)
+        return signature
+
+    def load_book(self, path):
+        """ Play the moves of the opening book at path before searching. """
+        if self.book is not None:
+            self.book.close()
+        self.book = book.OpeningBook(path)
+
+    def load_patterns(self, path):
+        """ Score the leaves with the pattern weights at path instead of
+        heuristic. Call it before load_table, whose scores depend on the
+        evaluation. """
+        self.patterns = patterns.PatternWeights.read(path)
+
+    def load_table(self, path, slots=ttstore.DEFAULT_SLOTS):
+        """ Preload the transposition table from the persistent table at
+        path, which is created when missing. save_table writes back what
+        the following searches store. """
+        self.table_store = ttstore.TableStore(path, slots, self.table_signature())
+        self.table_store.load_into(self.table)
+        self._saved_generation = self.table.generation
+
+    def save_table(self):
+        """ Write the entries stored since the last save to the persistent
+        table, if any. """
+        if self.table_store is not None:
+            self.table_store.save_from(self.table, self._saved_generation)
+            self.table_store.flush()
+            self._saved_generation = self.table.generation
+
     def max_score_alpha_beta(self, board, color, move_num, ply, alpha, beta):
+        self._check_time()
+        self._stats.nodes += 1
+        key = self._key(board, color)
+        score, ttmove = self._probe(key, ply, alpha, beta)
+        if score is not None:
+            return score
         if ply == 0:
-            #StudentEngine.num_node +=1
-            return self.heuristic(board, color, move_num)
+            score = self.heuristic(board, color, move_num)
+            self._stats.leaves += 1
+            self.table.store(key, 0, EXACT, score, None)
+            return score
+        alpha_orig = alpha
         bestscore = -AlphaEngine.INFINITY
-        moves = board.get_legal_moves(color)
-        #moves.sort(key=lambda move: self.greedy(board, color, move), reverse=True)
-
-        for move in moves:
-
-            #if (ply == 2):
-            #     StudentEngine.branch_list[1] += 1
-            #if (ply == 1):
-            #     StudentEngine.branch_list[2] += 1
-
-            #if move in StudentEngine.node_list:
-            #    StudentEngine.num_dup += 1
-            #if move not in StudentEngine.node_list:
-            #    StudentEngine.node_list.append(move)            
-            #StudentEngine.num_node += 1
-            newboard = deepcopy(board)
-            newboard.execute_move(move,color)
-            score = self.min_score_alpha_beta(newboard, -color, move_num, ply-1, alpha, beta)
+        bestmove = None
+        height = self._depth - ply
+        moves = self.ordering.order(board.get_legal_moves(color), color, height,
+                                    self._pv_moves.get(key, ttmove))
+        if not moves:
+            if not board.get_legal_moves(-color):
+                return self._final_score(board, color)
+            return self.min_score_alpha_beta(board, -color, move_num, ply-1, alpha, beta)
+        for index, move in enumerate(moves):
+            undo = board.execute_move(move, color)
+            score = self.min_score_alpha_beta(board, -color, move_num, ply-1, alpha, beta)
+            board.undo_move(undo)
             if score > bestscore:
                 bestscore = score
+                bestmove = move
             if bestscore >= beta:
+                self.ordering.cutoff(move, color, height, ply, index)
+                self.table.store(key, ply, LOWER, bestscore, bestmove)
                 return bestscore
             alpha = max (alpha,bestscore)
+        bound = UPPER if bestscore <= alpha_orig else EXACT
+        self.table.store(key, ply, bound, bestscore, bestmove)
         return bestscore
 
     def min_score_alpha_beta(self, board, color, move_num, ply, alpha, beta):
+        self._check_time()
+        self._stats.nodes += 1
+        key = self._key(board, color)
+        score, ttmove = self._probe(key, ply, alpha, beta)
+        if score is not None:
+            return score
         if ply == 0:
-             #StudentEngine.num_node +=1
-            return self.heuristic(board, color, move_num)
+            # Leaves are always scored for the player at the root
+            score = self.heuristic(board, -color, move_num)
+            self._stats.leaves += 1
+            self.table.store(key, 0, EXACT, score, None)
+            return score
+        beta_orig = beta
         bestscore = AlphaEngine.INFINITY
-        moves = board.get_legal_moves(color)
-        #moves.sort(key=lambda move: self.greedy(board, color, move), reverse=True)
-
-        for move in moves:
-              #if (ply == 2):
-              #   StudentEngine.branch_list[1] += 1
-              #if (ply == 1):
-              #   StudentEngine.branch_list[2] += 1
-              #if move in StudentEngine.node_list:
-              #   StudentEngine.num_dup += 1
-              #if move not in StudentEngine.node_list:
-              #   StudentEngine.node_list.append(move)
-              #StudentEngine.num_node += 1
-            newboard = deepcopy(board)
-            newboard.execute_move(move,color)
-            score = self.max_score_alpha_beta(newboard, -color, move_num, ply-1, alpha, beta)
+        bestmove = None
+        height = self._depth - ply
+        moves = self.ordering.order(board.get_legal_moves(color), color, height,
+                                    self._pv_moves.get(key, ttmove))
+        if not moves:
+            if not board.get_legal_moves(-color):
+                return self._final_score(board, -color)
+            return self.max_score_alpha_beta(board, -color, move_num, ply-1, alpha, beta)
+        for index, move in enumerate(moves):
+            undo = board.execute_move(move, color)
+            score = self.max_score_alpha_beta(board, -color, move_num, ply-1, alpha, beta)
+            board.undo_move(undo)
             if score < bestscore:
                 bestscore = score
+                bestmove = move
             if bestscore <= alpha:
+                self.ordering.cutoff(move, color, height, ply, index)
+                self.table.store(key, ply, UPPER, bestscore, bestmove)
                 return bestscore
             beta = min(beta,bestscore)
+        bound = LOWER if bestscore >= beta_orig else EXACT
+        self.table.store(key, ply, bound, bestscore, bestmove)
         return bestscore
 
+    def _leaf_scores(self, board, color, moves, move_num, root_color, ply):
+        """ When the children of a node are leaves and vectorized is set,
+        return their scores for root_color, in the order of moves. Return
+        None when the children have to be searched one by one. """
+        if ply != 1 or not self.vectorized or self.patterns is not None:
+            return None
+        scores = [None] * len(moves)
+        keys, boards, indices = [], [], []
+        self._stats.nodes += len(moves)
+        for index, move in enumerate(moves):
+            undo = board.execute_move(move, color)
+            key = self._key(board, -color)
+            # Like a leaf searched on its own, reuse an exact score
+            score, _ = self._probe(key, 0, -AlphaEngine.INFINITY, AlphaEngine.INFINITY)
+            if score is None:
+                keys.append(key)
+                boards.append(board.copy())
+                indices.append(index)
+            else:
+                scores[index] = score
+            board.undo_move(undo)
+        if boards:
+            self._stats.leaves += len(boards)
+            for index, key, score in zip(indices, keys, self.evaluate_boards(boards, root_color, move_num)):
+                self.table.store(key, 0, EXACT, score, None)
+                scores[index] = score
+        return scores
+
+    def _key(self, board, color):
+        """ Transposition table key of the position with color to move. """
+        if color == 1:
+            return board.hash ^ ZOBRIST_WHITE ^ self._key_salt
+        return board.hash ^ self._key_salt
+
+    def _probe(self, key, ply, alpha, beta):
+        """ Look a node up in the transposition table. Return (score, move),
+        where score is None unless the stored result decides the node for
+        the (alpha, beta) window and move is the stored best move. """
+        entry = self.table.probe(key)
+        if entry is None:
+            return None, None
+        _, depth, bound, score, move, _ = entry
+        if depth >= ply and (bound == EXACT or (bound == LOWER and score >= beta)
+                             or (bound == UPPER and score <= alpha)):
+            return score, move
+        return None, move
+
+    @staticmethod
+    def _phase(move_num):
+        """ Return which of the three weightings heuristic uses. """
+        if move_num < 20:
+            return 0
+        elif move_num < 50:
+            return 1
+        return 2
+
     def heuristic(self, board, color, move_num):
-        move_count = move_num  
-        mobility = len(board.get_legal_moves(color)) - len(board.get_legal_moves(-color))
+        if self.patterns is not None:
+            return self.pattern_score(board, color)
+        own_moves = len(board.get_legal_moves(color))
+        opp_moves = len(board.get_legal_moves(-color))
+        if not own_moves and not opp_moves:
+            return self._final_score(board, color)
+        mobility = own_moves - opp_moves
         frontier = -self.frontier_discs(board, color)
         corner = self.cornerweight(color, board)
         piece_diff = self._get_cost(board, color)
+        return self._combine(move_num, mobility, frontier, corner, piece_diff)
+
+    def pattern_score(self, board, color):
+        """ Score of the position for color from the pattern weights. Leaves
+        of the search come as a PatternBoard, whose codes are up to date;
+        other boards have theirs computed. """
+        if not isinstance(board, patterns.PatternBoard):
+            board = patterns.PatternBoard(board)
+        if board.finished():
+            return self._final_score(board, color)
+        return -color * self.patterns.evaluate(board.codes, board.empties)
 
+    @staticmethod
+    def _combine(move_num, mobility, frontier, corner, piece_diff):
+        """ Weigh the heuristic terms for the phase of the game. The terms
+        can be numbers or NumPy arrays. """
+        move_count = move_num
         if move_count < 20:  
             return 4 * mobility + 3 * frontier + 2 * corner
         elif move_count < 50:  
@@ -251,7 +609,34 @@ class AlphaEngine(Engine):
         else:  
             return 5 * piece_diff + 3 * corner
 
+    def evaluate_boards(self, boards, color, move_num):
+        """ Return heuristic(board, color, move_num) for every board, computed
+        with NumPy array operations over all the boards at once. """
+        np = vectorized.np
+        own_moves = np.array([len(board.get_legal_moves(color)) for board in boards])
+        opp_moves = np.array([len(board.get_legal_moves(-color)) for board in boards])
+        positions = vectorized.stack(boards)
+        piece_diff = vectorized.disc_difference(positions, color)
+        scores = self._combine(move_num, own_moves - opp_moves,
+                               -vectorized.frontier_discs(positions, color),
+                               vectorized.weighted_squares(positions, color, AlphaEngine.WEIGHT_ARRAY),
+                               piece_diff)
+        # Finished games get the final score, as in heuristic
+        finished = (own_moves == 0) & (opp_moves == 0)
+        scores = np.where(finished, AlphaEngine.FINAL_WEIGHT * piece_diff, scores)
+        return scores.tolist()
+
+    def _final_score(self, board, color):
+        """ Score of a finished game for color: the disc differential,
+        weighted so that any win beats any heuristic score. """
+        return AlphaEngine.FINAL_WEIGHT * self._get_cost(board, color)
+
     def frontier_discs(self, board, color):
+        if isinstance(board, BitBoard):
+            # Own pieces next to an empty square, with masks instead of
+            # looking at the squares one by one
+            own, opp = board.bitboards(color)
+            return popcount(own & neighbours(~(own | opp) & FULL))
         frontier = 0
         directions = [(-1,-1), (-1,0), (-1,1), (0,-1), (0,1), (1,-1), (1,0), (1,1)]
         for r in range(8):
@@ -265,30 +650,30 @@ class AlphaEngine(Engine):
         return frontier
     
     def cornerweight(self, color, board):
+        if isinstance(board, BitBoard):
+            own, opp = board.bitboards(color)
+            return weighted_sum(own, opp, AlphaEngine.WEIGHT_MASKS)
         total = 0
         i = 0
         while i < 64:
             if board[i//8][i%8] == color:
                total += AlphaEngine.WEIGHTS[i]
-               #print "weights" + str(i) + "number:"+ str(StudentEngine.WEIGHTS[i])
             if board[i//8][i%8] == -color:
                total -= AlphaEngine.WEIGHTS[i]
-               #print "weights" + str(i) + "number:"+ str(StudentEngine.WEIGHTS[i])
             i += 1
-        #print "cornerweight" + str(total)
         return total
 
     def greedy(self, board, color, move):
         """ Return the difference in number of pieces after the given move 
         is executed. """
 
-        # Create a deepcopy of the board to preserve the state of the actual board
-        newboard = deepcopy(board)
-        newboard.execute_move(move, color)
+        # Play the move on the board itself and take it back afterwards
+        undo = board.execute_move(move, color)
 
         # Count the # of pieces of each color on the board
-        num_pieces_op = len(newboard.get_squares(color*-1))
-        num_pieces_me = len(newboard.get_squares(color))
+        num_pieces_op = board.count(color*-1)
+        num_pieces_me = board.count(color)
+        board.undo_move(undo)
 
         # Return the difference in number of pieces
         return num_pieces_me - num_pieces_op
@@ -297,15 +682,57 @@ class AlphaEngine(Engine):
         """ Return the difference in number of pieces after the given move 
         is executed. """
 
-        # Create a deepcopy of the board to preserve the state of the actual board
-        #newboard = deepcopy(board)
-        #newboard.execute_move(move, color)
-
         # Count the # of pieces of each color on the board
         num_pieces_op = board.count(-color)
         num_pieces_me = board.count(color)
-        #print "_get_cost" + str(num_pieces_me - num_pieces_op)
         # Return the difference in number of pieces
         return num_pieces_me - num_pieces_op
 
+
+# State of a parallel search worker process, set up once by _init_search_worker
+_worker = {}
+
+
+def _init_search_worker(shared_alpha):
+    with redirect_stdout(io.StringIO()):
+        engine = AlphaEngine()
+    engine.alpha_beta = True
+    # Root moves are searched, never looked up in the book
+    if engine.book is not None:
+        engine.book.close()
+        engine.book = None
+    _worker["engine"] = engine
+    _worker["alpha"] = shared_alpha
+
+
+def _search_root_move(task):
+    # Search one root move in a worker process. Return (move, score, nodes,
+    # leaves), where score is None when the deadline passed.
+    text, board_class, color, move, move_num, ply, key_salt, deadline, vectorized_on, patterns_path = task
+    engine = _worker["engine"]
+    engine.vectorized = vectorized_on
+    if patterns_path is None:
+        engine.patterns = None
+    elif engine.patterns is None or engine.patterns.path != patterns_path:
+        engine.patterns = patterns.PatternWeights.read(patterns_path)
+    engine._key_salt = key_salt
+    engine._depth = ply
+    engine._pv_moves = {}
+    engine._stats = SearchStats(color, move_num)
+    engine._deadline = None
+    if deadline is not None:
+        engine._deadline = timeit.default_timer() + deadline - time.time()
+    board = board_from_string(text, board_class)
+    if engine.patterns is not None:
+        board = patterns.PatternBoard(board)
+    board.execute_move(move, color)
+    # The best score of the root so far, found by this or another worker
+    alpha = _worker["alpha"].value
+    try:
+        score = engine.min_score_alpha_beta(board, -color, move_num, ply-1, alpha, AlphaEngine.INFINITY)
+    except SearchTimeout:
+        score = None
+    return move, score, engine._stats.nodes, engine._stats.leaves
+
+
 engine = AlphaEngine
@@ -1,5 +1,4 @@
 from engines import Engine
-from copy import deepcopy
 
 class GreedyEngine(Engine):
     """ Game engine that implements a simple fitness function maximizing the
@@ -20,13 +19,13 @@ class GreedyEngine(Engine):
         """ Return the difference in number of pieces after the given move 
         is executed. """
 
-        # Create a deepcopy of the board to preserve the state of the actual board
-        newboard = deepcopy(board)
-        newboard.execute_move(move, color)
+        # Play the move on the board itself and take it back afterwards
+        undo = board.execute_move(move, color)
 
         # Count the # of pieces of each color on the board
-        num_pieces_op = len(newboard.get_squares(color*-1))
-        num_pieces_me = len(newboard.get_squares(color))
+        num_pieces_op = board.count(color*-1)
+        num_pieces_me = board.count(color)
+        board.undo_move(undo)
 
         # Return the difference in number of pieces
         return num_pieces_me - num_pieces_op
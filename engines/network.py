@@ -5,11 +5,27 @@ One player acts as server (host), the other as client (connects to server).
 Usage:
     Server (Black player): python othello.py network_server network_receiver <host> <port>
     Client (White player): python othello.py network_receiver network_client <host> <port>
+
+Wire protocol: every message is one frame, sent with a single sendall.
+- Version 1 (JSON): a 4-byte big-endian length, then the UTF-8 JSON body.
+- Version 2 (binary): a type byte of 0x80 or more, then a fixed payload:
+  the square x*8 + y of a move, a count and that many squares for a batch
+  of moves, or a 2-byte length and a UTF-8 message for the end of the game.
+The first byte tells the two framings apart, since a JSON length never
+starts with 0x80 or more, so a receiver understands both. The server offers
+its highest version in the handshake, the client answers with the version
+both support in a "hello" message, and from then on both sides send that
+framing. Peers that predate version 2 ignore the offer and keep to JSON.
+
+Run python -m engines.network to measure the loopback round-trip time of a
+move with both framings.
 """
 
 import socket
 import threading
 import json
+import queue
+import struct
 from board import print_moves
 from engines import Engine
 
@@ -17,19 +33,108 @@ from engines import Engine
 # Global connection manager to share connection between engines on same side
 _connection_manager = None
 
+# Highest wire protocol version this side speaks
+PROTOCOL_VERSION = 2
+# Type bytes of the binary frames
+FRAME_MOVE = 0x81
+FRAME_MOVES = 0x82
+FRAME_GAME_OVER = 0x83
+# Size of the preallocated receive buffer, the largest frame accepted
+BUFFER_SIZE = 1 << 16
+
+
+def encode_message(data, version=1):
+    """ Return the frame of a message dictionary in the given protocol
+    version. Messages without a binary form are sent as JSON. """
+    kind = data.get("type")
+    if version >= 2:
+        if kind == "move":
+            x, y = data["move"]
+            return bytes((FRAME_MOVE, x * 8 + y))
+        if kind == "moves" and len(data["moves"]) < 256:
+            return bytes([FRAME_MOVES, len(data["moves"])] + [x * 8 + y for x, y in data["moves"]])
+        if kind == "game_over":
+            text = data.get("message", "").encode('utf-8')[:0xFFFF]
+            return bytes((FRAME_GAME_OVER,)) + struct.pack(">H", len(text)) + text
+    message = json.dumps(data).encode('utf-8')
+    return len(message).to_bytes(4, byteorder='big') + message
+
+
+def _receive_exact(connection, view, size):
+    # Read exactly size bytes into the start of view and return a view of
+    # them, or None when the connection closed
+    view = view[:size]
+    received = 0
+    while received < size:
+        count = connection.recv_into(view[received:], size - received)
+        if not count:
+            return None
+        received += count
+    return view
+
+
+def read_frame():
+    """ Decode one frame, JSON or binary, without doing any I/O: a generator
+    that yields how many bytes it needs next, is sent exactly that many, and
+    returns the message dictionary. receive_message drives it on a socket
+    and the ladder server on asyncio streams. The bytes sent may be a view
+    of a buffer that the next read overwrites. """
+    kind = (yield 1)[0]
+    if kind == FRAME_MOVE:
+        square = (yield 1)[0]
+        return {"type": "move", "move": [square >> 3, square & 7]}
+    if kind == FRAME_MOVES:
+        count = (yield 1)[0]
+        squares = yield count
+        return {"type": "moves", "moves": [[square >> 3, square & 7] for square in squares]}
+    if kind == FRAME_GAME_OVER:
+        length = struct.unpack(">H", (yield 2))[0]
+        return {"type": "game_over", "message": str((yield length), 'utf-8')}
+    # JSON frame: the byte read is the first one of the length
+    length = int.from_bytes(bytes([kind]) + bytes((yield 3)), byteorder='big')
+    if length > BUFFER_SIZE:
+        raise ValueError(f"frame of {length} bytes is too large")
+    return json.loads(str((yield length), 'utf-8'))
+
+
+def receive_message(connection, view):
+    """ Read one frame, JSON or binary, from a socket into the buffer view
+    (a memoryview of BUFFER_SIZE bytes) and return it as a message
+    dictionary, or None when the connection closed. """
+    frame = read_frame()
+    size = next(frame)
+    try:
+        while True:
+            data = _receive_exact(connection, view, size)
+            if data is None:
+                return None
+            size = frame.send(data)
+    except StopIteration as stop:
+        return stop.value
+
 
 class ConnectionManager:
     """ Manages shared network connection between server/client engines. """
     
-    def __init__(self):
+    def __init__(self, max_version=PROTOCOL_VERSION):
+        """ max_version caps the protocol version; 1 keeps to JSON. """
         self.socket = None
         self.connection = None
         self.address = None
         self.lock = threading.Lock()
         self.connected = False
-        self.opponent_move = None
-        self.move_received = threading.Event()
+        # Moves received from the opponent, in order
+        self.moves = queue.Queue()
         self.listen_thread = None
+        self.max_version = max_version
+        # Protocol version used to send, until the handshake settles it
+        self.version = 1
+        # Color the other side of the connection plays
+        self.server_color = -1
+        self._buffer = bytearray(BUFFER_SIZE)
+        self._view = memoryview(self._buffer)
+        # Do not print the moves received
+        self.quiet = False
     
     def setup_server(self, host='0.0.0.0', port=12345):
         """ Set up as server. """
@@ -44,8 +149,9 @@ class ConnectionManager:
             self.connected = True
             print(f"[Server] Client connected from {self.address}")
             
-            # Send handshake
-            handshake = {"type": "handshake", "color": -1}
+            # Send handshake, offering our protocol version. The client's
+            # answer arrives on the listening thread.
+            handshake = {"type": "handshake", "color": -1, "version": self.max_version}
             self._send_data(handshake)
             
             self._start_listening()
@@ -54,8 +160,9 @@ class ConnectionManager:
             print(f"[Server] Error: {e}")
             raise
     
-    def setup_client(self, host='localhost', port=12345):
-        """ Set up as client. """
+    def setup_client(self, host='localhost', port=12345, color=None):
+        """ Set up as client. color, when given, is the color this side
+        asks to play, which a ladder server honours. """
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             print(f"\n[Client] Connecting to server at {host}:{port}...")
@@ -65,10 +172,18 @@ class ConnectionManager:
             self.connected = True
             print(f"[Client] Connected to server!")
             
-            # Receive handshake
+            # Receive handshake and answer with the version both sides speak
             handshake = self._receive_data()
             if handshake and handshake.get("type") == "handshake":
                 print(f"[Client] Handshake received")
+                self.server_color = handshake.get("color", -1)
+                version = min(handshake.get("version", 1), self.max_version)
+                if version > 1 or color is not None:
+                    hello = {"type": "hello", "version": version}
+                    if color is not None:
+                        hello["color"] = color
+                    self._send_data(hello)
+                    self.version = version
             
             self._start_listening()
             
@@ -87,14 +202,18 @@ class ConnectionManager:
             try:
                 data = self._receive_data()
                 if data:
-                    if data.get("type") == "move":
+                    if data.get("type") in ("move", "moves"):
+                        moves = [data["move"]] if data.get("type") == "move" else data["moves"]
+                        for move in moves:
+                            move = tuple(move)
+                            self.moves.put(move)
+                            if not self.quiet:
+                                x, y = move
+                                move_str = chr(ord('a') + x) + str(y + 1)
+                                print(f"\n[Network] Received opponent move: {move_str}")
+                    elif data.get("type") == "hello":
                         with self.lock:
-                            move = tuple(data["move"])
-                            self.opponent_move = move
-                            self.move_received.set()
-                            x, y = move
-                            move_str = chr(ord('a') + x) + str(y + 1)
-                            print(f"\n[Network] Received opponent move: {move_str}")
+                            self.version = min(data.get("version", 1), self.max_version)
                     elif data.get("type") == "game_over":
                         print(f"\n[Network] Game over: {data.get('message', '')}")
                         break
@@ -104,34 +223,24 @@ class ConnectionManager:
                 break
     
     def _send_data(self, data):
-        """ Send data over network. """
+        """ Send a message as one JSON frame. """
+        self._send_frame(encode_message(data))
+
+    def _send_frame(self, frame):
+        """ Send an encoded frame with a single sendall. """
         try:
             if self.connection:
-                message = json.dumps(data).encode('utf-8')
-                length = len(message)
-                self.connection.sendall(length.to_bytes(4, byteorder='big'))
-                self.connection.sendall(message)
+                self.connection.sendall(frame)
         except Exception as e:
             print(f"Error sending data: {e}")
             self.connected = False
     
     def _receive_data(self):
-        """ Receive data from network. """
+        """ Receive one frame, JSON or binary, and return it as a message
+        dictionary. """
         try:
             if self.connection:
-                length_bytes = self.connection.recv(4)
-                if not length_bytes:
-                    return None
-                length = int.from_bytes(length_bytes, byteorder='big')
-                
-                data = b''
-                while len(data) < length:
-                    chunk = self.connection.recv(length - len(data))
-                    if not chunk:
-                        return None
-                    data += chunk
-                
-                return json.loads(data.decode('utf-8'))
+                return receive_message(self.connection, self._view)
         except Exception as e:
             if self.connected:
                 print(f"Error receiving data: {e}")
@@ -140,18 +249,20 @@ class ConnectionManager:
     
     def send_move(self, move):
         """ Send move to opponent. """
-        move_data = {"type": "move", "move": list(move)}
-        self._send_data(move_data)
+        if self.version >= 2:
+            self._send_frame(bytes((FRAME_MOVE, move[0] * 8 + move[1])))
+        else:
+            self._send_data({"type": "move", "move": list(move)})
+
+    def send_game_over(self, message):
+        """ Tell the opponent that the game is over. """
+        self._send_frame(encode_message({"type": "game_over", "message": message}, self.version))
     
     def wait_for_move(self, timeout=300):
         """ Wait for opponent's move. """
-        self.move_received.clear()
-        if self.move_received.wait(timeout=timeout):
-            with self.lock:
-                move = self.opponent_move
-                self.opponent_move = None
-                return move
-        else:
+        try:
+            return self.moves.get(timeout=timeout)
+        except queue.Empty:
             raise TimeoutError("Timeout waiting for opponent move")
     
     def close(self):
@@ -230,16 +341,19 @@ class NetworkServerEngine(Engine):
 
 
 class NetworkClientEngine(Engine):
-    """ Network engine for client side (White player). """
+    """ Network engine for client side (White player, unless it asks a
+    ladder server for black). """
+
+    player_name = {-1: "BLACK", 1: "WHITE"}
     
-    def __init__(self, host='localhost', port=12345):
+    def __init__(self, host='localhost', port=12345, color=None):
         global _connection_manager
         if _connection_manager is None:
             _connection_manager = ConnectionManager()
-            _connection_manager.setup_client(host, port)
-            print("[Client] You are playing as WHITE (1)")
+            _connection_manager.setup_client(host, port, color)
         self.conn = _connection_manager
-        self.my_color = 1
+        self.my_color = color if color is not None else -self.conn.server_color
+        print(f"[Client] You are playing as {self.player_name[self.my_color]} ({self.my_color})")
     
     def get_move(self, board, color, move_num=None,
                  time_remaining=None, time_opponent=None):
@@ -252,14 +366,14 @@ class NetworkClientEngine(Engine):
     def _get_my_move(self, board, color):
         """ Get move from local player. """
         legal_moves = board.get_legal_moves(color)
-        print(f"\n[Your turn - WHITE] Enter your move: ", end='')
+        print(f"\n[Your turn - {self.player_name[color]}] Enter your move: ", end='')
         user_input = input().strip()
         move = self.parse_input(legal_moves, user_input)
         
         while move is None:
             print("Invalid move. Legal moves:")
             print_moves(sorted(legal_moves))
-            print(f"\n[Your turn - WHITE] Enter your move: ", end='')
+            print(f"\n[Your turn - {self.player_name[color]}] Enter your move: ", end='')
             user_input = input().strip()
             move = self.parse_input(legal_moves, user_input)
         
@@ -306,6 +420,40 @@ class NetworkReceiverEngine(Engine):
         return self.conn.wait_for_move()
 
 
+def benchmark_roundtrip(rounds=10000, version=PROTOCOL_VERSION):
+    """ Return the mean time in seconds for a move to go to a peer over a
+    loopback connection and come back, with the given protocol version. The
+    peer echoes every move it receives from its own thread, like a remote
+    player would. """
+    import timeit
+    near, far = ConnectionManager(version), ConnectionManager(version)
+    near.quiet = far.quiet = True
+    near.connection, far.connection = socket.socketpair()
+    for manager in (near, far):
+        manager.connected = True
+        manager.version = version
+        manager._start_listening()
+
+    def echo():
+        for _ in range(rounds):
+            far.send_move(far.wait_for_move(timeout=10))
+    threading.Thread(target=echo, daemon=True).start()
+
+    start = timeit.default_timer()
+    for index in range(rounds):
+        near.send_move((index % 8, index // 8 % 8))
+        near.wait_for_move(timeout=10)
+    elapsed = timeit.default_timer() - start
+    near.close()
+    far.close()
+    return elapsed / rounds
+
+
 # Default export (for backward compatibility, but should use network_server or network_client)
 engine = NetworkServerEngine
 
+
+if __name__ == '__main__':
+    for version, name in [(1, "JSON"), (2, "binary")]:
+        print(f"{name:6s} round trip: {benchmark_roundtrip(version=version) * 1e6:.1f}us")
+
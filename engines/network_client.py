@@ -6,8 +6,8 @@ from engines.network import NetworkClientEngine
 
 class NetworkClient:
     """ Factory class that creates client engine with host/port. """
-    def __new__(cls, host='localhost', port=12345):
-        return NetworkClientEngine(host=host, port=port)
+    def __new__(cls, host='localhost', port=12345, color=None):
+        return NetworkClientEngine(host=host, port=port, color=color)
 
 engine = NetworkClient
 
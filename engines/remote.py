@@ -0,0 +1,129 @@
+"""
+Remote engine - a player whose search runs on an engine server
+(engine_server.py), possibly on another machine.
+
+The server is given by the OTHELLO_REMOTE environment variable as
+host:port, localhost:12346 by default. The connection is opened at the first
+move and kept for the following moves and games; when it breaks, the next
+request opens a new one. A request times out when the clock of the player
+runs out, which loses the game on time like a slow local engine. A server
+that cannot be reached or replies with an error loses it like an illegal
+move.
+"""
+
+import os
+import socket
+import timeit
+from board import board_to_string
+from engines import Engine
+from engines.network import BUFFER_SIZE, encode_message, receive_message
+from searchstats import SearchStats
+
+DEFAULT_SERVER = "localhost:12346"
+# Seconds allowed for the network on top of the clock of the player
+LATENCY_MARGIN = 2.0
+# Timeout of a request when the player has no clock
+REQUEST_TIMEOUT = 300.0
+
+
+class RemoteEngine(Engine):
+    """ Forwards every search to an engine server. """
+
+    def __init__(self, host=None, port=None):
+        default_host, _, default_port = os.environ.get("OTHELLO_REMOTE", DEFAULT_SERVER).rpartition(":")
+        self.host = host or default_host
+        self.port = port or int(default_port)
+        self.connection = None
+        # Engine the server runs, from its handshake
+        self.engine_name = None
+        self.last_stats = None
+        # Seconds of the last request not spent searching
+        self.last_latency = None
+        self._view = memoryview(bytearray(BUFFER_SIZE))
+        self._request = 0
+
+    def _connect(self, timeout):
+        self.connection = socket.create_connection((self.host, self.port), timeout=timeout)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        handshake = receive_message(self.connection, self._view)
+        if not handshake or handshake.get("type") != "handshake":
+            self.close()
+            raise ConnectionError(f"{self.host}:{self.port} is not an engine server")
+        self.engine_name = handshake.get("engine")
+
+    def close(self):
+        """ Close the connection to the server. """
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except OSError:
+                pass
+            self.connection = None
+
+    def _exchange(self, request, timeout):
+        # Send a request and return its reply, over the open connection or a
+        # new one
+        if self.connection is None:
+            self._connect(timeout)
+        self.connection.settimeout(timeout)
+        self.connection.sendall(encode_message(request))
+        while True:
+            reply = receive_message(self.connection, self._view)
+            if reply is None:
+                raise ConnectionError("the engine server closed the connection")
+            if reply.get("id") == request["id"]:
+                return reply
+
+    @staticmethod
+    def _forfeit(color, message):
+        # The server could not search: the game is lost like on an illegal
+        # move, and the following games try again
+        print(f"\n[Remote] {message}")
+        raise LookupError(color, message)
+
+    def get_move(self, board, color, move_num=None,
+                 time_remaining=None, time_opponent=None):
+        """ Ask the server for the move. Raise RuntimeError(color) when the
+        clock runs out first, and LookupError(color, message) when the
+        server cannot be reached or replies with an error. """
+        timeout = REQUEST_TIMEOUT if time_remaining is None else max(time_remaining, 0) + LATENCY_MARGIN
+        self._request += 1
+        request = {"type": "search", "id": self._request, "position": board_to_string(board),
+                   "color": color, "move_num": move_num,
+                   "time_remaining": time_remaining, "time_opponent": time_opponent}
+        start_time = timeit.default_timer()
+        reused = self.connection is not None
+        try:
+            try:
+                reply = self._exchange(request, timeout)
+            except socket.timeout:
+                raise
+            except (ConnectionError, OSError):
+                # The server may have dropped a connection left idle: retry
+                # once on a new one
+                self.close()
+                if not reused:
+                    raise
+                # With what is left of the clock
+                left = timeout - (timeit.default_timer() - start_time)
+                if left <= 0:
+                    raise RuntimeError(color)
+                reply = self._exchange(request, left)
+        except socket.timeout:
+            # A late reply would answer the wrong request
+            self.close()
+            raise RuntimeError(color)
+        except (ConnectionError, OSError) as e:
+            self.close()
+            self._forfeit(color, f"engine server {self.host}:{self.port} unreachable: {e}")
+        if reply.get("type") == "error":
+            self._forfeit(color, f"engine server error: {reply.get('message')}")
+        stats = reply.get("stats")
+        self.last_stats = SearchStats.from_dict(stats) if stats is not None else None
+        elapsed = timeit.default_timer() - start_time
+        self.last_latency = elapsed - self.last_stats.elapsed if self.last_stats else None
+        move = reply.get("move")
+        return tuple(move) if move is not None else None
+
+
+engine = RemoteEngine
@@ -0,0 +1,241 @@
+"""
+Game logs.
+
+A log is an append-only file of game records, written by othello.py with
+--log, alone, with -dup or with -j. A record keeps one byte per ply, the
+square x*8 + y of the move or PASS, and the seconds every ply took, behind
+a header with the engines, their search settings, the clock and the
+result:
+
+    file     magic b"OGL1", version
+    record   size (u16, bytes after this field), index (u32), finished
+             (u32, Unix time), game time (f32), plies (u8), black discs
+             (u8), white discs (u8), end (u8), culprit (i8), black and
+             white settings (alpha-beta, level, endgame: 3 x u8 each,
+             endgame NO_ENDGAME for none), black and white name lengths
+             (2 x u8), the two engine names (UTF-8), the plies (u8 each),
+             the clocks (u16 each, in hundredths of a second)
+
+end tells how the game ended (FINISHED, TIME, ILLEGAL) and culprit the
+color that lost on time or by an illegal move, 0 otherwise. Such games
+have the 64-0 result the players were given.
+
+GameLog buffers records and writes them in bulk; read_games streams the
+records of a log, however large, a chunk at a time, and stops at a record
+cut short by a crash. GameLog cuts such a record off before it appends to
+a log, so that the records written after it can be read.
+
+    python gamelog.py show games.log
+    python gamelog.py transcripts games.log > games.txt
+"""
+
+import argparse
+import os
+import struct
+import time
+from collections import namedtuple
+from board import Board, move_string
+
+MAGIC = b"OGL1"
+VERSION = 1
+HEADER = struct.Struct("<4sI")
+GAME = struct.Struct("<HIIfBBBBb6BBB")
+
+# Ply of a pass
+PASS = 64
+# Endgame setting of a player that does not solve the endgame
+NO_ENDGAME = 255
+# How a game ended
+FINISHED = 0
+TIME = 1
+ILLEGAL = 2
+END_NAMES = {FINISHED: "finished", TIME: "lost on time", ILLEGAL: "illegal move"}
+
+# Bytes a GameLog buffers before writing them
+BUFFER_SIZE = 1 << 16
+
+# What both games of a match share: the engine names and the search
+# settings (alpha_beta, level, endgame) of black and white, and the clock
+GameHeader = namedtuple("GameHeader", ["engines", "settings", "game_time"])
+# One game: moves are (x, y), or None for a pass, and clocks the seconds
+# every ply took
+GameRecord = namedtuple("GameRecord", ["index", "finished", "header", "moves", "clocks",
+                                       "black", "white", "end", "culprit"])
+
+
+def encode_game(record):
+    """ Return the bytes of a GameRecord. """
+    header = record.header
+    # At most 255 bytes, cut between two characters
+    names = [name.encode()[:255].decode('utf-8', 'ignore').encode() for name in header.engines]
+    settings = []
+    for alpha_beta, level, endgame in header.settings:
+        # Settings past what a byte holds are kept as its largest value
+        settings += [bool(alpha_beta), min(level or 0, 255),
+                     NO_ENDGAME if endgame is None else min(endgame, NO_ENDGAME - 1)]
+    plies = bytes(PASS if move is None else move[0] * 8 + move[1] for move in record.moves)
+    clocks = struct.pack(f"<{len(record.clocks)}H", *(min(round(seconds * 100), 0xFFFF)
+                                                      for seconds in record.clocks))
+    size = GAME.size - 2 + len(names[0]) + len(names[1]) + len(plies) + len(clocks)
+    return b"".join([GAME.pack(size, record.index, int(record.finished), header.game_time or 0,
+                               len(plies), record.black, record.white, record.end, record.culprit,
+                               *settings, len(names[0]), len(names[1])),
+                     names[0], names[1], plies, clocks])
+
+
+def decode_game(data, offset=0):
+    """ Return the GameRecord at offset in data. """
+    (_, index, finished, game_time, plies, black, white, end, culprit,
+     *settings, black_length, white_length) = GAME.unpack_from(data, offset)
+    offset += GAME.size
+    engines = (bytes(data[offset:offset + black_length]).decode(),
+               bytes(data[offset + black_length:offset + black_length + white_length]).decode())
+    offset += black_length + white_length
+    moves = [None if square == PASS else (square >> 3, square & 7) for square in data[offset:offset + plies]]
+    clocks = [hundredths / 100 for hundredths in struct.unpack_from(f"<{plies}H", data, offset + plies)]
+    player_settings = tuple((bool(alpha_beta), level, None if endgame == NO_ENDGAME else endgame)
+                            for alpha_beta, level, endgame in (settings[:3], settings[3:]))
+    return GameRecord(index, finished, GameHeader(engines, player_settings, round(game_time, 3)),
+                      moves, clocks, black, white, end, culprit)
+
+
+class GameLog():
+    """ Append-only writer of a log file. """
+
+    def __init__(self, path, buffer_size=BUFFER_SIZE):
+        """ Open the log at path, or create it. Records are written once
+        buffer_size bytes of them are waiting, and at flush and close. """
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            with open(path, "r+b") as f:
+                _check_header(f, path)
+                f.truncate(_complete_end(f, os.path.getsize(path)))
+        self._file = open(path, "ab")
+        if not exists:
+            self._file.write(HEADER.pack(MAGIC, VERSION))
+        self.buffer_size = buffer_size
+        self._buffer = bytearray()
+        self.games = 0
+
+    def write(self, record):
+        """ Append a GameRecord. """
+        self._buffer += encode_game(record)
+        self.games += 1
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """ Write the buffered records to the file. """
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._buffer.clear()
+        self._file.flush()
+
+    def close(self):
+        """ Write the buffered records and close the file. """
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _check_header(f, path):
+    data = f.read(HEADER.size)
+    if len(data) < HEADER.size or HEADER.unpack(data) != (MAGIC, VERSION):
+        raise ValueError(f"{path} is not a version {VERSION} game log")
+
+
+def _complete_end(f, file_size):
+    # Offset after the last complete record of a log, from the first record
+    end = f.tell()
+    while True:
+        size = f.read(2)
+        if len(size) < 2 or end + 2 + int.from_bytes(size, 'little') > file_size:
+            return end
+        end += 2 + int.from_bytes(size, 'little')
+        f.seek(end)
+
+
+def make_record(header, index, history, black, white, end=FINISHED, culprit=0):
+    """ Return the GameRecord of a game played by othello.game or dupgame,
+    whose history list got (move, seconds) for every ply. """
+    return GameRecord(index, time.time(), header, [move for move, _ in history],
+                      [seconds for _, seconds in history], black, white, end, culprit)
+
+
+def read_games(path, chunk=BUFFER_SIZE):
+    """ Yield the GameRecords of a log, reading chunk bytes at a time. """
+    with open(path, "rb") as f:
+        _check_header(f, path)
+        data = b""
+        while True:
+            more = f.read(chunk)
+            if more:
+                data += more
+            offset = 0
+            while len(data) - offset >= 2:
+                size = int.from_bytes(data[offset:offset + 2], 'little')
+                if len(data) - offset - 2 < size:
+                    break
+                yield decode_game(data, offset)
+                offset += 2 + size
+            data = data[offset:]
+            if not more:
+                # Whatever is left is a record cut short
+                break
+
+
+def replay(record, board_class=Board):
+    """ Yield (board, color, move) before every ply of a GameRecord, on one
+    board that is then updated with the move. Raise ValueError at a move
+    that is not legal. """
+    board, color = board_class(), -1
+    for move in record.moves:
+        yield board, color, move
+        if move is not None:
+            if move not in board.get_legal_moves(color):
+                raise ValueError(f"illegal move {move_string(move)} in game {record.index}")
+            board.execute_move(move, color)
+        color = -color
+
+
+def transcript(record):
+    """ Return the moves of a GameRecord as "c5c6f4...", without passes,
+    the transcript format of book.py. """
+    return "".join(move_string(move) for move in record.moves if move is not None)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Read game logs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    show = commands.add_parser("show", help="print every game and a summary")
+    show.add_argument("path", type=str, help="log file to read")
+    transcripts = commands.add_parser("transcripts", help="print the moves of every game, one game per line")
+    transcripts.add_argument("path", type=str, help="log file to read")
+    args = parser.parse_args()
+
+    if args.command == "transcripts":
+        for record in read_games(args.path):
+            print(transcript(record))
+    else:
+        games = plies = 0
+        wins = {"black": 0, "white": 0, "draws": 0}
+        for record in read_games(args.path):
+            games += 1
+            plies += len(record.moves)
+            black, white = record.header.engines
+            if record.black > record.white:
+                wins["black"] += 1
+            elif record.white > record.black:
+                wins["white"] += 1
+            else:
+                wins["draws"] += 1
+            ending = "" if record.end == FINISHED else f", {END_NAMES[record.end]}"
+            print(f"Game {record.index}: {black} (black) {record.black}-{record.white} {white} (white), "
+                  f"{len(record.moves)} plies, {sum(record.clocks):.1f}s{ending}")
+        print(f"\n{games} games, {plies} plies: black won {wins['black']}, "
+              f"white won {wins['white']}, {wins['draws']} draws")
@@ -0,0 +1,378 @@
+"""
+Ladder server: many network games in one process.
+
+The server of engines/network.py serves a single opponent. This one runs on
+asyncio and accepts any number of clients, each with its own game and its
+own clocks. It speaks the same protocol: the handshake, then move frames,
+JSON or binary, and a game_over message at the end. As in othello.py, passes
+and forced moves (a single legal move) are not sent, both sides play them on
+their own.
+
+A client plays white unless its hello message asks for black, which
+othello.py does when network_client is the black engine:
+
+    python othello.py network_client network_receiver --host <server>
+
+There are two modes:
+- engine: every client plays against a house engine, which searches on a
+  pool of worker processes so that the event loop stays responsive.
+- pair: clients play each other, a client that wants black with the next
+  one that wants white.
+
+A player who runs out of time, sends an illegal move or disconnects loses,
+64-0 like in tournament.py.
+
+    python ladder.py --mode engine --engine alpha -a -l 4 -t 60 -j 4
+    python ladder.py --mode pair --port 12345 --results ladder.jsonl
+    python ladder.py --mode pair --load-test 300
+    python ladder.py --engine random --load-test 300
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import random
+import timeit
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from board import board_from_string, board_to_string
+from engines.network import PROTOCOL_VERSION, encode_message, read_frame
+from othello import boards
+from tournament import PlayerSettings, make_engine
+
+player = {-1: "black", 1: "white"}
+# Seconds to wait for the hello of a client before taking it for one that
+# predates it
+HELLO_TIMEOUT = 5.0
+# Connections the server lets wait to be accepted
+BACKLOG = 1024
+
+# Engines of a worker process, by settings
+_engines = {}
+
+
+class Peer():
+    """ One end of a connection, on top of asyncio streams. """
+
+    def __init__(self, reader, writer, max_version=PROTOCOL_VERSION):
+        self.reader = reader
+        self.writer = writer
+        self.max_version = max_version
+        # Protocol version used to send, until the handshake settles it
+        self.version = 1
+        # Color the peer asked for in its hello, if any, then the one it plays
+        self.color = None
+        self.moves = deque()
+        peer = writer.get_extra_info("peername")
+        self.name = f"{peer[0]}:{peer[1]}" if isinstance(peer, tuple) else "local"
+
+    async def send(self, message):
+        """ Send a message dictionary as one frame. """
+        self.writer.write(encode_message(message, self.version))
+        await self.writer.drain()
+
+    async def read_message(self):
+        """ Read one frame, JSON or binary, and return it as a message
+        dictionary. Raise asyncio.IncompleteReadError when the connection
+        closes. """
+        frame = read_frame()
+        size = next(frame)
+        try:
+            while True:
+                size = frame.send(await self.reader.readexactly(size))
+        except StopIteration as stop:
+            return stop.value
+
+    def _hello(self, message):
+        self.version = min(message.get("version", 1), self.max_version)
+        if message.get("color") in (-1, 1):
+            if self.color is not None and message["color"] != self.color:
+                # A hello that came after the game started
+                raise ValueError(f"the peer asked for {player[message['color']]} too late")
+            self.color = message["color"]
+
+    async def handshake(self):
+        """ Greet a client that just connected and wait for its hello. The
+        "color" of the handshake is the one the other side plays by
+        default. """
+        await self.send({"type": "handshake", "color": -1, "version": self.max_version})
+        try:
+            message = await asyncio.wait_for(self.read_message(), HELLO_TIMEOUT)
+        except asyncio.TimeoutError:
+            return
+        if message.get("type") == "hello":
+            self._hello(message)
+        else:
+            self._queue(message)
+
+    def _queue(self, message):
+        if message.get("type") == "move":
+            self.moves.append(tuple(message["move"]))
+        elif message.get("type") == "moves":
+            self.moves.extend(tuple(move) for move in message["moves"])
+        elif message.get("type") == "game_over":
+            raise ConnectionError("the peer ended the game")
+
+    async def receive_move(self):
+        """ Return the next move of the peer. """
+        while not self.moves:
+            message = await self.read_message()
+            if message.get("type") == "hello":
+                self._hello(message)
+            else:
+                self._queue(message)
+        return self.moves.popleft()
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+def _house_move(task):
+    # Search of the house engine in a worker process, which keeps one engine
+    # per settings from one game to the next
+    settings, text, board_name, color, move_num, time_left, time_opponent = task
+    with redirect_stdout(io.StringIO()):
+        engine = _engines.get(settings)
+        if engine is None:
+            engine = _engines[settings] = make_engine(settings)
+        board = board_from_string(text, boards[board_name])
+        return engine.get_move(board, color, move_num, time_left, time_opponent)
+
+
+class LadderServer():
+    """ Serves concurrent games to network clients. """
+
+    def __init__(self, mode="engine", settings=None, game_time=300.0, board="list",
+                 workers=1, max_version=PROTOCOL_VERSION, results=None, verbose=True):
+        """ In engine mode, settings are the tournament.PlayerSettings of the
+        house engine. Finished games are appended to the open file results
+        as JSON lines. """
+        self.mode = mode
+        self.settings = settings or PlayerSettings("alpha", True, 4, None)
+        self.game_time = game_time
+        self.board = board
+        self.max_version = max_version
+        self.results = results
+        self.verbose = verbose
+        self.executor = ProcessPoolExecutor(workers) if mode == "engine" else None
+        # Clients of pair mode waiting for an opponent, by color
+        self.waiting = {-1: deque(), 1: deque()}
+        self.games = set()
+        self.started = 0
+        self.finished = []
+
+    async def handle(self, reader, writer):
+        """ asyncio.start_server callback: greet a client and start or queue
+        its game. """
+        peer = Peer(reader, writer, self.max_version)
+        try:
+            await peer.handshake()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            await peer.close()
+            return
+        color = peer.color = peer.color or 1
+        if self.mode == "engine":
+            players = {color: peer, -color: None}
+        else:
+            waiting = self.waiting[-color]
+            while waiting and waiting[0].writer.is_closing():
+                waiting.popleft()
+            if not waiting:
+                self.waiting[color].append(peer)
+                return
+            players = {color: peer, -color: waiting.popleft()}
+        task = asyncio.ensure_future(self.play(players))
+        self.games.add(task)
+        task.add_done_callback(self.games.discard)
+
+    async def _next_move(self, players, board, color, move_num, time_left):
+        if players[color] is not None:
+            return await players[color].receive_move()
+        loop = asyncio.get_running_loop()
+        task = (self.settings, board_to_string(board), self.board, color, move_num,
+                time_left[color], time_left[-color])
+        return await loop.run_in_executor(self.executor, _house_move, task)
+
+    async def play(self, players):
+        """ Play one game between the players, a Peer for each color or None
+        for the house engine, and return its result. """
+        self.started += 1
+        index = self.started
+        names = {color: players[color].name if players[color] else f"house {self.settings.engine}"
+                 for color in (-1, 1)}
+        board = boards[self.board]()
+        time_left = {-1: self.game_time, 1: self.game_time}
+        loser, reason = None, None
+        loop = asyncio.get_running_loop()
+
+        for move_num in range(60):
+            moved = False
+            for color in [-1, 1]:
+                legal_moves = board.get_legal_moves(color)
+                if not legal_moves:
+                    continue
+                start_time = loop.time()
+                if len(legal_moves) == 1:
+                    move = legal_moves[0]
+                else:
+                    try:
+                        move = await asyncio.wait_for(
+                            self._next_move(players, board, color, move_num, time_left),
+                            max(time_left[color], 0))
+                    except asyncio.TimeoutError:
+                        loser, reason = color, "ran out of time"
+                    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                        loser, reason = color, "disconnected"
+                    if loser is not None:
+                        break
+                time_left[color] -= round(loop.time() - start_time, 1)
+                if time_left[color] < 0:
+                    loser, reason = color, "ran out of time"
+                    break
+                if move not in legal_moves:
+                    loser, reason = color, "played an illegal move"
+                    break
+                board.execute_move(move, color)
+                moved = True
+                # Forced moves are not sent
+                if len(legal_moves) > 1 and players[-color] is not None:
+                    try:
+                        await players[-color].send({"type": "move", "move": list(move)})
+                    except ConnectionError:
+                        loser, reason = -color, "disconnected"
+                        break
+            if loser is not None or not moved:
+                break
+
+        if loser is None:
+            black_count, white_count = board.count(-1), board.count(1)
+            winner = (black_count > white_count) - (white_count > black_count)
+            message = f"{black_count}-{white_count}"
+        else:
+            winner = -loser
+            black_count, white_count = (64, 0) if winner == -1 else (0, 64)
+            message = f"{player[loser]} {reason}"
+        result = {"game": index, "black": names[-1], "white": names[1], "winner": winner,
+                  "black_discs": black_count, "white_discs": white_count, "reason": reason,
+                  "black_time": round(time_left[-1], 1), "white_time": round(time_left[1], 1)}
+        for peer in players.values():
+            if peer is not None:
+                try:
+                    await peer.send({"type": "game_over", "message": message})
+                except ConnectionError:
+                    pass
+                await peer.close()
+        self.finished.append(result)
+        if self.results is not None:
+            self.results.write(json.dumps(result) + "\n")
+            self.results.flush()
+        if self.verbose:
+            print(f"Game {index}: {names[-1]} (black) vs. {names[1]} (white): {message}")
+        return result
+
+    async def serve(self, host="0.0.0.0", port=12345):
+        """ Accept clients until cancelled. """
+        server = await asyncio.start_server(self.handle, host, port, backlog=BACKLOG)
+        if self.verbose:
+            print(f"Ladder server ({self.mode} mode) listening on port {port}")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+
+async def random_client(host, port, color=1, version=PROTOCOL_VERSION, seed=None, board="list"):
+    """ Play one game on a ladder server with random moves and return the
+    game_over message. """
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    peer = Peer(reader, writer, version)
+    handshake = await peer.read_message()
+    peer.version = min(handshake.get("version", 1), version)
+    await peer.send({"type": "hello", "version": peer.version, "color": color})
+    board = boards[board]()
+    for move_num in range(60):
+        moved = False
+        for turn in [-1, 1]:
+            legal_moves = board.get_legal_moves(turn)
+            if not legal_moves:
+                continue
+            if len(legal_moves) == 1:
+                move = legal_moves[0]
+            elif turn == color:
+                move = rng.choice(legal_moves)
+                await peer.send({"type": "move", "move": list(move)})
+            else:
+                move = await peer.receive_move()
+            board.execute_move(move, turn)
+            moved = True
+        if not moved:
+            break
+    message = await peer.read_message()
+    await peer.close()
+    return message.get("message")
+
+
+async def load_test(games=200, mode="pair", settings=None, workers=1, board="list"):
+    """ Run a ladder server on a free local port and play games of random
+    clients on it, all at the same time. Return (results, seconds). """
+    settings = settings or PlayerSettings("random", False, None, None)
+    ladder = LadderServer(mode, settings, board=board, workers=workers, verbose=False)
+    server = await asyncio.start_server(ladder.handle, "127.0.0.1", 0, backlog=BACKLOG)
+    port = server.sockets[0].getsockname()[1]
+    clients = games * 2 if mode == "pair" else games
+    start = timeit.default_timer()
+    try:
+        # Every other client keeps to the JSON protocol
+        await asyncio.gather(*(random_client("127.0.0.1", port, -1 if index % 2 else 1,
+                                             1 + index // 2 % 2, seed=index, board=board)
+                               for index in range(clients)))
+        while ladder.games:
+            await asyncio.sleep(0.01)
+    finally:
+        server.close()
+        ladder.close()
+    return ladder.finished, timeit.default_timer() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve games to many network clients at once.")
+    parser.add_argument("--mode", type=str, default="engine", choices=["engine", "pair"], help="play the clients against a house engine, or against each other")
+    parser.add_argument("--engine", type=str, default="alpha", help="house engine of engine mode")
+    parser.add_argument("-a", action="store_true", help="house engine uses alpha-beta pruning")
+    parser.add_argument("-l", type=int, default=4, help="search depth of the house engine")
+    parser.add_argument("-e", type=int, help="number of empty squares at which the house engine solves the endgame exactly")
+    parser.add_argument("-t", type=float, default=300, help="time of each player for a game, in seconds")
+    parser.add_argument("-j", type=int, default=1, help="worker processes of the house engine")
+    parser.add_argument("--host", type=str, default="0.0.0.0", help="address to listen on")
+    parser.add_argument("--port", type=int, default=12345, help="port to listen on")
+    parser.add_argument("--board", type=str, default="list", choices=boards, help="board implementation (list, bitboard)")
+    parser.add_argument("--json", action="store_true", help="only speak the JSON protocol")
+    parser.add_argument("--results", type=str, help="append the result of every game to this file as JSON lines")
+    parser.add_argument("--load-test", type=int, metavar="GAMES", help="instead play this many simultaneous games of random local clients")
+    args = parser.parse_args()
+
+    settings = PlayerSettings(args.engine, args.a, args.l, args.e)
+    if args.load_test:
+        finished, seconds = asyncio.run(load_test(args.load_test, args.mode, settings,
+                                                  args.j, args.board))
+        errors = sum(1 for result in finished if result["reason"])
+        print(f"{len(finished)} games in {seconds:.2f}s, {errors} lost by error")
+    else:
+        results = open(args.results, "a") if args.results else None
+        ladder = LadderServer(args.mode, settings, args.t, args.board, args.j,
+                              1 if args.json else PROTOCOL_VERSION, results)
+        try:
+            asyncio.run(ladder.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            print("\n- Ladder server stopped")
+        finally:
+            ladder.close()
@@ -1,19 +1,30 @@
 import argparse
-import copy
+import atexit
 import signal
 import sys
 import timeit
 import importlib
 from board import Board, move_string, print_moves
+from bitboard import BitBoard
+import gamelog
+import tournament
+from searchstats import write_stats
 
 player = {-1: "Black", 1: "White"}
+boards = {"list": Board, "bitboard": BitBoard}
+# Engines that have no search settings (alpha-beta, level, endgame). The
+# remote engine takes those of its engine server.
+engines_list = {"greedy", "human", "random", "remote"}
 
 
-def game(white_engine, black_engine, game_time=300.0, verbose=False):
+def game(white_engine, black_engine, game_time=300.0, verbose=False, board_class=Board,
+         stats_log=None, history=None):
     """Run a single game. Raise RuntimeError in the event of time expiration.
     Raise LookupError in the case of a bad move. The tournament engine must
-    handle these exceptions."""
-    board = Board()
+    handle these exceptions. The search statistics of each move are written
+    to the open file stats_log, if any, and (move, seconds) of every ply,
+    move None for a pass, is appended to the list history, if any."""
+    board = board_class()
     time_left = {-1: game_time, 1: game_time}
     engine = {-1: black_engine, 1: white_engine}
 
@@ -25,7 +36,7 @@ def game(white_engine, black_engine, game_time=300.0, verbose=False):
         moves = []
         for color in [-1, 1]:
             start_time = timeit.default_timer()
-            move = get_move(board, engine[color], color, move_num, time_left)
+            move = get_move(board, engine[color], color, move_num, time_left, stats_log)
             end_time = timeit.default_timer()
 
             time_left[color] -= round(end_time - start_time, 1)
@@ -33,6 +44,9 @@ def game(white_engine, black_engine, game_time=300.0, verbose=False):
             if time_left[color] < 0:
                 raise RuntimeError(color)
 
+            if history is not None:
+                history.append((move, end_time - start_time))
+
             if move is not None:
                 board.execute_move(move, color)
                 moves.append(move)
@@ -50,11 +64,14 @@ def game(white_engine, black_engine, game_time=300.0, verbose=False):
 
     return board
 
-def dupgame(white_engine, black_engine, game_time=300.0):
+def dupgame(white_engine, black_engine, game_time=300.0, board_class=Board, stats_log=None,
+            history=None):
     """Run a single game. Raise RuntimeError in the event of time expiration.
     Raise LookupError in the case of a bad move. The tournament engine must
-    handle these exceptions."""
-    board = Board()
+    handle these exceptions. The search statistics of each move are written
+    to the open file stats_log, if any, and (move, seconds) of every ply,
+    move None for a pass, is appended to the list history, if any."""
+    board = board_class()
     time_left = {-1: game_time, 1: game_time}
     engine = {-1: black_engine, 1: white_engine}
 
@@ -63,7 +80,7 @@ def dupgame(white_engine, black_engine, game_time=300.0):
         moves = []
         for color in [-1, 1]:
             start_time = timeit.default_timer()
-            move = get_move(board, engine[color], color, move_num, time_left)
+            move = get_move(board, engine[color], color, move_num, time_left, stats_log)
             end_time = timeit.default_timer()
 
             time_left[color] -= round(end_time - start_time, 1)
@@ -71,6 +88,9 @@ def dupgame(white_engine, black_engine, game_time=300.0):
             if time_left[color] < 0:
                 raise RuntimeError(color)
 
+            if history is not None:
+                history.append((move, end_time - start_time))
+
             if move is not None:
                 board.execute_move(move, color)
                 moves.append(move)
@@ -93,29 +113,63 @@ def winner(board):
         return 0, black_count, white_count
 
 
-def get_move(board, engine, color, move_num, time_left, **kwargs):
+def get_move(board, engine, color, move_num, time_left, stats_log=None, **kwargs):
     legal_moves = board.get_legal_moves(color)
     if not legal_moves:
         return None
     elif len(legal_moves) == 1:
         return legal_moves[0]
     else:
-        move = engine.get_move(copy.deepcopy(board), color, move_num, time_left[color], time_left[-color])
+        move = engine.get_move(board.copy(), color, move_num, time_left[color], time_left[-color])
+        write_stats(stats_log, engine, engine_name=player[color])
         if move not in legal_moves:
             raise LookupError(color)
         return move
 
 
+def configure_engine(engine, name, alpha_beta=False, level=None, endgame=None, workers=None):
+    """Apply the search settings given on the command line to an engine.
+    Engines without a search of their own are left untouched."""
+    if name in engines_list:
+        return engine
+    if alpha_beta:
+        engine.alpha_beta = True
+    if level:
+        engine.ply_maxmin = engine.ply_alpha = level
+    if endgame is not None:
+        engine.endgame_empties = endgame
+    if workers:
+        engine.workers = workers
+    return engine
+
+
+def close_engines(*engines):
+    """Stop the worker processes and connections of the engines that have
+    any (AlphaEngine's parallel search, the remote engine)."""
+    for engine in engines:
+        if hasattr(engine, "close"):
+            engine.close()
+
+
 def signal_handler(signal_received, frame):
     print('\n\n- You quit the game!')
     sys.exit()
 
 
-def main(white_engine, black_engine, game_time, verbose):
+def log_game(game_log, header, index, history, black, white, end=gamelog.FINISHED, culprit=0):
+    """Append a game to the open gamelog.GameLog game_log, if any."""
+    if game_log is not None:
+        game_log.write(gamelog.make_record(header, index, history, black, white, end, culprit))
+
+
+def main(white_engine, black_engine, game_time, verbose, board_class=Board, stats_log=None,
+         game_log=None, header=None):
+    history = []
     try:
-        board = game(white_engine, black_engine, game_time, verbose)
+        board = game(white_engine, black_engine, game_time, verbose, board_class, stats_log, history)
         stats = winner(board)
         bscore, wscore = str(stats[1]), str(stats[2])
+        log_game(game_log, header, 1, history, stats[1], stats[2])
 
         if stats[0] == -1:
             print(f"- {player[-1]} wins the game! ({bscore}-{wscore})")
@@ -129,6 +183,8 @@ def main(white_engine, black_engine, game_time, verbose):
 
     except RuntimeError as e:
         color = e.args[0]
+        log_game(game_log, header, 1, history, 64 if color == 1 else 0, 64 if color == -1 else 0,
+                 gamelog.TIME, color)
         if color == -1:
             print(f"\n- {player[-1]} ran out of time!")
             print(f"{player[1]} wins the game! (64-0)")
@@ -140,6 +196,8 @@ def main(white_engine, black_engine, game_time, verbose):
 
     except LookupError as e:
         color = e.args[0]
+        log_game(game_log, header, 1, history, 64 if color == 1 else 0, 64 if color == -1 else 0,
+                 gamelog.ILLEGAL, color)
         if color == -1:
             print(f"\n- {player[-1]} made an illegal move!")
             print(f"{player[1]} wins the game! (64-0)")
@@ -149,11 +207,14 @@ def main(white_engine, black_engine, game_time, verbose):
             print(f"{player[-1]} wins the game! (64-0)")
             return -1, 64, 0
         
-def dupmain(white_engine, black_engine, game_time, verbose, index):
+def dupmain(white_engine, black_engine, game_time, verbose, index, board_class=Board,
+            stats_log=None, game_log=None, header=None):
+    history = []
     try:
-        board = dupgame(white_engine, black_engine, game_time)
+        board = dupgame(white_engine, black_engine, game_time, board_class, stats_log, history)
         stats = winner(board)
         bscore, wscore = str(stats[1]), str(stats[2])
+        log_game(game_log, header, index, history, stats[1], stats[2])
 
         if stats[0] == -1:
             print(f"Test {index} - {player[-1]} wins the game! ({bscore}-{wscore})")
@@ -167,6 +228,8 @@ def dupmain(white_engine, black_engine, game_time, verbose, index):
 
     except RuntimeError as e:
         color = e.args[0]
+        log_game(game_log, header, index, history, 64 if color == 1 else 0, 64 if color == -1 else 0,
+                 gamelog.TIME, color)
         if color == -1:
             print(f"\nTest {index} - {player[-1]} ran out of time!")
             print(f"{player[1]} wins the game! (64-0)")
@@ -178,6 +241,8 @@ def dupmain(white_engine, black_engine, game_time, verbose, index):
 
     except LookupError as e:
         color = e.args[0]
+        log_game(game_log, header, index, history, 64 if color == 1 else 0, 64 if color == -1 else 0,
+                 gamelog.ILLEGAL, color)
         if color == -1:
             print(f"\nTest {index} - {player[-1]} made an illegal move!")
             print(f"{player[1]} wins the game! (64-0)")
@@ -200,16 +265,35 @@ if __name__ == '__main__':
     parser.add_argument("-v", action="store_true", help="display the board on each turn")
     parser.add_argument("-lB", type=int, default=4, help="adjust level of minimax")
     parser.add_argument("-lW", type=int, default=4, help="adjust level of minimax")
+    parser.add_argument("-eB", type=int, help="number of empty squares at which the black player solves the endgame exactly")
+    parser.add_argument("-eW", type=int, help="number of empty squares at which the white player solves the endgame exactly")
+    parser.add_argument("-wB", type=int, help="number of processes the black player's alpha-beta search uses")
+    parser.add_argument("-wW", type=int, help="number of processes the white player's alpha-beta search uses")
     parser.add_argument("-dup", type=int, help="loop to run program")
+    parser.add_argument("-j", type=int, help="with -dup, play the games on this many worker processes, alternating colors")
     parser.add_argument("--host", type=str, default="localhost", help="Server host for network mode (client only)")
     parser.add_argument("--port", type=int, default=12345, help="Port for network mode")
+    parser.add_argument("--board", type=str, default="list", choices=boards, help="board implementation (list, bitboard)")
+    parser.add_argument("--stats", type=str, help="append the search statistics of every move to this file as JSON lines (not with -j)")
+    parser.add_argument("--tt", type=str, help="persistent transposition table file: the engines preload it and save what they search to it")
+    parser.add_argument("--log", type=str, help="append a record of every game (moves, clocks, result) to this game log")
     args = parser.parse_args()
 
     black_engine = args.black_engine[0]
     white_engine = args.white_engine[0]
     player[-1] = f"{black_engine} (black)"
     player[1] = f"{white_engine} (white)"
-
+    board_class = boards[args.board]
+    stats_log = open(args.stats, "a") if args.stats else None
+    # Tournaments write their own log, from the parent process
+    game_log = gamelog.GameLog(args.log) if args.log and not (args.dup and args.j) else None
+    if game_log is not None:
+        atexit.register(game_log.close)
+    header = gamelog.GameHeader((black_engine, white_engine),
+                                ((args.aB, args.lB, args.eB), (args.aW, args.lW, args.eW)), args.t)
+
+    engine_b = None
+    engine_w = None
     try:
         engines_b = importlib.import_module(f"engines.{black_engine}")
         engines_w = importlib.import_module(f"engines.{white_engine}")
@@ -225,13 +309,13 @@ if __name__ == '__main__':
             if black_engine == "network_server":
                 engine_b = engines_b.engine(host='0.0.0.0', port=args.port)
             else:
-                engine_b = engines_b.engine(host=args.host, port=args.port)
+                engine_b = engines_b.engine(host=args.host, port=args.port, color=-1)
         elif white_engine in ["network_server", "network_client"]:
             # Initialize white engine first if it's network_server/client
             if white_engine == "network_server":
                 engine_w = engines_w.engine(host='0.0.0.0', port=args.port)
             else:
-                engine_w = engines_w.engine(host=args.host, port=args.port)
+                engine_w = engines_w.engine(host=args.host, port=args.port, color=1)
         
         # Step 2: Initialize the remaining engine (could be network_receiver or other)
         if engine_b is None:
@@ -239,33 +323,42 @@ if __name__ == '__main__':
         
         if engine_w is None:
             engine_w = engines_w.engine()
-        engines_list = {"greedy", "human", "random"}
-        if args.aB and black_engine not in engines_list:
-            engine_b.alpha_beta = True
-        if args.aW and white_engine not in engines_list:
-            engine_w.alpha_beta = True
-            
-        if args.lB and black_engine not in engines_list:
-            engine_b.ply_maxmin = engine_b.ply_alpha = args.lB
-            
-        if args.lW and white_engine not in engines_list:
-            engine_w.ply_maxmin = engine_w.ply_alpha = args.lW
-            
-            
+        configure_engine(engine_b, black_engine, args.aB, args.lB, args.eB, args.wB)
+        configure_engine(engine_w, white_engine, args.aW, args.lW, args.eW, args.wW)
+        # In a tournament, the worker processes that play load the table
+        if args.tt and not (args.dup and args.j):
+            for engine in (engine_b, engine_w):
+                if hasattr(engine, "load_table"):
+                    engine.load_table(args.tt)
+                    atexit.register(engine.save_table)
         
         v = args.v or white_engine == "human" or black_engine == "human"
-        if args.dup:
+        if args.dup and args.j:
+            print(f"{player[-1]} vs. {player[1]}\n")
+            try:
+                tournament.run(
+                    tournament.PlayerSettings(black_engine, args.aB, args.lB, args.eB, args.tt),
+                    tournament.PlayerSettings(white_engine, args.aW, args.lW, args.eW, args.tt),
+                    games=args.dup, workers=args.j, game_time=args.t, board=args.board,
+                    log=args.log)
+            except ValueError as e:
+                print(f"- {e}")
+        elif args.dup:
             print(f"{player[-1]} vs. {player[1]}\n")
             start_time = timeit.default_timer()
             for index in range(args.dup):
-                dupmain(engine_w, engine_b, game_time=args.t, verbose=v, index=index+1)
+                dupmain(engine_w, engine_b, game_time=args.t, verbose=v, index=index+1,
+                        board_class=board_class, stats_log=stats_log, game_log=game_log, header=header)
             end_time = timeit.default_timer()
             time_left = round(end_time - start_time, 1)
             print(f"It took {time_left}s")
         else:
             print(f"{player[-1]} vs. {player[1]}\n")
-            main(engine_w, engine_b, game_time=args.t, verbose=v)
+            main(engine_w, engine_b, game_time=args.t, verbose=v, board_class=board_class,
+                 stats_log=stats_log, game_log=game_log, header=header)
 
     except ImportError as e:
         print(f"Unknown engine -- {str(e).split()[-1]}")
         sys.exit()
+    finally:
+        close_engines(engine_b, engine_w)
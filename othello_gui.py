@@ -4,11 +4,12 @@ from ttkbootstrap.constants import *
 import subprocess
 import threading
 import socket
-import copy
 import timeit
-import time
+import queue
 import importlib
-from board import Board, move_string
+import os
+from board import Board, board_to_string, move_string
+from searchstats import write_stats
 
 def get_local_ip():
     """ Get local IP address. """
@@ -35,7 +36,7 @@ def show_1player_menu():
     back_btn = tb.Button(main_frame, text="← Back", command=show_main_menu, bootstyle="secondary")
     back_btn.grid(row=0, column=2, sticky="e", pady=(0, 20))
     
-    engines = ["human", "minimax", "alpha", "random", "greedy"]
+    engines = ["human", "minimax", "alpha", "random", "greedy", "remote"]
     black_var = tb.StringVar(value="human")
     white_var = tb.StringVar(value="minimax")
     
@@ -253,6 +254,17 @@ CELL_SIZE = 60
 PIECE_RADIUS = 25
 BOARD_SIZE = 8
 WINDOW_SIZE = CELL_SIZE * BOARD_SIZE
+# When set, the search statistics of every engine move are appended to this
+# file as JSON lines
+STATS_LOG = os.environ.get("OTHELLO_STATS")
+# When set, the engines preload their transposition table from this
+# persistent table file and save to it at the end of each game
+TT_STORE = os.environ.get("OTHELLO_TT")
+# Milliseconds between two looks at the event queue while background work
+# (engine searches, network waits) is running
+POLL_INTERVAL = 50
+# Milliseconds a new piece is shown before the discs flip
+MOVE_DELAY = 500
 
 def draw_board(canvas):
     """ Draw the board grid. """
@@ -264,72 +276,100 @@ def draw_board(canvas):
             y2 = y1 + CELL_SIZE
             canvas.create_rectangle(x1, y1, x2, y2, outline='black', fill='#2cb87b', width=2)
 
-def update_ui(canvas, board):
-    """ Update the board display. """
-    canvas.delete("piece")
-    canvas.delete("hint")
-    
-    # Board is accessed as board[x][y] where x is column (0-7), y is row (0-7)
-    # Board y=0 is bottom row, canvas y=0 is top row, so we need to flip
-    for row in range(BOARD_SIZE):
-        for col in range(BOARD_SIZE):
-            cell = board[col][row]  # board[x][y]
-            canvas_x = col * CELL_SIZE + CELL_SIZE // 2
-            canvas_y = (7 - row) * CELL_SIZE + CELL_SIZE // 2  # Flip y coordinate
-            
-            if cell == 1:  # White piece
-                canvas.create_oval(
-                    canvas_x - PIECE_RADIUS, canvas_y - PIECE_RADIUS,
-                    canvas_x + PIECE_RADIUS, canvas_y + PIECE_RADIUS,
-                    fill='white', outline='black', width=2, tags="piece"
-                )
-            elif cell == -1:  # Black piece
-                canvas.create_oval(
-                    canvas_x - PIECE_RADIUS, canvas_y - PIECE_RADIUS,
-                    canvas_x + PIECE_RADIUS, canvas_y + PIECE_RADIUS,
-                    fill='black', outline='white', width=2, tags="piece"
-                )
-
-def update_hint(canvas, legal_moves):
-    """ Update hint circles for legal moves. """
-    canvas.delete("hint")
-    
-    for x, y in legal_moves:
-        # Convert board coordinates to canvas coordinates
+class BoardView():
+    """ The discs and move hints on the canvas. Their 128 items are created
+    once; render only changes the squares that differ from the last frame,
+    and skips the frame when nothing does. """
+    
+    # Fill and outline of the discs, by board_to_string character
+    DISC_COLORS = {'X': ('black', 'white'), 'O': ('white', 'black')}
+    
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.discs = []
+        self.hints = []
+        # Squares are indexed as in board_to_string: a1, b1, ..., h1, a2, ...
         # Board y=0 is bottom, canvas y=0 is top, so flip y
-        canvas_x = x * CELL_SIZE + CELL_SIZE // 2
-        canvas_y = (7 - y) * CELL_SIZE + CELL_SIZE // 2
-        canvas.create_oval(
-            canvas_x - 16, canvas_y - 16,
-            canvas_x + 16, canvas_y + 16,
-            outline='yellow', width=1, tags="hint"
-        )
+        for square in range(64):
+            canvas_x = (square % 8) * CELL_SIZE + CELL_SIZE // 2
+            canvas_y = (7 - square // 8) * CELL_SIZE + CELL_SIZE // 2
+            self.discs.append(canvas.create_oval(
+                canvas_x - PIECE_RADIUS, canvas_y - PIECE_RADIUS,
+                canvas_x + PIECE_RADIUS, canvas_y + PIECE_RADIUS,
+                width=2, state='hidden', tags="piece"
+            ))
+        for square in range(64):
+            canvas_x = (square % 8) * CELL_SIZE + CELL_SIZE // 2
+            canvas_y = (7 - square // 8) * CELL_SIZE + CELL_SIZE // 2
+            self.hints.append(canvas.create_oval(
+                canvas_x - 16, canvas_y - 16,
+                canvas_x + 16, canvas_y + 16,
+                outline='yellow', width=1, state='hidden', tags="hint"
+            ))
+        # What the canvas shows
+        self.position = '-' * 64
+        self.hinted = frozenset()
+        # Frames drawn and skipped, items changed and seconds spent
+        self.redraws = 0
+        self.skipped = 0
+        self.changed = 0
+        self.frame_time = 0.0
+    
+    def _set_square(self, square, value):
+        if value == '-':
+            self.canvas.itemconfigure(self.discs[square], state='hidden')
+        else:
+            fill, outline = BoardView.DISC_COLORS[value]
+            self.canvas.itemconfigure(self.discs[square], fill=fill, outline=outline, state='normal')
+        self.position = self.position[:square] + value + self.position[square + 1:]
+    
+    def show_disc(self, move, color):
+        """ Show a disc before it is played on the board. """
+        x, y = move
+        self._set_square(y * 8 + x, 'X' if color == -1 else 'O')
+        self.changed += 1
+    
+    def render(self, board, hints=()):
+        """ Show the board and hint circles on the legal moves given.
+        Return whether anything changed. """
+        start_time = timeit.default_timer()
+        position = board_to_string(board)
+        hinted = frozenset(y * 8 + x for x, y in hints)
+        if position == self.position and hinted == self.hinted:
+            self.skipped += 1
+            return False
+        old = self.position
+        for square in range(64):
+            if position[square] != old[square]:
+                self._set_square(square, position[square])
+                self.changed += 1
+        for square in hinted ^ self.hinted:
+            self.canvas.itemconfigure(self.hints[square], state='normal' if square in hinted else 'hidden')
+            self.changed += 1
+        self.hinted = hinted
+        self.redraws += 1
+        self.frame_time += timeit.default_timer() - start_time
+        return True
+    
+    def report(self):
+        """ Return a line on the frames drawn so far. """
+        average = self.frame_time / self.redraws * 1000 if self.redraws else 0.0
+        return (f"Frames: {self.redraws} drawn, {self.skipped} skipped, "
+                f"{self.changed} items, {average:.2f} ms avg")
 
-def execute_move_with_animation(board, move, color, canvas, game_root, update_ui_func):
-    """ Execute move with animation: place new piece, delay, then flip pieces. """
-    # Get all pieces that need to be flipped using board's internal method
-    flips = set()
-    directions = [(1,1),(1,0),(1,-1),(0,-1),(-1,-1),(-1,0),(-1,1),(0,1)]
-    for direction in directions:
-        flip_list = board._get_flips(move, direction, color)
-        if flip_list:
-            flips.update(flip_list)
-    
-    # Step 1: Place the new piece immediately (it's already in flips, but we place it first)
-    board[move[0]][move[1]] = color
-    update_ui_func()
-    game_root.update()
-    
-    # Step 2: Delay 0.5 seconds
-    time.sleep(0.5)
-    
-    # Step 3: Flip all pieces that need to be flipped (the new piece is already placed)
-    for x, y in flips:
-        board[x][y] = color
-    
-    # Step 4: Update display
-    update_ui_func()
-    game_root.update()
+def execute_move_with_animation(board, move, color, view, game_root, on_done):
+    """ Execute move with animation: place new piece, delay, then flip pieces.
+    Return at once; on_done is called on the Tk thread once the move is on
+    the board. """
+    # Step 1: Show the new piece on its own, before the board changes
+    view.show_disc(move, color)
+    
+    # Step 2: Play the move on the board, which also flips the pieces, after
+    # the delay. Going through execute_move keeps the board's hash up to date.
+    def flip():
+        board.execute_move(move, color)
+        on_done()
+    game_root.after(MOVE_DELAY, flip)
 
 def show_game_window(black_engine, white_engine, game_time=300, level_b=4, level_w=4,
                      ab_b=False, ab_w=False, verbose=False, network_mode=False,
@@ -353,25 +393,35 @@ def show_game_window(black_engine, white_engine, game_time=300, level_b=4, level
     canvas.pack()
     
     draw_board(canvas)
+    view = BoardView(canvas)
     
     # Right side - Info panel
     info_frame = tb.Frame(main_game_frame)
     info_frame.pack(side="right", fill="both", expand=True, padx=10)
     
-    # Game state
+    # Game state. It is only touched on the Tk thread: the engine searches
+    # and network waits run on worker threads, which post their results to
+    # the events queue.
     game_state = {
         'board': Board(),
         'time_left': {-1: game_time, 1: game_time},
         'current_color': -1,  # Black starts
         'move_num': 0,
+        'round_moves': 0,
         'waiting_for_move': False,
-        'selected_move': None,
         'legal_moves': [],
         'engines': {},
-        'game_thread': None,
         'game_running': True,
-        'paused': False
+        'paused': False,
+        # Called when the game is resumed, to carry on where the pause
+        # stopped it
+        'resume': None,
+        # Worker threads running, and whether drain_events is scheduled
+        'workers': 0,
+        'draining': False
     }
+    events = queue.Queue()
+    player_name = {-1: "Black", 1: "White"}
     
     # Status labels
     status_label = tb.Label(info_frame, text="Game Starting...", font=("Arial", 14, "bold"))
@@ -389,6 +439,9 @@ def show_game_window(black_engine, white_engine, game_time=300, level_b=4, level
     legal_moves_label = tb.Label(info_frame, text="", font=("Arial", 9), wraplength=200)
     legal_moves_label.pack(pady=5)
     
+    render_label = tb.Label(info_frame, text="", font=("Arial", 8), wraplength=200)
+    render_label.pack(pady=5)
+    
     # Pause button
     pause_button = tb.Button(info_frame, text="⏸ Pause", command=lambda: toggle_pause(), bootstyle="warning")
     pause_button.pack(pady=10)
@@ -421,77 +474,128 @@ def show_game_window(black_engine, white_engine, game_time=300, level_b=4, level
         else:
             pause_button.config(text="⏸ Pause", state="normal")
             overlay_frame.place_forget()
-            player_name = {-1: "Black", 1: "White"}
             status_label.config(text=f"{player_name[game_state['current_color']]}'s turn")
-        game_root.update()
+            resume, game_state['resume'] = game_state['resume'], None
+            if resume is not None:
+                resume()
+    
+    # Background work
+    def post(callback, *args):
+        """ Have callback(*args) called on the Tk thread. Safe from any
+        thread. """
+        events.put((callback, args))
+    
+    def drain_events():
+        """ Run the callbacks posted by the worker threads. Stays scheduled
+        only while a worker is running, so an idle window costs nothing. """
+        while True:
+            try:
+                callback, args = events.get_nowait()
+            except queue.Empty:
+                break
+            callback(*args)
+        if game_state['workers']:
+            game_root.after(POLL_INTERVAL, drain_events)
+        else:
+            game_state['draining'] = False
+    
+    def run_in_worker(work, on_done):
+        """ Run work() on a worker thread, then on_done(result, error) on the
+        Tk thread, where error is the exception work raised, if any. """
+        def finish(result, error):
+            game_state['workers'] -= 1
+            if game_state['game_running']:
+                on_done(result, error)
+        
+        def target():
+            try:
+                result = work()
+            except Exception as e:
+                post(finish, None, e)
+            else:
+                post(finish, result, None)
+        
+        game_state['workers'] += 1
+        threading.Thread(target=target, daemon=True).start()
+        if not game_state['draining']:
+            game_state['draining'] = True
+            game_root.after(POLL_INTERVAL, drain_events)
     
-    # Initialize engines
+    def set_status(text):
+        status_label.config(text=text)
+    
+    # Initialize engines, on a worker thread since network engines block
+    # until the other side connects
     def init_engines():
-        try:
-            if network_mode:
-                # For network mode, update status
-                if is_server:
-                    status_label.config(text="Waiting for client to connect...")
-                else:
-                    status_label.config(text=f"Connecting to {host}:{port}...")
-                game_root.update()
-            
-            engines_b = importlib.import_module(f"engines.{black_engine}")
-            engines_w = importlib.import_module(f"engines.{white_engine}")
-            
-            # Network receivers need connection manager to be initialized first
-            # So we initialize network_server/network_client before network_receiver
-            engine_b = None
-            engine_w = None
-            
-            # Step 1: Initialize network_server or network_client first (they create connection)
-            if black_engine in ["network_server", "network_client"]:
-                if black_engine == "network_server":
-                    engine_b = engines_b.engine(host='0.0.0.0', port=port)
-                    if network_mode:
-                        status_label.config(text="Server ready! Waiting for client...")
-                        game_root.update()
-                else:
-                    engine_b = engines_b.engine(host=host, port=port)
-            elif white_engine in ["network_server", "network_client"]:
-                # Initialize white engine first if it's network_server/client
-                if white_engine == "network_server":
-                    engine_w = engines_w.engine(host='0.0.0.0', port=port)
-                else:
-                    engine_w = engines_w.engine(host=host, port=port)
-                    if network_mode:
-                        status_label.config(text="Connected! Game starting...")
-                        game_root.update()
-            
-            # Step 2: Initialize the remaining engine (could be network_receiver or other)
-            if engine_b is None:
-                engine_b = engines_b.engine()
-            
-            if engine_w is None:
-                engine_w = engines_w.engine()
-            
-            game_state['engines'][-1] = engine_b
-            game_state['engines'][1] = engine_w
-            
-            # Configure engines
-            engines_list = {"greedy", "human", "random", "network_receiver", "network_server", "network_client"}
-            if ab_b and black_engine not in engines_list:
-                game_state['engines'][-1].alpha_beta = True
-            if ab_w and white_engine not in engines_list:
-                game_state['engines'][1].alpha_beta = True
-            
-            if level_b and black_engine not in engines_list:
-                game_state['engines'][-1].ply_maxmin = game_state['engines'][-1].ply_alpha = level_b
-            if level_w and white_engine not in engines_list:
-                game_state['engines'][1].ply_maxmin = game_state['engines'][1].ply_alpha = level_w
-                
-        except Exception as e:
-            status_label.config(text=f"Error: {e}")
+        if network_mode:
+            # For network mode, update status
+            if is_server:
+                post(set_status, "Waiting for client to connect...")
+            else:
+                post(set_status, f"Connecting to {host}:{port}...")
+        
+        engines_b = importlib.import_module(f"engines.{black_engine}")
+        engines_w = importlib.import_module(f"engines.{white_engine}")
+        
+        # Network receivers need connection manager to be initialized first
+        # So we initialize network_server/network_client before network_receiver
+        engine_b = None
+        engine_w = None
+        
+        # Step 1: Initialize network_server or network_client first (they create connection)
+        if black_engine in ["network_server", "network_client"]:
+            if black_engine == "network_server":
+                engine_b = engines_b.engine(host='0.0.0.0', port=port)
+                if network_mode:
+                    post(set_status, "Server ready! Waiting for client...")
+            else:
+                engine_b = engines_b.engine(host=host, port=port, color=-1)
+        elif white_engine in ["network_server", "network_client"]:
+            # Initialize white engine first if it's network_server/client
+            if white_engine == "network_server":
+                engine_w = engines_w.engine(host='0.0.0.0', port=port)
+            else:
+                engine_w = engines_w.engine(host=host, port=port, color=1)
+                if network_mode:
+                    post(set_status, "Connected! Game starting...")
+        
+        # Step 2: Initialize the remaining engine (could be network_receiver or other)
+        if engine_b is None:
+            engine_b = engines_b.engine()
+        
+        if engine_w is None:
+            engine_w = engines_w.engine()
+        
+        # Configure engines
+        engines_list = {"greedy", "human", "random", "remote", "network_receiver", "network_server", "network_client"}
+        if ab_b and black_engine not in engines_list:
+            engine_b.alpha_beta = True
+        if ab_w and white_engine not in engines_list:
+            engine_w.alpha_beta = True
+        
+        if level_b and black_engine not in engines_list:
+            engine_b.ply_maxmin = engine_b.ply_alpha = level_b
+        if level_w and white_engine not in engines_list:
+            engine_w.ply_maxmin = engine_w.ply_alpha = level_w
+        
+        if TT_STORE:
+            for engine in (engine_b, engine_w):
+                if hasattr(engine, 'load_table'):
+                    engine.load_table(TT_STORE)
+        return engine_b, engine_w
+    
+    def on_engines_ready(engines, error):
+        if error is not None:
+            status_label.config(text=f"Error: {error}")
             game_state['game_running'] = False
+            return
+        game_state['engines'][-1], game_state['engines'][1] = engines
+        update_display()
+        start_turn()
     
     # Handle canvas click
     def on_canvas_click(event):
-        if not game_state['waiting_for_move']:
+        if not game_state['waiting_for_move'] or game_state['paused']:
             return
         
         col = event.x // CELL_SIZE
@@ -500,16 +604,42 @@ def show_game_window(black_engine, white_engine, game_time=300, level_b=4, level
         board_row = 7 - canvas_row
         
         move = (col, board_row)
-        if move in game_state['legal_moves']:
-            game_state['selected_move'] = move
-            game_state['waiting_for_move'] = False
+        if move not in game_state['legal_moves']:
+            return
+        game_state['waiting_for_move'] = False
+        color = game_state['current_color']
+        engine_name = black_engine if color == -1 else white_engine
+        
+        # If network player, send move through network
+        if engine_name in ["network_server", "network_client"]:
+            try:
+                engine = game_state['engines'][color]
+                if hasattr(engine, 'conn') and engine.conn:
+                    engine.conn.send_move(move)
+                    x, y = move
+                    move_str = chr(ord('a') + x) + str(y + 1)
+                    status_label.config(text=f"Sent: {move_str}")
+                else:
+                    status_label.config(text="Error: No connection")
+                    game_state['game_running'] = False
+                    return
+            except Exception as e:
+                status_label.config(text=f"Error sending: {e}")
+                game_state['game_running'] = False
+                return
+        play_move(color, move)
     
     canvas.bind("<Button-1>", on_canvas_click)
     
     # Update display
     def update_display():
         board = game_state['board']
-        update_ui(canvas, board)
+        # Only show hints when it's the player's turn (waiting for their move)
+        if game_state['waiting_for_move']:
+            view.render(board, game_state['legal_moves'])
+        else:
+            view.render(board)
+        render_label.config(text=view.report())
         
         black_count = board.count(-1)
         white_count = board.count(1)
@@ -519,200 +649,143 @@ def show_game_window(black_engine, white_engine, game_time=300, level_b=4, level
         time_left = game_state['time_left']
         time_label.config(text=f"Time - Black: {time_left[-1]:.1f}s, White: {time_left[1]:.1f}s")
         
-        # Only show hints when it's the player's turn (waiting for their move)
         if game_state['legal_moves']:
             if game_state['waiting_for_move']:
-                # Show hints only when waiting for player's move
-                update_hint(canvas, game_state['legal_moves'])
                 moves_str = ', '.join([chr(ord('a') + x) + str(y + 1) for x, y in sorted(game_state['legal_moves'])])
                 legal_moves_label.config(text=f"Legal moves: {moves_str}")
             else:
-                # Hide hints when it's opponent's turn
-                canvas.delete("hint")
                 legal_moves_label.config(text="Opponent's turn")
         else:
-            canvas.delete("hint")
             legal_moves_label.config(text="No legal moves")
     
-    # Game loop
-    def game_loop():
+    # Game flow: start_turn asks the player to move (a click, a network
+    # move or an engine search), play_move plays the move it gets, and
+    # advance passes the turn on, until a round where nobody can move or 60
+    # rounds
+    def advance():
+        """ Pass the turn to the other color. Return False when the game is
+        over. """
+        if game_state['current_color'] == 1:
+            if not game_state['round_moves'] or game_state['move_num'] == 59:
+                return False
+            game_state['move_num'] += 1
+            game_state['round_moves'] = 0
+        game_state['current_color'] = -game_state['current_color']
+        return True
+    
+    def start_turn():
+        if not game_state['game_running']:
+            return
+        if game_state['paused']:
+            game_state['resume'] = start_turn
+            return
         board = game_state['board']
+        while not board.get_legal_moves(game_state['current_color']):
+            if not advance():
+                game_over()
+                return
+        color = game_state['current_color']
+        move_num = game_state['move_num']
         time_left = game_state['time_left']
+        game_state['legal_moves'] = board.get_legal_moves(color)
+        status_label.config(text=f"{player_name[color]}'s turn")
         
-        for move_num in range(60):
-            if not game_state['game_running']:
-                break
+        # Check if human player or network player
+        engine_name = black_engine if color == -1 else white_engine
+        engine = game_state['engines'][color]
+        if engine_name in ["human", "network_server", "network_client"]:
+            # Human player or network player - wait for click on GUI
+            game_state['waiting_for_move'] = True
+            update_display()
+        elif engine_name == "network_receiver":
+            # Network receiver - the opponent's move arrives as an event
+            status_label.config(text=f"Waiting for opponent's move...")
+            update_display()
+            if not (hasattr(engine, 'conn') and engine.conn):
+                status_label.config(text="Error: No connection")
+                game_state['game_running'] = False
+                return
             
-            # Wait if paused
-            while game_state['paused'] and game_state['game_running']:
-                game_root.update()
-                time.sleep(0.1)
+            def on_received(move, error):
+                if isinstance(error, TimeoutError):
+                    status_label.config(text="Timeout waiting for opponent")
+                    game_state['game_running'] = False
+                elif error is not None:
+                    status_label.config(text=f"Error: {error}")
+                    game_state['game_running'] = False
+                else:
+                    x, y = move
+                    status_label.config(text=f"Received: {chr(ord('a') + x)}{y + 1}")
+                    play_when_running(color, move)
+            run_in_worker(engine.conn.wait_for_move, on_received)
+        else:
+            # AI player - search on a worker thread, on its own copy of the
+            # board
+            update_display()
+            position = board.copy()
+            clocks = time_left[color], time_left[-color]
             
-            if not game_state['game_running']:
-                break
+            def search():
+                start_time = timeit.default_timer()
+                move = engine.get_move(position, color, move_num, *clocks)
+                return move, timeit.default_timer() - start_time
             
-            moves = []
-            for color in [-1, 1]:
-                if not game_state['game_running']:
-                    break
-                
-                # Wait if paused
-                while game_state['paused'] and game_state['game_running']:
-                    game_root.update()
-                    time.sleep(0.1)
-                
-                if not game_state['game_running']:
-                    break
-                
-                legal_moves = board.get_legal_moves(color)
-                if not legal_moves:
-                    continue
-                
-                game_state['current_color'] = color
-                game_state['legal_moves'] = legal_moves
-                game_state['waiting_for_move'] = False
-                game_state['selected_move'] = None
-                
-                player_name = {-1: "Black", 1: "White"}
-                status_label.config(text=f"{player_name[color]}'s turn")
-                game_root.update()
-                
-                # Check if human player or network player
-                engine_name = black_engine if color == -1 else white_engine
-                is_human_turn = (engine_name == "human")
-                is_network_turn = (engine_name in ["network_server", "network_client"])
-                is_network_receiver = (engine_name == "network_receiver")
-                
-                if is_human_turn or is_network_turn:
-                    # Human player or network player - wait for click on GUI
-                    game_state['waiting_for_move'] = True
-                    move = None
-                    while game_state['waiting_for_move'] and game_state['game_running']:
-                        # Don't accept moves when paused
-                        if game_state['paused']:
-                            game_root.update()
-                            time.sleep(0.1)
-                            continue
-                        game_root.update()
-                        if game_state['selected_move']:
-                            move = game_state['selected_move']
-                            game_state['waiting_for_move'] = False
-                            
-                            # If network player, send move through network
-                            if is_network_turn and move:
-                                try:
-                                    engine = game_state['engines'][color]
-                                    if hasattr(engine, 'conn') and engine.conn:
-                                        engine.conn.send_move(move)
-                                        x, y = move
-                                        move_str = chr(ord('a') + x) + str(y + 1)
-                                        status_label.config(text=f"Sent: {move_str}")
-                                        game_root.update()
-                                    else:
-                                        status_label.config(text="Error: No connection")
-                                        game_state['game_running'] = False
-                                except Exception as e:
-                                    status_label.config(text=f"Error sending: {e}")
-                                    game_state['game_running'] = False
-                            break
-                        game_root.after(50)  # Small delay to prevent busy waiting
-                    
-                    if not game_state['game_running']:
-                        break
-                    
-                    if move is None:
-                        continue
-                elif is_network_receiver:
-                    # Network receiver - wait for opponent's move from network
-                    status_label.config(text=f"Waiting for opponent's move...")
-                    game_root.update()
-                    try:
-                        engine = game_state['engines'][color]
-                        if hasattr(engine, 'conn') and engine.conn:
-                            # Wait for move, checking pause periodically
-                            move = None
-                            timeout = 300
-                            start_time = time.time()
-                            while move is None and (time.time() - start_time) < timeout:
-                                if not game_state['game_running']:
-                                    break
-                                if game_state['paused']:
-                                    game_root.update()
-                                    time.sleep(0.1)
-                                    continue
-                                # Check if move is available
-                                if engine.conn.move_received.is_set():
-                                    with engine.conn.lock:
-                                        move = engine.conn.opponent_move
-                                        engine.conn.opponent_move = None
-                                        engine.conn.move_received.clear()
-                                    break
-                                game_root.update()
-                                time.sleep(0.1)
-                            
-                            if move is None:
-                                # Timeout or connection lost
-                                raise TimeoutError("Timeout waiting for opponent move")
-                            if move:
-                                x, y = move
-                                move_str = chr(ord('a') + x) + str(y + 1)
-                                status_label.config(text=f"Received: {move_str}")
-                                game_root.update()
-                            else:
-                                status_label.config(text="No move received")
-                                continue
-                        else:
-                            status_label.config(text="Error: No connection")
-                            game_state['game_running'] = False
-                            break
-                    except TimeoutError:
-                        status_label.config(text="Timeout waiting for opponent")
-                        game_state['game_running'] = False
-                        break
-                    except Exception as e:
-                        status_label.config(text=f"Error: {e}")
-                        game_state['game_running'] = False
-                        break
-                else:
-                    # AI player - wait if paused
-                    while game_state['paused'] and game_state['game_running']:
-                        game_root.update()
-                        time.sleep(0.1)
-                    
-                    if not game_state['game_running']:
-                        break
-                    
-                    start_time = timeit.default_timer()
-                    try:
-                        move = game_state['engines'][color].get_move(
-                            copy.deepcopy(board), color, move_num,
-                            time_left[color], time_left[-color]
-                        )
-                    except Exception as e:
-                        status_label.config(text=f"Error: {e}")
-                        game_state['game_running'] = False
-                        break
-                    end_time = timeit.default_timer()
-                    time_left[color] -= round(end_time - start_time, 1)
-                
+            def on_searched(result, error):
+                if error is not None:
+                    status_label.config(text=f"Error: {error}")
+                    game_state['game_running'] = False
+                    return
+                move, elapsed = result
+                time_left[color] -= round(elapsed, 1)
+                if STATS_LOG:
+                    with open(STATS_LOG, "a") as stats_log:
+                        write_stats(stats_log, engine,
+                                    engine_name=f"{engine_name} ({player_name[color].lower()})")
                 if time_left[color] < 0:
                     status_label.config(text=f"{player_name[color]} ran out of time!")
                     game_state['game_running'] = False
-                    break
-                
-                if move and move in legal_moves:
-                    # Execute move with animation
-                    execute_move_with_animation(board, move, color, canvas, game_root, update_display)
-                    moves.append(move)
-                    
-                    if verbose:
-                        move_str = chr(ord('a') + move[0]) + str(move[1] + 1)
-                        status_label.config(text=f"{player_name[color]} played {move_str}")
-            
-            if not moves:
-                break
+                    update_display()
+                    return
+                play_when_running(color, move)
+            run_in_worker(search, on_searched)
+    
+    def play_when_running(color, move):
+        """ Play a move that arrived from a worker, or once the game is
+        resumed if it is paused. """
+        if game_state['paused']:
+            game_state['resume'] = lambda: play_move(color, move)
+        else:
+            play_move(color, move)
+    
+    def play_move(color, move):
+        game_state['waiting_for_move'] = False
+        if not (move and move in game_state['legal_moves']):
+            # An engine without a move passes
+            if advance():
+                start_turn()
+            else:
+                game_over()
+            return
+        
+        def on_played():
+            if not game_state['game_running']:
+                return
+            game_state['round_moves'] += 1
+            update_display()
+            if verbose:
+                move_str = chr(ord('a') + move[0]) + str(move[1] + 1)
+                status_label.config(text=f"{player_name[color]} played {move_str}")
+            if advance():
+                start_turn()
+            else:
+                game_over()
         
-        # Game over
+        # Execute move with animation
+        view.render(game_state['board'])
+        execute_move_with_animation(game_state['board'], move, color, view, game_root, on_played)
+    
+    def game_over():
+        board = game_state['board']
         black_count = board.count(-1)
         white_count = board.count(1)
         if black_count > white_count:
@@ -722,23 +795,18 @@ def show_game_window(black_engine, white_engine, game_time=300, level_b=4, level
         else:
             status_label.config(text=f"Tie! ({black_count}-{white_count})")
         
+        for engine in game_state['engines'].values():
+            if hasattr(engine, 'save_table'):
+                engine.save_table()
         game_state['game_running'] = False
+        game_state['legal_moves'] = []
         update_display()
     
     # Initial display
     update_display()
     
-    # Start game - initialize engines in thread to avoid blocking UI
-    def init_and_start():
-        init_engines()
-        if game_state['game_running']:
-            update_display()
-            # Start game loop
-            game_loop()
-    
-    # Run initialization and game in thread
-    game_state['game_thread'] = threading.Thread(target=init_and_start, daemon=True)
-    game_state['game_thread'].start()
+    # Start game - initialize engines on a worker to avoid blocking UI
+    run_in_worker(init_engines, on_engines_ready)
     
     # Close handler
     def on_closing():
@@ -756,14 +824,6 @@ def show_game_window(black_engine, white_engine, game_time=300, level_b=4, level
     
     game_root.protocol("WM_DELETE_WINDOW", on_closing)
     
-    # Update display periodically
-    def periodic_update():
-        if game_state['game_running']:
-            update_display()
-            game_root.after(100, periodic_update)
-    
-    periodic_update()
-    
     game_root.mainloop()
 
 # === Main GUI Setup ===
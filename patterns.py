@@ -0,0 +1,329 @@
+"""
+Pattern evaluation.
+
+A position is scored as a sum of table lookups, one per pattern instance. A
+pattern is a set of squares: an edge with its two X squares, the 3x3 and
+2x5 corners, the lines and the diagonals. Its instances are its images
+under the 8 symmetries of the board, and the configuration of an instance
+is a base-3 code of its squares (0 empty, 1 black, 2 white), with the first
+square as the lowest digit. All the instances of a pattern share one table,
+and every pattern has one table per phase of the game, by number of empty
+squares.
+
+Scores are from black's point of view, in discs. AlphaEngine uses them
+instead of its heuristic only when asked to: through load_patterns, or by
+naming the weights file in the OTHELLO_PATTERNS environment variable, which
+the engines of every process read when they are created. During the
+search, PatternBoard wraps the board and updates the codes of the instances
+that contain the changed squares on every move and undo, so that scoring a
+leaf costs one lookup per instance.
+
+The weights file holds the tables of every phase, in the order of PATTERNS,
+as little-endian float32:
+
+    header  magic b"OPW1", version, phases, entries per phase
+
+    python patterns.py init patterns.bin
+    python patterns.py check
+    OTHELLO_PATTERNS=patterns.bin python othello.py alpha greedy -aB
+"""
+
+import argparse
+import array
+import os
+import random
+import struct
+import sys
+import timeit
+import zlib
+from bitboard import squares
+from board import Board
+from symmetry import SQUARE_MAP
+
+MAGIC = b"OPW1"
+VERSION = 1
+HEADER = struct.Struct("<4sIII")
+
+# Environment variable that names the weights file of AlphaEngine
+ENVIRONMENT = "OTHELLO_PATTERNS"
+# Weights file patterns.py init and tune.py write by default
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "patterns.bin")
+# Phases of the game, of 10 plies each
+PHASES = 6
+
+# Name and squares of every pattern, for its instance in the a1 corner or on
+# the first rows, in the order of the digits of its code
+PATTERNS = [
+    ("edge_2x", [(x, 0) for x in range(8)] + [(1, 1), (6, 1)]),
+    ("corner_3x3", [(x, y) for x in range(3) for y in range(3)]),
+    ("corner_2x5", [(x, y) for y in range(2) for x in range(5)]),
+    ("line_2", [(x, 1) for x in range(8)]),
+    ("line_3", [(x, 2) for x in range(8)]),
+    ("line_4", [(x, 3) for x in range(8)]),
+    ("diagonal_8", [(i, i) for i in range(8)]),
+    ("diagonal_7", [(i, i + 1) for i in range(7)]),
+    ("diagonal_6", [(i, i + 2) for i in range(6)]),
+    ("diagonal_5", [(i, i + 3) for i in range(5)]),
+    ("diagonal_4", [(i, i + 4) for i in range(4)]),
+]
+# Entries of the table of every pattern, and of all the tables of a phase
+SIZES = [3 ** len(points) for _, points in PATTERNS]
+ENTRIES = sum(SIZES)
+
+
+def _instances():
+    # Every distinct image of every pattern as (pattern, squares), squares
+    # given as x*8 + y in the order of the digits. Images with the same
+    # squares, such as a diagonal and its reverse, count once.
+    instances, seen = [], set()
+    for pattern, (_, points) in enumerate(PATTERNS):
+        for square_map in SQUARE_MAP:
+            image = tuple(square_map[x * 8 + y] for x, y in points)
+            if frozenset(image) not in seen:
+                seen.add(frozenset(image))
+                instances.append((pattern, image))
+    return instances
+
+
+INSTANCES = _instances()
+# UPDATES[square] lists (instance, 3 ** digit) for the instances containing
+# the square
+UPDATES = [[(index, 3 ** digit) for index, (_, image) in enumerate(INSTANCES)
+            for digit, other in enumerate(image) if other == square]
+           for square in range(64)]
+
+
+def phase(empties):
+    """ Return the phase of a position with this many empty squares. """
+    return min((60 - empties) * PHASES // 60, PHASES - 1)
+
+
+def pattern_codes(board):
+    """ Return the code of every instance for any board, computed from
+    scratch. """
+    digits = [0] * 64
+    for x, y in board.get_squares(-1):
+        digits[x * 8 + y] = 1
+    for x, y in board.get_squares(1):
+        digits[x * 8 + y] = 2
+    return [sum(digits[square] * 3 ** digit for digit, square in enumerate(image))
+            for _, image in INSTANCES]
+
+
+class PatternBoard():
+    """ Wraps a Board or BitBoard and keeps the codes of its instances, its
+    number of empty squares and its disc difference (black minus white) up
+    to date through execute_move and undo_move. Everything else is the
+    wrapped board's. """
+
+    def __init__(self, board):
+        self.board = board
+        self.codes = pattern_codes(board)
+        self.empties = board.count(0)
+        self.difference = board.count(-1) - board.count(1)
+
+    def __getitem__(self, index):
+        return self.board[index]
+
+    def __getattr__(self, name):
+        if name == "board":
+            raise AttributeError(name)
+        return getattr(self.board, name)
+
+    @property
+    def hash(self):
+        return self.board.hash
+
+    def execute_move(self, move, color):
+        """ Play the move on the board and update the codes. Return the
+        board's undo record. """
+        undo = self.board.execute_move(move, color)
+        self._update(undo, 1)
+        return undo
+
+    def undo_move(self, undo):
+        """ Take back a move and its code changes. """
+        self.board.undo_move(undo)
+        self._update(undo, -1)
+
+    def _update(self, undo, sign):
+        move, color, flipped = undo
+        if not flipped:
+            return
+        # Board records (x, y) squares, BitBoard a square index and a mask
+        if isinstance(flipped, int):
+            flipped = [x * 8 + y for x, y in squares(flipped)]
+        else:
+            move = move[0] * 8 + move[1]
+            flipped = [x * 8 + y for x, y in flipped]
+        codes = self.codes
+        # The move's square goes from 0 to the digit of color, and every
+        # flipped square from the other digit to it, a change of color
+        place = sign * (1 if color == -1 else 2)
+        for instance, power in UPDATES[move]:
+            codes[instance] += place * power
+        flip = sign * color
+        for square in flipped:
+            for instance, power in UPDATES[square]:
+                codes[instance] += flip * power
+        self.empties -= sign
+        self.difference -= sign * color * (1 + 2 * len(flipped))
+
+    def finished(self):
+        """ Whether neither color can move: the board is full, one color has
+        no discs left, or both are blocked. """
+        if self.empties == 0 or abs(self.difference) == 64 - self.empties:
+            return True
+        return not self.board.get_legal_moves(-1) and not self.board.get_legal_moves(1)
+
+    def copy(self):
+        """ Return an independent copy of the board and its codes. """
+        board = PatternBoard.__new__(PatternBoard)
+        board.board = self.board.copy()
+        board.codes = self.codes[:]
+        board.empties = self.empties
+        board.difference = self.difference
+        return board
+
+
+class PatternWeights():
+    """ Score tables of every pattern, for every phase. """
+
+    def __init__(self, values, path=None):
+        """ values is an array('f') of PHASES * ENTRIES scores, the tables of
+        PATTERNS phase after phase. """
+        self.values = values
+        self.path = path
+        # Identifies the weights in persistent transposition tables
+        self.signature = zlib.crc32(values.tobytes())
+        # The tables of every phase, one per instance, in the order of the
+        # codes
+        self.tables = []
+        for start in range(0, PHASES * ENTRIES, ENTRIES):
+            tables = []
+            for size in SIZES:
+                tables.append(values[start:start + size])
+                start += size
+            self.tables.append([tables[pattern] for pattern, _ in INSTANCES])
+
+    @classmethod
+    def from_square_weights(cls, weights, square_scale=(2, 2, 2, 2, 3, 3),
+                            disc_weight=(0, 0, 0, 0, 1, 1)):
+        """ Tables that give every own square its weight in weights (64
+        values, indexed x*8 + y) times square_scale[phase], plus
+        disc_weight[phase], and every opponent square minus that. Summed
+        over the instances, a square counts once, so the score is close to
+        the heuristic's corner and disc terms. """
+        coverage = [len(UPDATES[square]) for square in range(64)]
+        values = array.array('f')
+        for scale, disc in zip(square_scale, disc_weight):
+            for _, points in PATTERNS:
+                # Add the digits from the lowest: the table of the first k
+                # squares, then with the next square empty, black, white
+                table = [0.0]
+                for x, y in points:
+                    square = x * 8 + y
+                    value = (scale * weights[square] + disc) / coverage[square]
+                    table = table + [v + value for v in table] + [v - value for v in table]
+                values.extend(table)
+        return cls(values)
+
+    @classmethod
+    def read(cls, path):
+        """ Read a weights file. """
+        with open(path, "rb") as f:
+            magic, version, phases, entries = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION or phases != PHASES or entries != ENTRIES:
+                raise ValueError(f"{path} is not a version {VERSION} pattern weights file")
+            values = array.array('f')
+            values.fromfile(f, PHASES * ENTRIES)
+        if sys.byteorder == "big":
+            values.byteswap()
+        return cls(values, path)
+
+    def write(self, path):
+        """ Write the weights file. """
+        values = array.array('f', self.values)
+        if sys.byteorder == "big":
+            values.byteswap()
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, PHASES, ENTRIES))
+            values.tofile(f)
+        self.path = path
+
+    def evaluate(self, codes, empties):
+        """ Return the score for black of the position with these codes and
+        this many empty squares. """
+        return sum([table[code] for table, code in zip(self.tables[phase(empties)], codes)])
+
+
+def load():
+    """ Return the PatternWeights of the file named by the OTHELLO_PATTERNS
+    environment variable, or None when it is not set. """
+    path = os.environ.get(ENVIRONMENT)
+    if not path:
+        return None
+    return PatternWeights.read(path)
+
+
+def check_incremental(games=100, seed=0, board_class=Board):
+    """ Play random games on a PatternBoard, taking every move back and
+    playing it again, and raise AssertionError as soon as the codes differ
+    from those computed from scratch. Return the number of positions
+    compared. """
+    rng = random.Random(seed)
+    positions = 0
+    for _ in range(games):
+        board, color, passes = PatternBoard(board_class()), -1, 0
+        while passes < 2:
+            moves = board.get_legal_moves(color)
+            if not moves:
+                passes += 1
+                color = -color
+                continue
+            passes = 0
+            codes = board.codes[:]
+            move = rng.choice(moves)
+            board.undo_move(board.execute_move(move, color))
+            assert board.codes == codes, "undo_move left different codes"
+            board.execute_move(move, color)
+            assert board.codes == pattern_codes(board), "codes differ from the position"
+            assert board.empties == board.count(0)
+            assert board.difference == board.count(-1) - board.count(1)
+            positions += 1
+            color = -color
+    return positions
+
+
+if __name__ == '__main__':
+    from bitboard import BitBoard
+    from engines.alpha import AlphaEngine
+
+    parser = argparse.ArgumentParser(description="Write or check pattern weights.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    init = commands.add_parser("init", help="write weights derived from AlphaEngine.WEIGHTS")
+    init.add_argument("path", type=str, nargs="?", default=DEFAULT_PATH, help="weights file to write")
+    commands.add_parser("check", help="check the incremental codes and time the evaluation")
+    args = parser.parse_args()
+
+    if args.command == "init":
+        PatternWeights.from_square_weights(AlphaEngine.WEIGHTS).write(args.path)
+        print(f"{len(INSTANCES)} instances of {len(PATTERNS)} patterns, "
+              f"{PHASES} x {ENTRIES} weights written to {args.path}")
+    else:
+        for board_class in (Board, BitBoard):
+            positions = check_incremental(50, board_class=board_class)
+            print(f"{board_class.__name__}: incremental codes match in {positions} positions")
+        weights = PatternWeights.from_square_weights(AlphaEngine.WEIGHTS)
+        engine = AlphaEngine.__new__(AlphaEngine)
+        rng = random.Random(1)
+        board, color = PatternBoard(BitBoard()), -1
+        for _ in range(30):
+            moves = board.get_legal_moves(color)
+            board.execute_move(rng.choice(moves), color)
+            color = -color
+        repeat = 2000
+        elapsed = timeit.timeit(lambda: weights.evaluate(board.codes, board.empties), number=repeat)
+        print(f"Pattern evaluation: {elapsed / repeat * 1e6:.1f} us per leaf ({len(INSTANCES)} lookups)")
+        elapsed = timeit.timeit(lambda: engine.heuristic(board.board, color, 15), number=repeat // 10)
+        print(f"Heuristic: {elapsed / (repeat // 10) * 1e6:.1f} us per leaf")
@@ -0,0 +1,121 @@
+"""
+Perft: count the positions reachable in exactly N plies.
+
+Counting every leaf of the full game tree exercises get_legal_moves,
+execute_move and undo_move on millions of positions. Any difference from
+the reference counts, or between two board implementations, points at a
+move generation bug.
+
+Passes are handled the Othello way: a player without a legal move passes,
+and the pass uses up a ply. A finished game (neither player can move) is a
+leaf, whatever the depth left.
+
+    python perft.py 8
+    python perft.py 9 --board bitboard -j 4
+    python perft.py 6 --position=<64 characters> --color white --divide
+
+Give the position with "=", as above: it often starts with "-" (an empty
+a1), which argparse would otherwise take for an option.
+"""
+
+import argparse
+import multiprocessing
+import sys
+import timeit
+from board import Board, board_from_string, board_to_string, move_string
+from bitboard import BitBoard
+
+boards = {"list": Board, "bitboard": BitBoard}
+
+# Leaf counts from the initial position, black to move, by depth
+REFERENCE = [1, 4, 12, 56, 244, 1396, 8200, 55092, 390216, 3005288, 24571284,
+             212258800, 1939886636, 18429641748]
+
+
+def perft(board, color, depth):
+    """ Return the number of leaves depth plies below the position with
+    color to move. The board is left as it was. """
+    if depth == 0:
+        return 1
+    moves = board.get_legal_moves(color)
+    if not moves:
+        if not board.get_legal_moves(-color):
+            # The game is over
+            return 1
+        return perft(board, -color, depth - 1)
+    if depth == 1:
+        # Bulk counting: the children are the leaves
+        return len(moves)
+    count = 0
+    for move in moves:
+        undo = board.execute_move(move, color)
+        count += perft(board, -color, depth - 1)
+        board.undo_move(undo)
+    return count
+
+
+def divide(board, color, depth):
+    """ Return a dictionary from each root move to the leaf count below it.
+    A position where color has to pass has the single root move None. """
+    moves = board.get_legal_moves(color)
+    if depth == 0 or not moves:
+        return {None: perft(board, color, depth)}
+    counts = {}
+    for move in moves:
+        undo = board.execute_move(move, color)
+        counts[move] = perft(board, -color, depth - 1)
+        board.undo_move(undo)
+    return counts
+
+
+def _perft_root_move(task):
+    # Work of one process: the subtree below a single root move
+    text, color, move, depth, board_name = task
+    board = board_from_string(text, boards[board_name])
+    board.execute_move(move, color)
+    return move, perft(board, -color, depth - 1)
+
+
+def parallel_divide(board, color, depth, workers, board_name="list"):
+    """ Like divide, but search the subtrees of the root moves on a pool of
+    worker processes. """
+    moves = board.get_legal_moves(color)
+    if depth == 0 or not moves or workers <= 1:
+        return divide(board, color, depth)
+    text = board_to_string(board)
+    tasks = [(text, color, move, depth, board_name) for move in moves]
+    with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+        return dict(pool.imap_unordered(_perft_root_move, tasks))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Count the leaf positions of the game tree to a given depth.")
+    parser.add_argument("depth", type=int, help="number of plies")
+    parser.add_argument("--board", type=str, default="list", choices=boards, help="board implementation (list, bitboard)")
+    parser.add_argument("--position", type=str, help="start from this position (64 characters, X, O and -, from a1 to h8) instead of the initial one; write it --position=... since it may start with -")
+    parser.add_argument("--color", type=str, default="black", choices=["black", "white"], help="color to move in --position")
+    parser.add_argument("--divide", action="store_true", help="print the count below each root move")
+    parser.add_argument("-j", type=int, default=1, help="split the root moves over this many worker processes")
+    args = parser.parse_args()
+
+    board_class = boards[args.board]
+    board = board_from_string(args.position, board_class) if args.position else board_class()
+    color = -1 if args.color == "black" else 1
+
+    start_time = timeit.default_timer()
+    counts = parallel_divide(board, color, args.depth, args.j, args.board)
+    elapsed = timeit.default_timer() - start_time
+    total = sum(counts.values())
+
+    if args.divide:
+        for move in sorted(counts, key=lambda move: move or (-1, -1)):
+            print(f"{move_string(move) if move else 'pass'}: {counts[move]}")
+        print()
+    print(f"perft({args.depth}) = {total}")
+    print(f"{elapsed:.2f}s, {int(total / elapsed) if elapsed else 0} positions/s")
+    if not args.position and color == -1 and args.depth < len(REFERENCE):
+        expected = REFERENCE[args.depth]
+        if total != expected:
+            print(f"WRONG: the reference count is {expected}")
+            sys.exit(1)
+        print("matches the reference count")
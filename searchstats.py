@@ -0,0 +1,80 @@
+"""
+Statistics of one engine search.
+
+An engine that supports them fills a SearchStats during get_move and keeps
+it as engine.last_stats. The game loops of othello.py and othello_gui.py
+can append them to a file as JSON lines, one per move, to study offline
+where the search time goes.
+"""
+
+import json
+
+
+class SearchStats():
+    """ Counters and timing of a single get_move call. """
+
+    def __init__(self, color=None, move_num=None):
+        self.color = color
+        self.move_num = move_num
+        self.move = None
+        # Interior and leaf nodes of the heuristic search, or nodes of the
+        # endgame solver
+        self.nodes = 0
+        # Positions scored by the heuristic
+        self.leaves = 0
+        self.cutoffs = 0
+        self.first_cutoffs = 0
+        self.tt_hits = 0
+        self.depth = 0
+        self.book = False
+        self.endgame = False
+        self.elapsed = 0.0
+
+    @property
+    def nps(self):
+        """ Nodes searched per second. """
+        return self.nodes / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        """ Return the statistics as a JSON-serialisable dictionary. """
+        return {
+            "color": self.color,
+            "move_num": self.move_num,
+            "move": list(self.move) if self.move is not None else None,
+            "nodes": self.nodes,
+            "leaves": self.leaves,
+            "cutoffs": self.cutoffs,
+            "first_cutoffs": self.first_cutoffs,
+            "tt_hits": self.tt_hits,
+            "depth": self.depth,
+            "book": self.book,
+            "endgame": self.endgame,
+            "elapsed": round(self.elapsed, 6),
+            "nps": round(self.nps, 1),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """ Rebuild statistics from the dictionary of as_dict, for example
+        after they crossed the network. """
+        stats = cls(data.get("color"), data.get("move_num"))
+        for name in ("nodes", "leaves", "cutoffs", "first_cutoffs", "tt_hits", "depth",
+                     "book", "endgame", "elapsed"):
+            if name in data:
+                setattr(stats, name, data[name])
+        if data.get("move") is not None:
+            stats.move = tuple(data["move"])
+        return stats
+
+
+def write_stats(log, engine, **fields):
+    """ Append the last_stats of engine to the open file log as one JSON
+    line, with the extra fields given. Do nothing when log is None or the
+    engine keeps no statistics. """
+    stats = getattr(engine, 'last_stats', None)
+    if log is None or stats is None:
+        return
+    record = dict(fields)
+    record.update(stats.as_dict())
+    log.write(json.dumps(record) + "\n")
+    log.flush()
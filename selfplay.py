@@ -0,0 +1,245 @@
+"""
+Self-play data generator.
+
+Plays games between two engines of engines/ over a pool of worker
+processes, without printing anything, and writes one record per move to a
+file of fixed-size records, to train evaluation weights on. Every game
+starts with a few random plies, so that the games differ, and the players
+swap colors from one game to the next.
+
+    header   magic b"OSP1", version, record size
+    records  black (u64), white (u64), color (i8), square x*8 + y (u8),
+             result (i8), flags (u8)
+
+black and white are the bitboards of the position (bit x*8 + y), color the
+side to move and square the move it played. result is the final disc
+differential of the game for black, black discs minus white discs. flags
+marks the moves that were random (FLAG_RANDOM) or the only legal move
+(FLAG_FORCED); passes have no record. The records of a game are
+consecutive.
+
+Every task plays a batch of games and sends back their records packed, and
+the parent writes them in chunks of at least WRITE_SIZE bytes. Read a file
+record by record with read_records, or all at once as a NumPy array with
+one column per field with load.
+
+    python selfplay.py play data.bin alpha alpha -a -l 3 --games 10000 -j 8
+    python selfplay.py show data.bin
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import random
+import struct
+import timeit
+from collections import namedtuple
+from contextlib import redirect_stdout
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import othello
+from bitboard import to_bitboards
+
+MAGIC = b"OSP1"
+VERSION = 1
+HEADER = struct.Struct("<4sII")
+RECORD = struct.Struct("<QQbBbB")
+
+FLAG_RANDOM = 1
+FLAG_FORCED = 2
+
+# Games played by a worker per task
+GAMES_PER_TASK = 8
+# The parent writes once it has this many bytes of records
+WRITE_SIZE = 1 << 20
+
+# One move of a self-play game, as stored in the file
+Record = namedtuple("Record", ["black", "white", "color", "move", "result", "flags"])
+
+# State of a worker process, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(settings_a, settings_b, board, random_plies, seed):
+    from tournament import make_engine
+    with redirect_stdout(io.StringIO()):
+        _worker["engines"] = (make_engine(settings_a), make_engine(settings_b))
+    _worker["board_class"] = othello.boards[board]
+    _worker["random_plies"] = random_plies
+    _worker["seed"] = seed
+
+
+def _play_game(index):
+    # Play one game and return its records packed. The first player has
+    # black in even games and white in odd ones.
+    engine_a, engine_b = _worker["engines"]
+    engine = {-1: engine_a, 1: engine_b} if index % 2 == 0 else {-1: engine_b, 1: engine_a}
+    rng = random.Random(_worker["seed"] * (1 << 32) + index)
+    board = _worker["board_class"]()
+    moves, color, passes, plies = [], -1, 0, 0
+    while passes < 2:
+        legal = board.get_legal_moves(color)
+        if not legal:
+            passes += 1
+            color = -color
+            continue
+        passes = 0
+        black, white = to_bitboards(board, -1)
+        if plies < _worker["random_plies"]:
+            move, flags = rng.choice(legal), FLAG_RANDOM
+        elif len(legal) == 1:
+            move, flags = legal[0], FLAG_FORCED
+        else:
+            move, flags = engine[color].get_move(board.copy(), color, plies // 2), 0
+            if move not in legal:
+                raise LookupError(color)
+        moves.append((black, white, color, move[0] * 8 + move[1], flags))
+        board.execute_move(move, color)
+        plies += 1
+        color = -color
+    result = board.count(-1) - board.count(1)
+    data = bytearray(RECORD.size * len(moves))
+    for offset, (black, white, color, square, flags) in zip(range(0, len(data), RECORD.size), moves):
+        RECORD.pack_into(data, offset, black, white, color, square, result, flags)
+    return data
+
+
+def _play_games(first):
+    # Play the games of one task, with the output of the engines discarded
+    with redirect_stdout(io.StringIO()):
+        return b"".join(_play_game(index) for index in range(first, first + GAMES_PER_TASK))
+
+
+def _open(path, append):
+    # Open the file for writing, after the header of an existing file when
+    # appending
+    if append and os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb") as f:
+            _check_header(f, path)
+        return open(path, "ab")
+    f = open(path, "wb")
+    f.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+    return f
+
+
+def _check_header(f, path):
+    magic, version, size = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION or size != RECORD.size:
+        raise ValueError(f"{path} is not a version {VERSION} self-play file")
+
+
+def generate(path, settings_a, settings_b, games, workers=None, random_plies=4,
+             board="bitboard", seed=0, append=False):
+    """ Play games between the players given by tournament.PlayerSettings,
+    the first one starting with black, and write their records to path.
+    Games are played in batches of GAMES_PER_TASK, so the number of games
+    is rounded up. Return (games, positions). """
+    from tournament import INTERACTIVE_ENGINES
+    for settings in (settings_a, settings_b):
+        if settings.engine in INTERACTIVE_ENGINES:
+            raise ValueError(f"{settings.engine} cannot play self-play games")
+    workers = workers or multiprocessing.cpu_count()
+    tasks = range(0, games, GAMES_PER_TASK)
+    initargs = (settings_a, settings_b, board, random_plies, seed)
+    buffer = bytearray()
+    written = 0
+    with _open(path, append) as f:
+        if workers > 1:
+            with multiprocessing.Pool(workers, _init_worker, initargs) as pool:
+                for data in pool.imap_unordered(_play_games, tasks):
+                    buffer += data
+                    if len(buffer) >= WRITE_SIZE:
+                        f.write(buffer)
+                        written += len(buffer)
+                        buffer.clear()
+        else:
+            _init_worker(*initargs)
+            for first in tasks:
+                buffer += _play_games(first)
+                if len(buffer) >= WRITE_SIZE:
+                    f.write(buffer)
+                    written += len(buffer)
+                    buffer.clear()
+        f.write(buffer)
+        written += len(buffer)
+    return len(tasks) * GAMES_PER_TASK, written // RECORD.size
+
+
+def read_records(path, chunk=WRITE_SIZE):
+    """ Yield the records of a file as Record, reading chunk bytes at a
+    time. """
+    with open(path, "rb") as f:
+        _check_header(f, path)
+        chunk -= chunk % RECORD.size
+        while True:
+            data = f.read(chunk)
+            if not data:
+                break
+            # A file being written may end in the middle of a record
+            data = data[:len(data) - len(data) % RECORD.size]
+            for fields in RECORD.iter_unpack(data):
+                yield Record(*fields)
+
+
+def load(path):
+    """ Return all the records of a file as a NumPy structured array, one
+    field per column of Record. """
+    dtype = np.dtype([("black", "<u8"), ("white", "<u8"), ("color", "i1"),
+                      ("move", "u1"), ("result", "i1"), ("flags", "u1")])
+    with open(path, "rb") as f:
+        _check_header(f, path)
+        count = (os.path.getsize(path) - HEADER.size) // RECORD.size
+        return np.fromfile(f, dtype=dtype, count=count)
+
+
+if __name__ == '__main__':
+    from tournament import PlayerSettings
+
+    parser = argparse.ArgumentParser(description="Generate training positions from self-play.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    play = commands.add_parser("play", help="play games and write their records")
+    play.add_argument("path", type=str, help="file to write the records to")
+    play.add_argument("engines", type=str, nargs=2, help="the two engines of engines/, the first starting with black")
+    play.add_argument("-a", action="store_true", help="use alpha-beta pruning")
+    play.add_argument("-l", type=int, nargs="+", default=[2], help="search depth, for both engines or for each")
+    play.add_argument("-e", type=int, nargs="+", help="number of empty squares at which the endgame is solved exactly, for both engines or for each")
+    play.add_argument("--games", type=int, default=1000, help="number of games, rounded up to a multiple of 8")
+    play.add_argument("--random", type=int, default=6, help="number of random plies at the start of each game")
+    play.add_argument("--seed", type=int, default=0, help="seed of the random plies")
+    play.add_argument("--board", type=str, default="bitboard", choices=othello.boards, help="board implementation (list, bitboard)")
+    play.add_argument("--append", action="store_true", help="add the records to an existing file")
+    play.add_argument("-j", type=int, help="number of worker processes (all cores by default)")
+    show = commands.add_parser("show", help="print statistics of a file")
+    show.add_argument("path", type=str, help="file to read")
+    args = parser.parse_args()
+
+    if args.command == "play":
+        levels = args.l * 2 if len(args.l) == 1 else args.l
+        endgames = (args.e * 2 if len(args.e) == 1 else args.e) if args.e else [None, None]
+        settings = [PlayerSettings(engine, args.a, level, endgame)
+                    for engine, level, endgame in zip(args.engines, levels, endgames)]
+        start_time = timeit.default_timer()
+        games, positions = generate(args.path, settings[0], settings[1], args.games, args.j,
+                                    args.random, args.board, args.seed, args.append)
+        wall_time = timeit.default_timer() - start_time
+        print(f"{games} games, {positions} positions written to {args.path}")
+        print(f"It took {round(wall_time, 1)}s ({positions / wall_time * 3600:,.0f} positions per hour)")
+    else:
+        positions = random_moves = forced = games = 0
+        wins = {-1: 0, 0: 0, 1: 0}
+        for record in read_records(args.path):
+            positions += 1
+            random_moves += record.flags & FLAG_RANDOM != 0
+            forced += record.flags & FLAG_FORCED != 0
+            # A game starts at the position with 4 discs
+            if bin(record.black | record.white).count("1") == 4:
+                games += 1
+                wins[(record.result < 0) - (record.result > 0)] += 1
+        print(f"{games} games, {positions} positions ({random_moves} random, {forced} forced moves)")
+        if games:
+            print(f"Black won {wins[-1]}, white won {wins[1]}, {wins[0]} draws")
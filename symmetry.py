@@ -0,0 +1,150 @@
+"""
+The 8 symmetries of the Othello board.
+
+Symmetry t maps square (x, y) to:
+
+    0 (x, y)        identity
+    1 (7 - x, y)    mirror in x
+    2 (x, 7 - y)    mirror in y
+    3 (7 - x, 7 - y)
+    4 (y, x)        transpose
+    5 (7 - y, x)
+    6 (y, 7 - x)
+    7 (7 - y, 7 - x)
+
+Positions are transformed as 64-bit masks (bit x*8 + y, as in bitboard.py)
+with byte swaps and delta swaps, so the canonical form of a position, the
+smallest of its 8 transforms, costs a few dozen integer operations.
+"""
+
+FULL = 0xFFFFFFFFFFFFFFFF
+
+# Symmetry that undoes each symmetry
+INVERSE = [0, 1, 2, 3, 4, 6, 5, 7]
+
+_POINT_MAPS = [
+    lambda x, y: (x, y),
+    lambda x, y: (7 - x, y),
+    lambda x, y: (x, 7 - y),
+    lambda x, y: (7 - x, 7 - y),
+    lambda x, y: (y, x),
+    lambda x, y: (7 - y, x),
+    lambda x, y: (y, 7 - x),
+    lambda x, y: (7 - y, 7 - x),
+]
+# SQUARE_MAP[t][x*8 + y] is the square (x, y) goes to under symmetry t
+SQUARE_MAP = [[x * 8 + y for x, y in (point_map(square >> 3, square & 7) for square in range(64))]
+              for point_map in _POINT_MAPS]
+
+
+def mirror_x(bits):
+    """ Map (x, y) to (7 - x, y): reverse the order of the bytes. """
+    return int.from_bytes(bits.to_bytes(8, 'little'), 'big')
+
+
+def mirror_y(bits):
+    """ Map (x, y) to (x, 7 - y): reverse the bits of every byte. """
+    bits = ((bits >> 1) & 0x5555555555555555) | ((bits & 0x5555555555555555) << 1)
+    bits = ((bits >> 2) & 0x3333333333333333) | ((bits & 0x3333333333333333) << 2)
+    return ((bits >> 4) & 0x0F0F0F0F0F0F0F0F) | ((bits & 0x0F0F0F0F0F0F0F0F) << 4)
+
+
+def transpose(bits):
+    """ Map (x, y) to (y, x). """
+    swap = 0x0F0F0F0F00000000 & (bits ^ (bits << 28))
+    bits ^= swap ^ (swap >> 28)
+    swap = 0x3333000033330000 & (bits ^ (bits << 14))
+    bits ^= swap ^ (swap >> 14)
+    swap = 0x5500550055005500 & (bits ^ (bits << 7))
+    return bits ^ swap ^ (swap >> 7)
+
+
+def transforms(bits):
+    """ Return the 8 transforms of a mask, indexed by symmetry. """
+    x = mirror_x(bits)
+    y = mirror_y(bits)
+    xy = mirror_x(y)
+    t = transpose(bits)
+    tx = mirror_x(t)
+    ty = mirror_y(t)
+    return [bits, x, y, xy, t, tx, ty, mirror_x(ty)]
+
+
+def transform(bits, symmetry):
+    """ Return the transform of a mask by one symmetry. """
+    if symmetry >= 4:
+        bits = transpose(bits)
+    if symmetry & 2:
+        bits = mirror_y(bits)
+    if symmetry & 1:
+        bits = mirror_x(bits)
+    return bits
+
+
+def transform_move(move, symmetry):
+    """ Return the square move (x, y) goes to under symmetry. """
+    return _POINT_MAPS[symmetry](*move)
+
+
+def canonical(black, white):
+    """ Return ((black, white), symmetries): the smallest of the 8
+    transforms of the position and every symmetry that produces it. A
+    position that is itself symmetric has several. """
+    forms = list(zip(transforms(black), transforms(white)))
+    smallest = min(forms)
+    return smallest, [symmetry for symmetry, form in enumerate(forms) if form == smallest]
+
+
+def check(games=50, seed=0):
+    """ Play random games and raise AssertionError unless, on every
+    position, the mask transforms agree with SQUARE_MAP, symmetric
+    positions have the same canonical form, INVERSE undoes every symmetry
+    and legal moves map to legal moves. Return the number of positions
+    checked. """
+    import random
+    from board import Board
+    from bitboard import BitBoard, legal_moves, squares
+    rng = random.Random(seed)
+    positions = 0
+    for game in range(games):
+        board = Board() if game % 2 else BitBoard()
+        color = -1
+        while True:
+            moves = board.get_legal_moves(color) or board.get_legal_moves(-color)
+            if not moves:
+                break
+            if not board.get_legal_moves(color):
+                color = -color
+            form, symmetries = board.canonical()
+            black = sum(1 << (x * 8 + y) for x, y in board.get_squares(-1))
+            white = sum(1 << (x * 8 + y) for x, y in board.get_squares(1))
+            assert transform(black, symmetries[0]) == form[0]
+            assert transform(white, symmetries[0]) == form[1]
+            for symmetry in range(8):
+                mapped_black = transform(black, symmetry)
+                mapped_white = transform(white, symmetry)
+                assert mapped_black == sum(1 << SQUARE_MAP[symmetry][x * 8 + y]
+                                           for x, y in board.get_squares(-1))
+                assert transform(mapped_black, INVERSE[symmetry]) == black
+                assert canonical(mapped_black, mapped_white)[0] == form
+                own, opp = (mapped_black, mapped_white) if color == -1 else (mapped_white, mapped_black)
+                assert sorted(squares(legal_moves(own, opp))) == sorted(
+                    transform_move(move, symmetry) for move in board.get_legal_moves(color))
+            positions += 1
+            board.execute_move(rng.choice(board.get_legal_moves(color)), color)
+            color = -color
+    return positions
+
+
+if __name__ == '__main__':
+    import timeit
+    from board import Board
+    from bitboard import BitBoard
+    print(f"Symmetries agree on {check()} positions")
+    for board_class in (Board, BitBoard):
+        board = board_class()
+        for move, color in [((2, 4), -1), ((2, 5), 1), ((5, 3), -1), ((3, 2), 1), ((2, 3), -1)]:
+            board.execute_move(move, color)
+        number = 20000
+        elapsed = timeit.timeit(board.canonical, number=number) / number
+        print(f"{board_class.__name__}.canonical: {elapsed * 1e6:.1f}us")
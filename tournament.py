@@ -0,0 +1,163 @@
+"""
+Parallel tournament runner.
+
+Plays a match between two engines over a pool of worker processes. Every
+worker builds its own pair of engines once, with the settings of each
+player, and the players swap colors from one game to the next. Results are
+printed as the games finish, followed by the win/draw/loss record, the
+average disc differential, the Elo difference with its 95% confidence
+interval and the wall time.
+
+Used by othello.py when -dup is combined with -j, for example:
+    python othello.py alpha greedy -aB -lB 4 -dup 1000 -j 32
+"""
+
+import importlib
+import math
+import multiprocessing
+import timeit
+from collections import namedtuple
+
+import gamelog
+import othello
+
+# Search settings of one player, as given by -aB/-lB/-eB or -aW/-lW/-eW,
+# and the persistent transposition table file of --tt, if any
+PlayerSettings = namedtuple("PlayerSettings", ["engine", "alpha_beta", "level", "endgame", "table"],
+                            defaults=[None])
+# Outcome of one game. a_color is the color the first player had, winner is
+# -1, 0 or 1, error names the color that lost on time or by an illegal
+# move, if any, end says which (see gamelog), and history holds (move,
+# seconds) for every ply.
+GameResult = namedtuple("GameResult", ["index", "a_color", "winner", "black", "white", "error",
+                                       "end", "history"], defaults=[gamelog.FINISHED, ()])
+
+# Engines that need a terminal or a network connection
+INTERACTIVE_ENGINES = {"human", "network", "network_server", "network_client", "network_receiver"}
+
+# State of a worker process, set up once by _init_worker
+_worker = {}
+
+
+def make_engine(settings):
+    """ Build and configure an engine from its player settings. """
+    engine = importlib.import_module(f"engines.{settings.engine}").engine()
+    if settings.table and hasattr(engine, "load_table"):
+        engine.load_table(settings.table)
+    return othello.configure_engine(engine, settings.engine, settings.alpha_beta,
+                                    settings.level, settings.endgame)
+
+
+def _init_worker(settings_a, settings_b, game_time, board):
+    _worker["engines"] = (make_engine(settings_a), make_engine(settings_b))
+    _worker["game_time"] = game_time
+    _worker["board_class"] = othello.boards[board]
+
+
+def _play(index):
+    # The first player has black in even games and white in odd ones
+    engine_a, engine_b = _worker["engines"]
+    a_color = -1 if index % 2 == 0 else 1
+    black, white = (engine_a, engine_b) if a_color == -1 else (engine_b, engine_a)
+    history = []
+    try:
+        board = othello.dupgame(white, black, _worker["game_time"], _worker["board_class"],
+                                history=history)
+    except (RuntimeError, LookupError) as e:
+        # The player named in the exception loses 64-0
+        color = e.args[0]
+        return GameResult(index, a_color, -color, 64 if color == 1 else 0,
+                          64 if color == -1 else 0, color,
+                          gamelog.TIME if isinstance(e, RuntimeError) else gamelog.ILLEGAL, history)
+    finally:
+        # Pool workers never get to exit normally, so the persistent tables
+        # are saved after every game
+        for engine in (engine_a, engine_b):
+            if hasattr(engine, "save_table"):
+                engine.save_table()
+    winner, black_count, white_count = othello.winner(board)
+    return GameResult(index, a_color, winner, black_count, white_count, None, gamelog.FINISHED, history)
+
+
+def elo_difference(wins, draws, losses):
+    """ Return (elo, low, high): the Elo difference of the first player and
+    the bounds of its 95% confidence interval. """
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, 0.0, 0.0
+    score = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2
+                + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    return _elo(score), _elo(score - margin), _elo(score + margin)
+
+
+def _elo(score):
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def run(settings_a, settings_b, games, workers=None, game_time=300.0, board="list", log=None):
+    """ Play games between the two players on a pool of workers, printing
+    each result as it arrives and a summary at the end. The first player
+    starts with black. Every game is appended to the game log at log, if
+    any, as it arrives. Return the list of GameResult, ordered by game. """
+    for settings in (settings_a, settings_b):
+        if settings.engine in INTERACTIVE_ENGINES:
+            raise ValueError(f"{settings.engine} cannot play in a parallel tournament")
+    workers = workers or multiprocessing.cpu_count()
+    name = {0: f"{settings_a.engine} (A)", 1: f"{settings_b.engine} (B)"}
+
+    # Log headers by the color of the first player
+    headers = {a_color: gamelog.GameHeader(
+                   (black.engine, white.engine),
+                   tuple((s.alpha_beta, s.level, s.endgame) for s in (black, white)), game_time)
+               for a_color, black, white in ((-1, settings_a, settings_b), (1, settings_b, settings_a))}
+    game_log = gamelog.GameLog(log) if log else None
+
+    start_time = timeit.default_timer()
+    results = []
+    with multiprocessing.Pool(workers, _init_worker,
+                              (settings_a, settings_b, game_time, board)) as pool:
+        for result in pool.imap_unordered(_play, range(games)):
+            results.append(result)
+            if game_log is not None:
+                game_log.write(gamelog.make_record(headers[result.a_color], result.index + 1, result.history,
+                                                   result.black, result.white, result.end, result.error or 0))
+            colors = {result.a_color: name[0], -result.a_color: name[1]}
+            score = f"{result.black}-{result.white}"
+            if result.error is not None:
+                print(f"Game {result.index + 1} - {colors[result.error]} lost on time or by an illegal move")
+            elif result.winner == 0:
+                print(f"Game {result.index + 1} - {colors[-1]} (black) and {colors[1]} (white) are tied! ({score})")
+            else:
+                print(f"Game {result.index + 1} - {colors[result.winner]} wins as "
+                      f"{'black' if result.winner == -1 else 'white'}! ({score})")
+    wall_time = timeit.default_timer() - start_time
+    if game_log is not None:
+        game_log.close()
+
+    results.sort(key=lambda result: result.index)
+    summarize(results, name[0], name[1], wall_time)
+    return results
+
+
+def summarize(results, name_a, name_b, wall_time):
+    """ Print the match statistics from the first player's point of view. """
+    wins = sum(1 for result in results if result.winner == result.a_color)
+    losses = sum(1 for result in results if result.winner == -result.a_color)
+    draws = len(results) - wins - losses
+    # Disc differential of the first player, black minus white flipped to
+    # its side
+    discs = [(result.black - result.white) * -result.a_color for result in results]
+    average = sum(discs) / len(discs) if discs else 0.0
+    elo, low, high = elo_difference(wins, draws, losses)
+
+    print(f"\n{name_a} vs. {name_b}: {len(results)} games")
+    print(f"Wins/draws/losses: {wins}/{draws}/{losses}")
+    print(f"Average disc differential: {average:+.2f}")
+    print(f"Elo difference: {elo:+.1f} (95% confidence: {low:+.1f} to {high:+.1f})")
+    print(f"It took {round(wall_time, 1)}s")
@@ -0,0 +1,79 @@
+"""
+Transposition table for the search engines.
+
+Positions are keyed by the Zobrist hash that Board and BitBoard keep up to
+date in execute_move. The table has a fixed number of slots; each slot holds
+one entry and a new result only replaces it when it was searched at least as
+deep, or when the old entry is left over from an earlier search.
+"""
+
+# Bound type of a stored score
+EXACT = 0
+LOWER = 1  # the real score is >= the stored one (fail high)
+UPPER = 2  # the real score is <= the stored one (fail low)
+
+
+class TranspositionTable():
+    """ Fixed-size, hash-indexed table of (depth, bound, score, best move). """
+
+    def __init__(self, size=1 << 18):
+        """ size is rounded down to a power of two. """
+        self.size = 1 << (max(size, 1).bit_length() - 1)
+        self.mask = self.size - 1
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    def new_search(self):
+        """ Mark the entries stored so far as old, so that they can be
+        replaced by shallower results of the next search. """
+        self.generation += 1
+
+    def probe(self, key):
+        """ Return the (key, depth, bound, score, move, generation) entry for
+        key, or None when it is not in the table. """
+        entry = self.entries[key & self.mask]
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] != key:
+            # The slot holds another position
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def get(self, key):
+        """ Like probe, but without touching the counters. """
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, bound, score, move):
+        """ Store a search result, using depth-preferred replacement. """
+        index = key & self.mask
+        entry = self.entries[index]
+        if (entry is None or entry[0] == key or depth >= entry[1]
+                or entry[5] != self.generation):
+            self.entries[index] = (key, depth, bound, score, move, self.generation)
+
+    def clear(self):
+        """ Remove every entry and reset the counters. """
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.hits = self.misses = self.collisions = 0
+
+    def stats(self):
+        """ Return the hit/miss/collision counters as a dictionary. """
+        probes = self.hits + self.misses + self.collisions
+        return {
+            "size": self.size,
+            "used": sum(1 for entry in self.entries if entry is not None),
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "hit_rate": self.hits / probes if probes else 0.0,
+        }
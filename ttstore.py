@@ -0,0 +1,131 @@
+"""
+Persistent transposition table.
+
+A fixed-size file of hash-indexed entries that outlives the engine: an
+engine preloads it into its TranspositionTable at start, and writes back
+what it searched after each game, so that later games and later runs start
+with a warm table. The file is memory-mapped, so writing back only touches
+the slots that change.
+
+    header  magic b"OTT1", version, slots, session, signature (u64)
+    slots   check (u64), score (f64), meta (u32)
+
+meta packs the depth, the bound, the best move (square x*8 + y, plus one,
+0 for none), the session that wrote the entry and a used flag. check is the
+key xored with the score and meta bits, so an entry half written by another
+process fails validation and is ignored instead of giving a wrong score.
+
+The signature identifies the evaluation the scores come from. A file with
+another signature or size is started over, since its scores would be wrong
+for this engine.
+
+Replacement is depth-preferred, like TranspositionTable, with aging instead
+of generations: an entry not rewritten in the last MAX_AGE sessions (runs
+that opened the file) can be replaced by a shallower one.
+"""
+
+import mmap
+import os
+import struct
+
+MAGIC = b"OTT1"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQ")
+# check, score bits, meta
+ENTRY = struct.Struct("<QQI")
+SCORE = struct.Struct("<d")
+
+USED = 1 << 31
+# Sessions after which an entry can be replaced by a shallower one
+MAX_AGE = 4
+# Default number of slots, about 5 MB
+DEFAULT_SLOTS = 1 << 18
+
+
+def _meta(depth, bound, move, session):
+    square = move[0] * 8 + move[1] + 1 if move is not None else 0
+    return USED | min(depth, 255) | bound << 8 | square << 10 | (session & 255) << 17
+
+
+class TableStore():
+    """ Read-write view of a persistent table file. """
+
+    def __init__(self, path, slots=DEFAULT_SLOTS, signature=0):
+        """ Open the file at path, or create it with slots slots (rounded
+        down to a power of two). Every opening is a new session. """
+        self.slots = 1 << (max(slots, 1).bit_length() - 1)
+        self.mask = self.slots - 1
+        self.signature = signature
+        size = HEADER.size + self.slots * ENTRY.size
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            with open(path, "wb") as f:
+                f.truncate(size)
+        self._file = open(path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), size)
+        magic, version, slots, session, signature = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or slots != self.slots or signature != self.signature:
+            # A new file, or one for another engine: start over
+            self._map[:] = bytes(size)
+            session = 0
+        self.session = (session + 1) & 255
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, self.slots, self.session, self.signature)
+
+    def close(self):
+        """ Write the file to disk and close it. """
+        self._map.flush()
+        self._map.close()
+        self._file.close()
+
+    def flush(self):
+        """ Write the changes to disk. """
+        self._map.flush()
+
+    def entries(self):
+        """ Yield every valid entry as (key, depth, bound, score, move). """
+        mask = self.mask
+        for index, (check, bits, meta) in enumerate(ENTRY.iter_unpack(self._map[HEADER.size:])):
+            if not meta & USED:
+                continue
+            key = check ^ bits ^ meta
+            if key & mask != index:
+                # Torn write
+                continue
+            square = (meta >> 10) & 127
+            move = ((square - 1) >> 3, (square - 1) & 7) if square else None
+            yield key, meta & 255, (meta >> 8) & 3, SCORE.unpack(bits.to_bytes(8, 'little'))[0], move
+
+    def store(self, key, depth, bound, score, move):
+        """ Write an entry, unless its slot holds a deeper entry of another
+        position that is still recent. Return whether it was written. """
+        index = key & self.mask
+        offset = HEADER.size + index * ENTRY.size
+        check, bits, meta = ENTRY.unpack_from(self._map, offset)
+        if (meta & USED and check ^ bits ^ meta != key and (meta & 255) > depth
+                and (self.session - ((meta >> 17) & 255)) & 255 < MAX_AGE):
+            return False
+        meta = _meta(depth, bound, move, self.session)
+        bits = int.from_bytes(SCORE.pack(score), 'little')
+        ENTRY.pack_into(self._map, offset, key ^ bits ^ meta, bits, meta)
+        return True
+
+    def load_into(self, table):
+        """ Store every entry of the file in the TranspositionTable table.
+        Return the number of entries. """
+        count = 0
+        for key, depth, bound, score, move in self.entries():
+            table.store(key, depth, bound, score, move)
+            count += 1
+        return count
+
+    def save_from(self, table, since=-1):
+        """ Write the entries of the TranspositionTable table stored after
+        generation since. Return the number written. """
+        count = 0
+        for entry in table.entries:
+            if entry is not None and entry[5] > since:
+                count += self.store(*entry[:5])
+        return count
+
+    def used(self):
+        """ Return the number of valid entries. """
+        return sum(1 for _ in self.entries())
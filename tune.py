@@ -0,0 +1,200 @@
+"""
+Pattern weight tuner.
+
+Fits the tables of patterns.py to the positions of self-play files
+(selfplay.py) and writes a weights file for AlphaEngine. Every position
+is one row whose features are its 46 pattern instances, and the tables of
+each phase are fitted on the positions of that phase, either by least
+squares on the final disc differential, or by logistic regression on the
+game result (win, draw, loss) with scores kept in discs through
+LOGISTIC_SCALE.
+
+Feature extraction works on whole arrays: the bitboards of a chunk of
+positions are unpacked into an (n, 64) array of digits, and one matrix
+product with the digit weights of every instance gives the (n, 46) codes.
+The fit is a gradient descent where every table entry moves by the mean
+error of the positions that use it, which bincount computes for all the
+entries at once.
+
+A share of the games is kept out of the fit. The fit of a phase stops once
+the loss on their positions stops falling, and keeps the weights with the
+lowest one: with about as many table entries as positions in a phase, the
+later epochs only learn the noise of the games. The loss is printed for
+every phase next to that of the starting weights.
+
+    python tune.py data.bin -o patterns.bin
+    python tune.py data.bin more.bin --loss logistic --epochs 200
+"""
+
+import argparse
+import array
+import sys
+import timeit
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import patterns
+import selfplay
+
+# Positions converted to codes at a time
+CHUNK = 1 << 18
+# Epochs between two measures of the held-out loss
+CHECK_EPOCHS = 5
+# Discs of score that make a win probability of 1 / (1 + e^-1)
+LOGISTIC_SCALE = 8.0
+
+
+def _code_matrix():
+    # (64, instances) matrix whose product with the digits of a position
+    # gives the codes: 3 ** digit where the square is that digit of the
+    # instance
+    matrix = np.zeros((64, len(patterns.INSTANCES)), dtype=np.float32)
+    for index, (_, image) in enumerate(patterns.INSTANCES):
+        for digit, square in enumerate(image):
+            matrix[square, index] = 3 ** digit
+    return matrix
+
+
+def _digits(bits):
+    # (n, 64) array of the bits of n little-endian 64-bit masks
+    return np.unpackbits(bits.astype("<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+
+
+def features(records):
+    """ Return (indices, phases): for every record of a selfplay.load array,
+    the index of each of its instances in the tables of a phase, as an
+    (n, instances) int32 array, and its phase. """
+    matrix = _code_matrix()
+    offsets = np.cumsum([0] + patterns.SIZES[:-1]).astype(np.int32)
+    # Table offset of the pattern of every instance
+    instance_offsets = offsets[[pattern for pattern, _ in patterns.INSTANCES]]
+    indices = np.empty((len(records), len(patterns.INSTANCES)), dtype=np.int32)
+    phases = np.empty(len(records), dtype=np.int8)
+    for start in range(0, len(records), CHUNK):
+        chunk = records[start:start + CHUNK]
+        digits = _digits(chunk["black"]) + 2 * _digits(chunk["white"])
+        indices[start:start + len(chunk)] = (digits.astype(np.float32) @ matrix).astype(np.int32) + instance_offsets
+        empties = 64 - np.count_nonzero(digits, axis=1)
+        phases[start:start + len(chunk)] = np.minimum((60 - empties) * patterns.PHASES // 60,
+                                                      patterns.PHASES - 1)
+    return indices, phases
+
+
+def _targets(results, loss):
+    # Disc differentials for least squares, results as 1, 0.5 and 0 for
+    # logistic regression
+    if loss == "logistic":
+        return (np.sign(results) + 1) / 2
+    return results.astype(np.float64)
+
+
+def _errors(weights, indices, targets, loss):
+    # Target minus prediction of every position, in discs
+    scores = weights[indices].sum(axis=1)
+    if loss == "logistic":
+        probabilities = 1 / (1 + np.exp(-scores / LOGISTIC_SCALE))
+        return (targets - probabilities) * 4 * LOGISTIC_SCALE
+    return targets - scores
+
+
+def _loss(weights, indices, targets, loss):
+    # Mean squared error in discs, or log loss
+    if not len(targets):
+        return 0.0
+    scores = weights[indices].sum(axis=1)
+    if loss == "logistic":
+        probabilities = np.clip(1 / (1 + np.exp(-scores / LOGISTIC_SCALE)), 1e-12, 1 - 1e-12)
+        return float(-np.mean(targets * np.log(probabilities) + (1 - targets) * np.log(1 - probabilities)))
+    return float(np.mean((targets - scores) ** 2))
+
+
+def fit_phase(weights, indices, targets, epochs=100, rate=1.0, regularization=2.0, loss="squares"):
+    """ Fit the tables of one phase, a float64 array of patterns.ENTRIES
+    weights updated in place, to the positions with these indices and
+    targets. Every epoch moves each entry by rate times the mean error of
+    its positions divided among the instances of a position, with
+    regularization added to the number of positions so that rare entries
+    move less. """
+    instances = indices.shape[1]
+    flat = indices.ravel()
+    counts = np.bincount(flat, minlength=patterns.ENTRIES)
+    step = rate / instances / (counts + regularization)
+    for _ in range(epochs):
+        errors = _errors(weights, indices, targets, loss)
+        weights += step * np.bincount(flat, weights=np.repeat(errors, instances), minlength=patterns.ENTRIES)
+    return weights
+
+
+def split(records, valid, seed=0):
+    """ Return a mask of the records kept out of the fit: about a share
+    valid of the games, whole games at a time. A game starts at the
+    position with 4 discs. """
+    starts = _digits(records["black"] | records["white"]).sum(axis=1) == 4
+    games = np.cumsum(starts)
+    rng = np.random.default_rng(seed)
+    held_out = rng.random(games[-1] + 1 if len(games) else 1) < valid
+    return held_out[games]
+
+
+def tune(records, start=None, epochs=100, rate=1.0, regularization=2.0, loss="squares", valid=0.1):
+    """ Fit pattern weights to the records of a selfplay.load array, from
+    the PatternWeights start, or from zero, for at most epochs epochs per
+    phase. Print the loss of every phase on the positions kept out of the
+    fit, before and after. Return the PatternWeights. """
+    start_time = timeit.default_timer()
+    indices, phases = features(records)
+    targets = _targets(records["result"], loss)
+    held_out = split(records, valid)
+    print(f"Features of {len(records)} positions in {timeit.default_timer() - start_time:.1f}s")
+    tables = []
+    for phase in range(patterns.PHASES):
+        initial = (np.array(start.values[phase * patterns.ENTRIES:(phase + 1) * patterns.ENTRIES], dtype=np.float64)
+                   if start is not None else np.zeros(patterns.ENTRIES))
+        fit = (phases == phase) & ~held_out
+        test = (phases == phase) & held_out
+        fit_indices, fit_targets = indices[fit], targets[fit]
+        test_indices, test_targets = indices[test], targets[test]
+        before = best_loss = _loss(initial, test_indices, test_targets, loss)
+        weights, best, best_epochs = initial.copy(), initial, 0
+        for done in range(0, epochs, CHECK_EPOCHS):
+            steps = min(CHECK_EPOCHS, epochs - done)
+            fit_phase(weights, fit_indices, fit_targets, steps, rate, regularization, loss)
+            current = _loss(weights, test_indices, test_targets, loss)
+            if current < best_loss or not len(test_targets):
+                best, best_loss, best_epochs = weights.copy(), current, done + steps
+            elif done + steps - best_epochs >= 2 * CHECK_EPOCHS:
+                break
+        print(f"Phase {phase}: {int(fit.sum())} positions, {best_epochs} epochs, held-out {loss} "
+              f"loss {before:.3f} -> {best_loss:.3f} (fit {_loss(best, fit_indices, fit_targets, loss):.3f})")
+        tables.append(best)
+    values = array.array('f')
+    values.frombytes(np.concatenate(tables).astype(np.float32).tobytes())
+    print(f"It took {round(timeit.default_timer() - start_time, 1)}s")
+    return patterns.PatternWeights(values)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fit pattern weights to self-play positions.")
+    parser.add_argument("data", type=str, nargs="+", help="self-play files of selfplay.py")
+    parser.add_argument("-o", "--output", type=str, default=patterns.DEFAULT_PATH, help="weights file to write")
+    parser.add_argument("--start", type=str, help="weights file to start from, instead of zero")
+    parser.add_argument("--loss", type=str, default="squares", choices=["squares", "logistic"],
+                        help="fit the disc differential (squares) or the result (logistic)")
+    parser.add_argument("--epochs", type=int, default=100, help="passes over the positions of every phase")
+    parser.add_argument("--rate", type=float, default=1.0, help="step of the descent")
+    parser.add_argument("--regularization", type=float, default=2.0, help="positions added to every table entry's count")
+    parser.add_argument("--valid", type=float, default=0.1, help="share of the games kept out of the fit")
+    parser.add_argument("--max-positions", type=int, help="use at most this many positions")
+    args = parser.parse_args()
+
+    if np is None:
+        sys.exit("tune.py needs NumPy")
+    records = np.concatenate([selfplay.load(path) for path in args.data])[:args.max_positions]
+    start = patterns.PatternWeights.read(args.start) if args.start else None
+    weights = tune(records, start, args.epochs, args.rate, args.regularization, args.loss, args.valid)
+    weights.write(args.output)
+    print(f"Weights written to {args.output}, used by AlphaEngine with "
+          f"{patterns.ENVIRONMENT}={args.output}")
@@ -0,0 +1,135 @@
+"""
+NumPy versions of the AlphaEngine evaluation terms.
+
+A position is an 8x8 int8 array with the same layout as the board:
+array[x][y] == board[x][y], 1 for white, -1 for black and 0 for empty. The
+terms work on a stack of such arrays, shape (n, 8, 8), and return one value
+per position, so that all the children of a node are scored in one call.
+
+NumPy is optional. When it is missing, available() returns False and
+AlphaEngine keeps its pure Python heuristic.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from bitboard import BitBoard
+
+
+def available():
+    """ Return True when NumPy can be imported. """
+    return np is not None
+
+
+def _bit_array(bits):
+    # The 64 bits of a bitboard as an 8x8 array of 0 and 1, bit x*8 + y at
+    # [x][y]
+    raw = np.frombuffer(bits.to_bytes(8, 'little'), dtype=np.uint8)
+    return np.unpackbits(raw, bitorder='little').reshape(8, 8)
+
+
+def to_array(board):
+    """ Return the position of any board as an 8x8 int8 array. """
+    if isinstance(board, BitBoard):
+        white, black = board.bitboards(1)
+        return (_bit_array(white).astype(np.int8) - _bit_array(black).astype(np.int8))
+    return np.array([board[x] for x in range(8)], dtype=np.int8)
+
+
+def stack(boards):
+    """ Return the positions of several boards as an (n, 8, 8) array. """
+    return np.stack([to_array(board) for board in boards])
+
+
+def weight_array(weights):
+    """ Return a list of 64 square weights, indexed x*8 + y, as an 8x8
+    array. """
+    return np.array(weights, dtype=np.int64).reshape(8, 8)
+
+
+def disc_difference(positions, color):
+    """ Own pieces minus opponent pieces for color, per position. """
+    return color * positions.sum(axis=(1, 2), dtype=np.int64)
+
+
+def weighted_squares(positions, color, weights):
+    """ Sum of the weights of the own squares minus those of the opponent's,
+    per position. weights comes from weight_array. """
+    return color * (positions * weights).sum(axis=(1, 2), dtype=np.int64)
+
+
+def frontier_discs(positions, color):
+    """ Number of pieces of color next to at least one empty square, per
+    position. """
+    empty = np.zeros((positions.shape[0], 10, 10), dtype=bool)
+    empty[:, 1:9, 1:9] = positions == 0
+    near_empty = np.zeros(positions.shape, dtype=bool)
+    for dx in (0, 1, 2):
+        for dy in (0, 1, 2):
+            if dx != 1 or dy != 1:
+                near_empty |= empty[:, dx:dx + 8, dy:dy + 8]
+    return ((positions == color) & near_empty).sum(axis=(1, 2), dtype=np.int64)
+
+
+def check_heuristic(games=20, seed=0):
+    """ Play random games and raise AssertionError unless
+    AlphaEngine.evaluate_boards matches AlphaEngine.heuristic on every child
+    of every position, for both colors. Return the number of positions
+    compared. """
+    import random
+    from board import Board
+    from engines.alpha import AlphaEngine
+    engine = AlphaEngine.__new__(AlphaEngine)
+    rng = random.Random(seed)
+    positions = 0
+    for board_class in (Board, BitBoard):
+        for _ in range(games):
+            board = board_class()
+            color, move_num, passes = -1, 0, 0
+            while passes < 2:
+                moves = board.get_legal_moves(color)
+                children = []
+                for move in moves:
+                    child = board.copy()
+                    child.execute_move(move, color)
+                    children.append(child)
+                children = children or [board]
+                for scored in (-1, 1):
+                    expected = [engine.heuristic(child, scored, move_num) for child in children]
+                    assert engine.evaluate_boards(children, scored, move_num) == expected
+                positions += len(children)
+                if moves:
+                    board.execute_move(rng.choice(moves), color)
+                    passes = 0
+                else:
+                    passes += 1
+                color = -color
+                move_num += 1
+    return positions
+
+
+if __name__ == '__main__':
+    import timeit
+    from board import Board
+    from engines.alpha import AlphaEngine
+    print(f"evaluate_boards matches heuristic on {check_heuristic()} positions")
+
+    engine = AlphaEngine.__new__(AlphaEngine)
+    for board_class in (Board, BitBoard):
+        board = board_class()
+        for move, color in [((2, 3), -1), ((2, 2), 1), ((3, 2), -1), ((4, 2), 1), ((5, 4), -1)]:
+            board.execute_move(move, color)
+        children = []
+        for move in board.get_legal_moves(1):
+            child = board.copy()
+            child.execute_move(move, 1)
+            children.append(child)
+        number = 500
+        loop = timeit.timeit(lambda: [engine.heuristic(child, 1, 30) for child in children],
+                             number=number) / number
+        batch = timeit.timeit(lambda: engine.evaluate_boards(children, 1, 30),
+                              number=number) / number
+        print(f"{board_class.__name__}: {len(children)} children, heuristic {loop * 1e6:.0f}us, "
+              f"evaluate_boards {batch * 1e6:.0f}us")